@@ -0,0 +1,256 @@
+# api/job_store.py - Persistent job store (SQLite by default, in-memory for tests/dev)
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+TERMINAL_STATUSES = ("completed", "error")
+
+
+class _JobSignal:
+    """Condition and change counter shared by the waiters of one job."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.waiters = 0
+
+
+class JobStore(ABC):
+    """Interface for job records. Every method is safe to call from any thread.
+
+    Records are plain dicts. `status`, `created_ts` and `updated_ts` are kept
+    as indexed columns by persistent stores; everything else is opaque.
+    Every write bumps the record's `version`.
+    """
+
+    def __init__(self, ttl_seconds: float = 7 * 24 * 3600):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        # One signal per job being waited on, so a write only wakes the
+        # waiters (SSE, long-poll) of that job. Never held together with
+        # _lock, to keep lock ordering trivial.
+        self._signals_lock = threading.Lock()
+        self._signals = {}
+
+    def _notify(self, job_id: str):
+        with self._signals_lock:
+            signal = self._signals.get(job_id)
+        if signal is None:
+            return
+        with signal.condition:
+            signal.generation += 1
+            signal.condition.notify_all()
+
+    def wait_for_change(self, job_id: str, version, timeout: float = 25.0):
+        """Block until the job's version differs from `version` or timeout expires.
+
+        Returns the current record (unchanged on timeout), or None if the job
+        does not exist. Finished jobs return immediately.
+        """
+        with self._signals_lock:
+            signal = self._signals.setdefault(job_id, _JobSignal())
+            signal.waiters += 1
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                with signal.condition:
+                    generation = signal.generation
+                job = self.get(job_id)
+                if job is None or job.get("version") != version or job.get("status") in TERMINAL_STATUSES:
+                    return job
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                with signal.condition:
+                    if signal.generation == generation:
+                        signal.condition.wait(remaining)
+        finally:
+            with self._signals_lock:
+                signal.waiters -= 1
+                if not signal.waiters:
+                    del self._signals[job_id]
+
+    @abstractmethod
+    def create(self, job: dict) -> dict:
+        """Store a new job. Returns the record with `updated_ts` and `version`."""
+
+    @abstractmethod
+    def get(self, job_id: str):
+        """The job record, or None."""
+
+    @abstractmethod
+    def update(self, job_id: str, **fields):
+        """Merge fields into a job. Returns the new record, or None if missing."""
+
+    def transition(self, job_id: str, from_statuses, to_status: str, **fields) -> bool:
+        """Atomically move a job to `to_status` if its status is in from_statuses."""
+        with self._lock:
+            job = self.get(job_id)
+            if job is None or job.get("status") not in from_statuses:
+                return False
+            self.update(job_id, status=to_status, **fields)
+            return True
+
+    @abstractmethod
+    def delete(self, job_id: str):
+        """Remove a job record."""
+
+    @abstractmethod
+    def evict_expired(self, now: float = None) -> list:
+        """Drop finished jobs older than the TTL. Returns the ids removed."""
+
+    @abstractmethod
+    def recover_interrupted(self) -> int:
+        """Mark jobs left queued/running by a previous process as failed."""
+
+
+class MemoryJobStore(JobStore):
+    """Dict-backed store; loses jobs on restart."""
+
+    def __init__(self, ttl_seconds: float = 7 * 24 * 3600):
+        super().__init__(ttl_seconds)
+        self._jobs = {}
+
+    def create(self, job: dict) -> dict:
+        with self._lock:
+            job = dict(job, updated_ts=time.time(), version=1)
+            self._jobs[job["id"]] = job
+        self._notify(job["id"])
+        return dict(job)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields, updated_ts=time.time(), version=job.get("version", 0) + 1)
+            job = dict(job)
+        self._notify(job_id)
+        return job
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def evict_expired(self, now: float = None) -> list:
+        cutoff = (now or time.time()) - self.ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.get("status") in TERMINAL_STATUSES and job["updated_ts"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return expired
+
+    def recover_interrupted(self) -> int:
+        return 0
+
+
+class SQLiteJobStore(JobStore):
+    """Embedded SQLite store with indexes on status and creation time.
+
+    Lookups by id use the primary key, so /api/status stays fast with
+    hundreds of thousands of historical jobs.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600):
+        super().__init__(ttl_seconds)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " created_ts REAL NOT NULL,"
+            " updated_ts REAL NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_ts)")
+
+    def create(self, job: dict) -> dict:
+        now = time.time()
+        job = dict(job, updated_ts=now, version=1)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, created_ts, updated_ts, data) VALUES (?, ?, ?, ?, ?)",
+                (job["id"], job.get("status", "queued"), job.get("created_ts", now), now, json.dumps(job)),
+            )
+        self._notify(job["id"])
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                job = json.loads(row[0])
+                job.update(fields, updated_ts=time.time(), version=job.get("version", 0) + 1)
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_ts = ?, data = ? WHERE id = ?",
+                    (job.get("status", "queued"), job["updated_ts"], json.dumps(job), job_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._notify(job_id)
+        return job
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def evict_expired(self, now: float = None) -> list:
+        cutoff = (now or time.time()) - self.ttl_seconds
+        placeholders = ", ".join("?" for _ in TERMINAL_STATUSES)
+        condition = f"status IN ({placeholders}) AND updated_ts < ?"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE {condition}", (*TERMINAL_STATUSES, cutoff)
+            ).fetchall()
+            self._conn.execute(f"DELETE FROM jobs WHERE {condition}", (*TERMINAL_STATUSES, cutoff))
+        return [job_id for (job_id,) in rows]
+
+    def recover_interrupted(self) -> int:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+        for (job_id,) in rows:
+            self.update(
+                job_id, status="error",
+                error="Server restarted before the job finished / Server khoi dong lai truoc khi job hoan thanh",
+            )
+        return len(rows)
+
+
+def create_job_store(kind: str = None, path: str = None, ttl_seconds: float = None) -> JobStore:
+    """Build the store selected by JOB_STORE ('sqlite' or 'memory')."""
+    kind = (kind or os.environ.get("JOB_STORE", "sqlite")).lower()
+    if ttl_seconds is None:
+        ttl_seconds = float(os.environ.get("JOB_TTL_SECONDS", 7 * 24 * 3600))
+    if kind == "memory":
+        return MemoryJobStore(ttl_seconds)
+    path = path or os.environ.get("JOB_DB_PATH", os.path.join("data", "jobs.db"))
+    return SQLiteJobStore(path, ttl_seconds)
@@ -0,0 +1,117 @@
+# api/scheduler.py - Bounded job scheduler with per-resource concurrency limits
+
+import itertools
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity. / Hang doi da day."""
+
+
+class JobScheduler:
+    """Priority job queue drained by a fixed pool of worker threads.
+
+    Jobs with a lower priority number run first; equal priorities run in
+    submission order. Inside a job, phases take a slot from a named resource
+    pool (e.g. "llm", "cpu") so LLM-bound and CPU-bound work are limited
+    independently of the number of running jobs.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 50, resource_limits: dict = None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pending = {}  # job_id -> (priority, seq)
+        self._running = set()
+
+        self._limits = dict(resource_limits or {})
+        self._semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in self._limits.items()}
+        self._in_use = {name: 0 for name in self._limits}
+        self._waiting = {name: 0 for name in self._limits}
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+
+    def submit(self, job_id: str, fn, *args, priority: int = 5):
+        """Queue fn(*args) for execution. Raises QueueFullError when the queue is full."""
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                raise QueueFullError(f"Job queue is full ({self.max_queue}) / Hang doi da day")
+            seq = next(self._seq)
+            self._pending[job_id] = (priority, seq)
+            self._queue.put((priority, seq, job_id, fn, args))
+
+    def queue_position(self, job_id: str):
+        """1-based position among queued jobs, or None if the job is not queued."""
+        with self._lock:
+            key = self._pending.get(job_id)
+            if key is None:
+                return None
+            return sum(1 for other in self._pending.values() if other < key) + 1
+
+    @contextmanager
+    def resource(self, name: str):
+        """Hold one slot of a resource pool for the duration of the block."""
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            yield
+            return
+        with self._lock:
+            self._waiting[name] += 1
+        semaphore.acquire()
+        with self._lock:
+            self._waiting[name] -= 1
+            self._in_use[name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use[name] -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": len(self._pending),
+                "running": len(self._running),
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "resources": {
+                    name: {
+                        "limit": self._limits[name],
+                        "in_use": self._in_use[name],
+                        "waiting": self._waiting[name],
+                    }
+                    for name in self._limits
+                },
+            }
+
+    def _worker(self):
+        while True:
+            _, _, job_id, fn, args = self._queue.get()
+            with self._lock:
+                self._pending.pop(job_id, None)
+                self._running.add(job_id)
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"[ERROR] Job {job_id} crashed in scheduler / Job bi loi: {e}")
+            finally:
+                with self._lock:
+                    self._running.discard(job_id)
+                self._queue.task_done()
+
+
+def wait_seconds(job: dict, now: float = None) -> float:
+    """Time a job spent (or has spent so far) waiting in the queue."""
+    created = job.get("created_ts")
+    if created is None:
+        return 0.0
+    started = job.get("started_ts") or (now or time.time())
+    return max(0.0, started - created)
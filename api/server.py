@@ -1,120 +1,320 @@
 # api/server.py - Flask Backend API for Manim AI Studio
 
 import os
+import re
+import shutil
 import sys
 import uuid
+import time
 import threading
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+import json
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from api.scheduler import JobScheduler, QueueFullError, wait_seconds
+from api.job_store import create_job_store, TERMINAL_STATUSES
+from src.agent_pool import AgentPool
+from src.llm_usage import usage, use_job
+from src.response_cache import ResponseCache
+from src.scene_index import SceneIndex
+
+# Credentials for the LLM clients, read once at startup
+from dotenv import load_dotenv
+load_dotenv()
+os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'credentials.json'
+
 app = Flask(__name__)
 CORS(app)
 
-# Store generation jobs
-jobs = {}
 
-# Workspace directory
-WORKSPACE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workspace")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Workspace directory; /api/videos serves the final videos from here
+WORKSPACE_DIR = os.path.join(ROOT_DIR, "workspace")
 os.makedirs(WORKSPACE_DIR, exist_ok=True)
 
+# Databases (jobs, caches) live outside the served workspace
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(ROOT_DIR, "data"))
+
+# Each job renders into its own sub-directory so jobs can run concurrently
+JOBS_DIR = os.path.join(WORKSPACE_DIR, "jobs")
+
+# Persistent job records (SQLite by default, see JOB_STORE / JOB_DB_PATH / JOB_TTL_SECONDS)
+job_store = create_job_store(path=os.environ.get("JOB_DB_PATH", os.path.join(DATA_DIR, "jobs.db")))
+job_store.recover_interrupted()
+
+
+def remove_job_dirs(job_ids=None, now=None) -> int:
+    """Delete the directories of `job_ids`, plus any without a job record older than the TTL.
+
+    Records vanish without an eviction when the memory store restarts, so
+    orphaned directories are swept by age.
+    """
+    if not os.path.isdir(JOBS_DIR):
+        return 0
+    removed = 0
+    cutoff = (now or time.time()) - job_store.ttl_seconds
+    evicted = set(job_ids or ())
+    for job_id in os.listdir(JOBS_DIR):
+        path = os.path.join(JOBS_DIR, job_id)
+        if job_id in evicted or (job_store.get(job_id) is None and os.path.getmtime(path) < cutoff):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def evict_expired_jobs(interval_seconds=3600):
+    """Periodically drop finished jobs older than JOB_TTL_SECONDS and their directories."""
+    while True:
+        evicted = job_store.evict_expired()
+        removed_dirs = remove_job_dirs(evicted)
+        if evicted or removed_dirs:
+            print(
+                f"[INFO] Evicted {len(evicted)} expired jobs, removed {removed_dirs} job directories / "
+                f"Da xoa {len(evicted)} job het han, {removed_dirs} thu muc job"
+            )
+        time.sleep(interval_seconds)
+
+
+threading.Thread(target=evict_expired_jobs, daemon=True).start()
+
+# LLM clients and agents built once and shared across jobs (see src/agent_pool.py)
+agent_pool = AgentPool(size=int(os.environ.get("AGENT_POOL_SIZE", os.environ.get("JOB_WORKERS", 4))))
+
+
+def warm_agent_pool():
+    """Build the pool in the background so the first job starts warm."""
+    try:
+        built = agent_pool.warm(int(os.environ.get("AGENT_POOL_WARM", agent_pool.size)))
+        print(f"[INFO] Agent pool ready: {built} bundles / Da khoi tao {built} bo agent")
+    except Exception as e:
+        print(f"[WARN] Agent pool warm-up failed, building on demand / Khoi tao truoc that bai: {e}")
+
+
+threading.Thread(target=warm_agent_pool, daemon=True).start()
 
-def run_video_generation(job_id, topic, language, duration):
+# Approved script/code pairs reused by later jobs on the same (or a near-identical) topic
+response_cache = ResponseCache(
+    path=os.environ.get("RESPONSE_CACHE_PATH", os.path.join(DATA_DIR, "response_cache.db"))
+)
+
+# Approved code of earlier jobs, shown to the developer for similar topics
+scene_index = SceneIndex(
+    path=os.environ.get("SCENE_INDEX_PATH", os.path.join(DATA_DIR, "scene_index.db"))
+)
+
+# Bounded job queue; LLM calls and CPU-heavy phases (manim, ffmpeg) have separate limits
+scheduler = JobScheduler(
+    workers=int(os.environ.get("JOB_WORKERS", 4)),
+    max_queue=int(os.environ.get("MAX_QUEUED_JOBS", 50)),
+    resource_limits={
+        "llm": int(os.environ.get("LLM_CONCURRENCY", 4)),
+        "cpu": int(os.environ.get("CPU_CONCURRENCY", 2)),
+    },
+)
+
+
+def run_video_generation(job_id, topic, language, duration, use_cache=True):
     """Run video generation in background thread."""
-    import asyncio
-    
-    # Create new event loop for this thread (required for CrewAI)
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    from src.pipeline import Pipeline, PipelineError, ensure_event_loop, format_timings
+
+    # CrewAI needs an event loop in this thread; pipeline nodes get their own
+    ensure_event_loop()
     
     try:
-        jobs[job_id]["status"] = "running"
-        jobs[job_id]["phase"] = "Initializing / Khoi tao..."
+        if not job_store.transition(job_id, ("queued",), "running", started_ts=time.time()):
+            return
+        job_store.update(job_id, phase="Initializing / Khoi tao...")
         
         # Import here to avoid circular imports
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'credentials.json'
-        
-        from src.agents import VideoAgents
         from src.tasks import VideoTasks
-        from langchain_google_genai import ChatGoogleGenerativeAI
-        
-        jobs[job_id]["phase"] = "Loading LLM models / Dang tai mo hinh LLM..."
+        from src.timing import build_timing_manifest, measure_voiceover_loudness, script_section
+        from src.qa import run_qa
+        from src.repair import repair_or_report
+        from src.speculative import SPECULATIVE_CANDIDATES, generate_candidates
+        from src.tools.manim_tools import ManimExecutionTool, find_scene_classes
+        from src.tools.media import get_duration
         
-        llm_flash = ChatGoogleGenerativeAI(model="gemini-3-flash-preview", temperature=1)
-        llm_pro = ChatGoogleGenerativeAI(model="gemini-3-pro-preview", temperature=0.4)
-        
-        agents = VideoAgents()
-        tasks = VideoTasks()
-        
-        storyteller = agents.storyteller_agent(llm_flash)
-        manim_dev = agents.manim_developer_agent(llm_pro)
-        qa_engineer = agents.qa_engineer_agent(llm_flash)
-        voice_artist = agents.voiceover_artist_agent(llm_flash)
-        producer = agents.production_engineer_agent(llm_flash)
-        
-        # Phase 1: Script
-        jobs[job_id]["phase"] = "Phase 1: Creating script / Dang tao kich ban..."
-        jobs[job_id]["progress"] = 10
-        
-        story_task = tasks.storytelling_task(storyteller, topic)
-        story_task.execute(agent=storyteller)
-        
-        # Phase 2: Development
-        jobs[job_id]["phase"] = "Phase 2: Writing Manim code / Dang viet code Manim..."
-        jobs[job_id]["progress"] = 30
-        
-        code_task = tasks.manim_development_task(manim_dev)
-        max_retries = 5
-        is_approved = False
+        tasks = VideoTasks(workspace_dir=os.path.join(JOBS_DIR, job_id))
+        # Shared, already-connected clients; the agents are checked out below
+        llm_flash, llm_pro = agent_pool.llms()
+
+        cache_request = dict(
+            model=f"{llm_flash.model}|{llm_pro.model}",
+            prompt=tasks.storytelling_prompt("{topic}"),
+            topic=topic, language=language, duration=duration,
+        )
+        reuse = {}
+
+        def read_file(file_name):
+            with open(tasks.path(file_name), "r", encoding="utf-8") as f:
+                return f.read()
+
+        def create_script():
+            job_store.update(job_id, phase="Phase 1: Creating script / Dang tao kich ban...", progress=10)
+            cached = response_cache.lookup(**cache_request) if use_cache else None
+            if cached:
+                with open(tasks.path(tasks.script_file), "w", encoding="utf-8") as f:
+                    f.write(cached["script"])
+                reuse["code"] = cached["code"]
+                job_store.update(job_id, cache={"match": cached["match"], "topic": cached["topic"]})
+                return
+
+            story_task = tasks.storytelling_task(bundle.storyteller, topic)
+            with scheduler.resource("llm"):
+                story_task.execute(agent=bundle.storyteller)
+            response_cache.store(**cache_request, script=read_file(tasks.script_file))
+
+        def develop_code(max_retries=5):
+            job_store.update(job_id, phase="Phase 2: Writing Manim code / Dang viet code Manim...", progress=30)
+            # Code that rendered for similar topics before grounds the first attempt
+            visual_script = script_section(read_file(tasks.script_file), "VISUAL SCRIPT")
+            references = scene_index.prompt_examples(topic, visual_script)
+            job_store.update(job_id, references=references.count("```python"))
+            code_task = tasks.manim_development_task(bundle.manim_dev, references)
+            qa_runs = []
+
+            def repair_after_failure(qa, attempt):
+                # Targeted patch first; regenerate with a compact report when it does not apply
+                with scheduler.resource("llm"):
+                    patched, note, error_report = repair_or_report(bundle.llm_pro, tasks.manim_code_file, qa)
+                job_store.update(job_id, repair={"attempt": attempt, "patched": patched, "note": note})
+                if not patched:
+                    code_task.description = tasks.manim_fix_description(error_report)
+                return patched
+
+            # Previously approved code for this topic skips the developer entirely
+            attempts = max_retries
+            if reuse.get("code"):
+                with open(tasks.path(tasks.manim_code_file), "w", encoding="utf-8") as f:
+                    f.write(reuse["code"])
+                with scheduler.resource("cpu"):
+                    qa = run_qa(tasks.manim_code_file)
+                job_store.update(job_id, qa=qa.to_dict())
+                if qa.passed:
+                    attempts = 0
         
-        for i in range(max_retries):
-            jobs[job_id]["phase"] = f"Phase 2: Attempt {i+1}/{max_retries} / Lan thu {i+1}/{max_retries}"
+            patched = False
+            # Several candidates at once; the first that passes QA wins
+            if attempts and SPECULATIVE_CANDIDATES > 1:
+                job_store.update(job_id, phase=f"Phase 2: {SPECULATIVE_CANDIDATES} candidates / {SPECULATIVE_CANDIDATES} ban song song")
+                speculative = generate_candidates(
+                    bundle.llm_pro, tasks, SPECULATIVE_CANDIDATES, scheduler.resource, references
+                )
+                if speculative.qa is not None:
+                    qa_runs.append(speculative.qa)
+                job_store.update(job_id, speculative=speculative.to_dict())
+                if speculative.passed:
+                    job_store.update(job_id, qa=speculative.qa.to_dict())
+                    attempts = 0
+                elif speculative.qa is not None:
+                    patched = repair_after_failure(speculative.qa, 0)
+
+            for i in range(attempts):
+                job_store.update(job_id, phase=f"Phase 2: Attempt {i+1}/{max_retries} / Lan thu {i+1}/{max_retries}")
             
-            code_task.execute(agent=manim_dev)
+                # After a successful patch only QA has to run again
+                if not patched:
+                    with scheduler.resource("llm"):
+                        code_task.execute(agent=bundle.manim_dev)
             
-            jobs[job_id]["phase"] = "Phase 2: QA checking / Dang kiem tra..."
-            qa_task = tasks.qa_task(qa_engineer)
-            qa_result = qa_task.execute(agent=qa_engineer)
+                job_store.update(job_id, phase="Phase 2: QA checking / Dang kiem tra...")
+                with scheduler.resource("cpu"):
+                    qa = run_qa(tasks.manim_code_file)
+                qa_runs.append(qa)
+                job_store.update(job_id, qa=qa.to_dict())
             
-            if "SUCCESS" in qa_result.upper() or "THANH CONG" in qa_result.upper():
-                is_approved = True
-                break
-        
-        if not is_approved:
-            jobs[job_id]["status"] = "error"
-            jobs[job_id]["error"] = "Code could not be fixed after retries / Khong the sua code sau nhieu lan thu"
-            return
-        
-        jobs[job_id]["progress"] = 60
-        
-        # Phase 3: Production
-        jobs[job_id]["phase"] = "Phase 3: Creating voiceover / Dang tao loi thoai..."
-        jobs[job_id]["progress"] = 70
-        
-        voice_task = tasks.voiceover_task(voice_artist)
-        voice_task.execute(agent=voice_artist)
-        
-        jobs[job_id]["phase"] = "Phase 3: Merging video & audio / Dang ghep video & audio..."
-        jobs[job_id]["progress"] = 85
+                if qa.passed:
+                    break
+
+                # A patch after the last attempt would never be checked
+                if i + 1 < attempts:
+                    patched = repair_after_failure(qa, i + 1)
+            else:
+                if attempts:
+                    raise RuntimeError("Code could not be fixed after retries / Khong the sua code sau nhieu lan thu")
         
-        production_task = tasks.production_task(producer)
-        production_task.execute(agent=producer)
+            # QA only validated the code; render the approved version once at full quality
+            job_store.update(job_id, phase="Phase 2: Final render / Dang render ban cuoi...", progress=50)
+            # One CPU slot per manim process, so split sections count against CPU_CONCURRENCY too
+            render_result = ManimExecutionTool().render_file(
+                tasks.manim_code_file, quality="h", fps=30, cpu_slot=lambda: scheduler.resource("cpu")
+            )
+            if not render_result.startswith("[OK]"):
+                raise RuntimeError(render_result)
+            code = read_file(tasks.manim_code_file)
+            response_cache.store(**cache_request, script=read_file(tasks.script_file), code=code)
+            scene_index.add(
+                topic, visual_script, code,
+                class_name=(find_scene_classes(code) or [None])[-1],
+                duration=get_duration(tasks.path(tasks.silent_video_file)), attempts=len(qa_runs),
+            )
+            job_store.update(job_id, progress=60)
+
+        def create_timing():
+            # Per-scene voiceover durations, so the code is written to fit the audio
+            job_store.update(job_id, phase="Phase 1b: Voiceover timing / Dang do thoi luong loi thoai...", progress=20)
+            manifest = build_timing_manifest(tasks.script_file, tasks.voiceover_file, tasks.timing_file)
+            job_store.update(job_id, audio_duration=manifest["total_duration"])
+
+        def measure_loudness():
+            measure_voiceover_loudness(tasks.voiceover_file, tasks.loudness_file)
+
+        def merge_video():
+            job_store.update(job_id, phase="Phase 3: Merging video & audio / Dang ghep video & audio...", progress=85)
+            production_task = tasks.production_task(bundle.producer)
+            with scheduler.resource("cpu"):
+                production_task.execute(agent=bundle.producer)
+
+        pipeline = Pipeline()
+        pipeline.add("script", create_script, outputs=[tasks.script_file])
+        pipeline.add(
+            "timing", create_timing,
+            inputs=[tasks.script_file], outputs=[tasks.voiceover_file, tasks.timing_file]
+        )
+        pipeline.add(
+            "develop", develop_code,
+            inputs=[tasks.script_file, tasks.timing_file],
+            outputs=[tasks.manim_code_file, tasks.silent_video_file]
+        )
+        pipeline.add(
+            "loudness", measure_loudness,
+            inputs=[tasks.voiceover_file], outputs=[tasks.loudness_file]
+        )
+        pipeline.add(
+            "merge", merge_video,
+            inputs=[tasks.silent_video_file, tasks.voiceover_file, tasks.loudness_file],
+            outputs=[tasks.final_video_file]
+        )
+
+        # Agents come warm from the shared pool and go back when the job ends;
+        # all tools read and write inside this job's own directory
+        # LLM token counts and latency are accounted to this job, per phase
+        with agent_pool.checkout() as bundle, tasks.workspace(), use_job(job_id):
+            try:
+                results = pipeline.run()
+            except PipelineError as e:
+                job_store.transition(
+                    job_id, ("running",), "error",
+                    error=str(e.error), timings=format_timings(e.results), llm_usage=usage.pop(job_id)
+                )
+                return
         
         # Complete
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["phase"] = "Completed! / Hoan thanh!"
-        jobs[job_id]["progress"] = 100
-        jobs[job_id]["video_path"] = "final_video.mp4"
+        job_store.transition(
+            job_id, ("running",), "completed",
+            phase="Completed! / Hoan thanh!", progress=100,
+            video_path=f"jobs/{job_id}/{tasks.final_video_file}",
+            timings=format_timings(results),
+            llm_usage=usage.pop(job_id)
+        )
         
     except Exception as e:
-        jobs[job_id]["status"] = "error"
-        jobs[job_id]["error"] = str(e)
+        job_store.transition(job_id, ("running",), "error", error=str(e), llm_usage=usage.pop(job_id))
 
 
 @app.route("/api/generate", methods=["POST"])
@@ -124,10 +324,12 @@ def generate_video():
     topic = data.get("topic", "Basic Derivatives")
     language = data.get("language", "en")
     duration = data.get("duration", 1)  # minutes
+    priority = int(data.get("priority", 5))  # lower runs first
+    use_cache = bool(data.get("use_cache", True))  # False forces a fresh script and code
     
     job_id = str(uuid.uuid4())[:8]
     
-    jobs[job_id] = {
+    job_store.create({
         "id": job_id,
         "topic": topic,
         "language": language,
@@ -135,29 +337,107 @@ def generate_video():
         "status": "queued",
         "phase": "Queued / Dang cho...",
         "progress": 0,
+        "priority": priority,
         "created_at": datetime.now().isoformat(),
+        "created_ts": time.time(),
+        "started_ts": None,
         "video_path": None,
+        "timings": None,
+        "llm_usage": None,
         "error": None
-    }
+    })
     
-    # Start generation in background thread
-    thread = threading.Thread(
-        target=run_video_generation,
-        args=(job_id, topic, language, duration)
-    )
-    thread.daemon = True
-    thread.start()
+    # Queue generation; a worker thread picks it up when a slot is free
+    try:
+        scheduler.submit(
+            job_id, run_video_generation, job_id, topic, language, duration, use_cache, priority=priority
+        )
+    except QueueFullError as e:
+        job_store.delete(job_id)
+        return jsonify({"error": str(e)}), 503
     
-    return jsonify({"job_id": job_id, "message": "Generation started / Da bat dau tao video"})
+    return jsonify({
+        "job_id": job_id,
+        "queue_position": scheduler.queue_position(job_id),
+        "message": "Generation queued / Da xep hang tao video"
+    })
+
+
+def status_payload(job):
+    """Job record plus live scheduler fields for status responses."""
+    job = dict(job)
+    job["queue_position"] = scheduler.queue_position(job["id"])
+    job["wait_seconds"] = round(wait_seconds(job), 2)
+    return job
 
 
 @app.route("/api/status/<job_id>", methods=["GET"])
 def get_status(job_id):
-    """Get job status."""
-    if job_id not in jobs:
+    """Get job status.
+
+    With ?since=<version>, long-polls until the job's version changes
+    (or ?timeout= seconds pass, default 25) before answering.
+    """
+    since = request.args.get("since", type=int)
+    if since is not None:
+        timeout = min(request.args.get("timeout", 25, type=float), 60)
+        job = job_store.wait_for_change(job_id, since, timeout=timeout)
+    else:
+        job = job_store.get(job_id)
+    if job is None:
         return jsonify({"error": "Job not found / Khong tim thay job"}), 404
     
-    return jsonify(jobs[job_id])
+    return jsonify(status_payload(job))
+
+
+@app.route("/api/status/<job_id>/stream", methods=["GET"])
+def stream_status(job_id):
+    """Push job updates as Server-Sent Events until the job finishes."""
+    if job_store.get(job_id) is None:
+        return jsonify({"error": "Job not found / Khong tim thay job"}), 404
+
+    def events():
+        version = None
+        last_payload = None
+        while True:
+            job = job_store.wait_for_change(job_id, version, timeout=15)
+            if job is None:
+                yield "event: error\ndata: {\"error\": \"Job not found / Khong tim thay job\"}\n\n"
+                return
+            payload = status_payload(job)
+            if payload != last_payload:
+                yield f"id: {job['version']}\ndata: {json.dumps(payload)}\n\n"
+                last_payload = payload
+            else:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+            if job.get("status") in TERMINAL_STATUSES:
+                return
+            version = job["version"]
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/scheduler", methods=["GET"])
+def scheduler_stats():
+    """Queue length, resource pool usage and agent pool usage."""
+    return jsonify(dict(scheduler.stats(), agent_pool=agent_pool.stats()))
+
+
+@app.route("/api/usage", methods=["GET"])
+def usage_stats():
+    """LLM calls, tokens and latency per phase since the server started."""
+    return jsonify(usage.totals())
+
+
+@app.route("/api/cache", methods=["GET"])
+def cache_stats():
+    """Response cache hit/miss metrics."""
+    return jsonify(dict(response_cache.stats(), scene_index=scene_index.stats()))
 
 
 @app.route("/api/videos", methods=["GET"])
@@ -165,21 +445,33 @@ def list_videos():
     """List generated videos."""
     videos = []
     
-    for filename in os.listdir(WORKSPACE_DIR):
-        if filename.endswith(".mp4"):
-            filepath = os.path.join(WORKSPACE_DIR, filename)
-            videos.append({
-                "name": filename,
-                "size": os.path.getsize(filepath),
-                "created_at": datetime.fromtimestamp(os.path.getctime(filepath)).isoformat()
-            })
+    # Videos at the workspace root (CLI runs) plus each job's final video
+    candidates = [f for f in os.listdir(WORKSPACE_DIR) if f.endswith(".mp4")]
+    if os.path.isdir(JOBS_DIR):
+        for job_dir in os.listdir(JOBS_DIR):
+            if os.path.exists(os.path.join(JOBS_DIR, job_dir, "final_video.mp4")):
+                candidates.append(f"jobs/{job_dir}/final_video.mp4")
+    
+    for name in candidates:
+        filepath = os.path.join(WORKSPACE_DIR, name)
+        videos.append({
+            "name": name,
+            "size": os.path.getsize(filepath),
+            "created_at": datetime.fromtimestamp(os.path.getctime(filepath)).isoformat()
+        })
     
     return jsonify(videos)
 
 
-@app.route("/api/videos/<filename>", methods=["GET"])
+# Final videos only: *.mp4 at the workspace root (CLI runs) or directly in a job directory
+SERVABLE_VIDEO = re.compile(r"^(?:jobs/[\w-]+/)?[\w-][\w.-]*\.mp4$")
+
+
+@app.route("/api/videos/<path:filename>", methods=["GET"])
 def get_video(filename):
     """Serve video file."""
+    if not SERVABLE_VIDEO.match(filename):
+        return jsonify({"error": "Video not found / Khong tim thay video"}), 404
     return send_from_directory(WORKSPACE_DIR, filename)
 
 
@@ -0,0 +1,424 @@
+# benchmarks/pipeline.py - Offline end-to-end run of main.py with a recorded LLM stand-in
+#
+# Usage:
+#   python benchmarks/pipeline.py [--repeat 3] [--replay recording.json] [--tts silent]
+#   python benchmarks/pipeline.py --record recording.json   # live Gemini calls, saved for replay
+#
+# The Gemini clients are replaced by a record/replay chat model and the search
+# tools by offline stubs; speech uses the silent (or espeak) backend. Everything
+# else is the real main.py flow: crewai agents and tools, manim renders, ffmpeg
+# merges. Every run is a fresh interpreter in an empty working directory, so all
+# caches start cold and numbers only move when code we control changes.
+#
+# Without --replay a built-in scripted session is replayed (one short two-scene
+# video), which needs no recording at all.
+
+import argparse
+import hashlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cache locations a caller may have set; the child uses the defaults under its
+# working directory instead, so every run starts cold
+CACHE_ENV = (
+    "RESPONSE_CACHE_PATH", "SCENE_INDEX_PATH", "RENDER_CACHE_DIR",
+    "TTS_CACHE_DIR", "LOUDNORM_CACHE_DIR", "DATA_DIR",
+)
+
+FLASH_MODEL = "gemini-3-flash-preview"
+PRO_MODEL = "gemini-3-pro-preview"
+
+# ---------------------------------------------------------------------------
+# Built-in scripted session (crewai ReAct answers, in call order per model)
+# ---------------------------------------------------------------------------
+
+SCRIPT = """[VISUAL SCRIPT]
+SCENE 1: Title "Derivatives" fades in, then the axes and the graph of x^2 are drawn.
+SCENE 2: The graph is replaced by the text "f'(x) = 2x" in gold, then everything fades out.
+
+[VOICEOVER SCRIPT]
+SCENE 1: The derivative tells us how fast a function changes. Here is the graph of x squared.
+SCENE 2: Its derivative is two x. Thanks for watching!
+"""
+
+CODE = '''from manim import *
+
+TEAL_E = "#49A88F"
+GOLD_E = "#C78D46"
+GREY_A = "#DDDDDD"
+
+
+class DerivativeVideo(Scene):
+    def construct(self):
+        # === SCENE 1 ===
+        title = Text("Derivatives", font_size=40).to_edge(UP)
+        axes = Axes(x_range=[0, 3, 1], y_range=[0, 9, 3], x_length=6, y_length=4,
+                    axis_config={"color": GREY_A})
+        graph = axes.plot(lambda x: x ** 2, x_range=[0, 3], color=TEAL_E)
+        self.play(FadeIn(title), run_time=1)
+        self.play(Create(axes), run_time=1.5)
+        self.play(Create(graph), run_time=2)
+        self.wait(2.3)
+
+        # === SCENE 2 ===
+        result = Text("f'(x) = 2x", font_size=48, color=GOLD_E)
+        self.play(ReplacementTransform(VGroup(axes, graph), result), run_time=1.5)
+        self.wait(1.5)
+        self.play(FadeOut(VGroup(title, result)), run_time=1)
+'''
+
+
+def _react(thought: str, tool: str, tool_input: dict) -> str:
+    return f"Thought: {thought}\nAction: {tool}\nAction Input: {json.dumps(tool_input)}"
+
+
+def _final(answer: str) -> str:
+    return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+
+
+SCRIPTED_CALLS = [
+    # Phase 1: storyteller (flash)
+    {"model": FLASH_MODEL, "response": _react(
+        "I will save the script.", "File Write Tool", {"file_path": "video_script.txt", "content": SCRIPT})},
+    {"model": FLASH_MODEL, "response": _final("The script was saved to video_script.txt.")},
+    # Phase 2: Manim developer (pro)
+    {"model": PRO_MODEL, "response": _react(
+        "I will save the Manim code.", "File Write Tool", {"file_path": "manim_animation.py", "content": CODE})},
+    {"model": PRO_MODEL, "response": _final("The code was saved to manim_animation.py.")},
+    # Phase 3: producer (flash)
+    {"model": FLASH_MODEL, "response": _react(
+        "I will merge video and audio.", "FFmpeg Video-Audio Merger",
+        {"video_file": "animation_scene.mp4", "audio_file": "voiceover.mp3",
+         "output_file": "final_video.mp4", "strategy": "auto"})},
+    {"model": FLASH_MODEL, "response": _final("The final video was created at final_video.mp4.")},
+]
+
+
+# ---------------------------------------------------------------------------
+# Record / replay stand-in for ChatGoogleGenerativeAI
+# ---------------------------------------------------------------------------
+
+class ReplayMissing(RuntimeError):
+    """The replay has no answer left for a model."""
+
+
+class ReplayStore:
+    """LLM answers keyed on (model, prompt), replayed in call order per model.
+
+    A prompt that was recorded verbatim gets its own answer; otherwise the next
+    unused answer for the model is returned and counted in `fallbacks`, which
+    keeps replays working when prompts drift (e.g. a changed task text).
+    """
+
+    def __init__(self, calls: list, workdir: str, record: bool = False, live_factory=None):
+        self.calls = [dict(call) for call in calls]
+        self.workdir = workdir
+        self.record = record
+        self._live_factory = live_factory
+        self._live = {}
+        self._used = set()
+        self._lock = threading.Lock()
+        self.metrics = {"calls": 0, "exact": 0, "fallbacks": 0, "recorded": 0}
+
+    def key(self, model: str, prompt: str) -> str:
+        # The working directory differs per run and shows up in tool observations
+        prompt = prompt.replace(self.workdir, "<workdir>")
+        return hashlib.sha256(f"{model}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def respond(self, model: str, temperature, messages, stop=None) -> str:
+        prompt = "\n\n".join(f"{message.type}: {message.content}" for message in messages)
+        key = self.key(model, prompt)
+        with self._lock:
+            self.metrics["calls"] += 1
+            if self.record:
+                live = self._live.get((model, temperature))
+                if live is None:
+                    live = self._live[(model, temperature)] = self._live_factory(model=model, temperature=temperature)
+                answer = live.invoke(messages, stop=stop).content
+                self.calls.append({"model": model, "key": key, "response": answer})
+                self.metrics["recorded"] += 1
+                return answer
+
+            unused = [i for i, call in enumerate(self.calls) if i not in self._used and call["model"] == model]
+            exact = [i for i in unused if self.calls[i].get("key") == key]
+            if exact:
+                index = exact[0]
+                self.metrics["exact"] += 1
+            elif unused:
+                index = unused[0]
+                self.metrics["fallbacks"] += 1
+            else:
+                raise ReplayMissing(f"No recorded answer left for {model} (call {self.metrics['calls']})")
+            self._used.add(index)
+            answer = self.calls[index]["response"]
+        for sequence in stop or ():
+            answer = answer.split(sequence, 1)[0]
+        return answer
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "calls": self.calls}, f, ensure_ascii=False, indent=1)
+
+
+def replay_chat_model(store: ReplayStore):
+    """A langchain chat model class answering from `store`, constructed like ChatGoogleGenerativeAI."""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    class ReplayChatModel(BaseChatModel):
+        model: str
+        temperature: float = 0.0
+
+        @property
+        def _llm_type(self) -> str:
+            return "replay"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            answer = store.respond(self.model, self.temperature, messages, stop)
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=answer))])
+
+    return ReplayChatModel
+
+
+def offline_tool(name: str):
+    """Search/scrape stand-in that answers without network access."""
+    from langchain.tools import BaseTool
+
+    class OfflineSearchTool(BaseTool):
+        description: str = "Offline stand-in used by the pipeline benchmark."
+
+        def _run(self, *args, **kwargs) -> str:
+            return "Offline benchmark: no results. / Khong co ket qua (che do offline)."
+
+    return OfflineSearchTool(name=f"Offline {name}")
+
+
+# ---------------------------------------------------------------------------
+# Per-phase measurement
+# ---------------------------------------------------------------------------
+
+class RssSampler(threading.Thread):
+    """Peak resident set size of this process while a phase runs (Linux /proc)."""
+
+    def __init__(self, interval: float = 0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def sample(self):
+        try:
+            with open("/proc/self/statm") as f:
+                self.peak = max(self.peak, int(f.read().split()[1]) * self._page)
+        except OSError:
+            # No /proc: fall back to the process-lifetime peak
+            self.peak = max(self.peak, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        self.sample()
+        return self.peak
+
+
+def measured(name: str, fn, phases: dict):
+    """Wrap a pipeline node: wall time, CPU of this process and of its children, peak RSS.
+
+    main.py runs its phases one after another, so process-wide counters are
+    attributed to the phase that was running.
+    """
+    def run():
+        sampler = RssSampler()
+        sampler.start()
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            wall = time.perf_counter() - started
+            own_after = resource.getrusage(resource.RUSAGE_SELF)
+            children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            phases[name] = {
+                "wall_s": round(wall, 4),
+                "cpu_s": round(own_after.ru_utime + own_after.ru_stime - own.ru_utime - own.ru_stime, 4),
+                "children_cpu_s": round(
+                    children_after.ru_utime + children_after.ru_stime - children.ru_utime - children.ru_stime, 4
+                ),
+                "peak_rss_mb": round(sampler.stop() / 2 ** 20, 1),
+                # Largest child (manim, ffmpeg) so far; ru_maxrss is in kilobytes on Linux
+                "children_maxrss_mb": round(children_after.ru_maxrss / 1024, 1),
+            }
+    return run
+
+
+# ---------------------------------------------------------------------------
+# One run (child process) and the driver
+# ---------------------------------------------------------------------------
+
+def run_child(args):
+    """Run main.main() once in the current (empty) directory and write the result JSON."""
+    sys.path.insert(0, ROOT)
+    workdir = os.getcwd()
+    calls = SCRIPTED_CALLS
+    if args.replay:
+        with open(args.replay, "r", encoding="utf-8") as f:
+            calls = json.load(f)["calls"]
+
+    import langchain_google_genai
+    live_factory = langchain_google_genai.ChatGoogleGenerativeAI
+    store = ReplayStore([] if args.record else calls, workdir, record=bool(args.record), live_factory=live_factory)
+    langchain_google_genai.ChatGoogleGenerativeAI = replay_chat_model(store)
+
+    import src.agents
+    real_get_tool = src.agents.get_tool
+    src.agents.get_tool = lambda name: offline_tool(name) if name in ("search", "scrape") else real_get_tool(name)
+
+    import main as cli
+    from src.llm_usage import usage
+    from src.pipeline import Pipeline
+
+    phases = {}
+    outcome = {}
+
+    class MeasuredPipeline(Pipeline):
+        def add(self, name, fn, inputs=(), outputs=()):
+            return super().add(name, measured(name, fn, phases), inputs, outputs)
+
+        def run(self):
+            try:
+                return super().run()
+            except Exception as e:
+                outcome["error"] = str(e)
+                raise
+
+    cli.Pipeline = MeasuredPipeline
+    started = time.perf_counter()
+    cli.main()
+    wall = time.perf_counter() - started
+
+    final_video = cli.tasks.path(cli.tasks.final_video_file)
+    result = {
+        "status": "failed" if "error" in outcome or not os.path.exists(final_video) else "ok",
+        "error": outcome.get("error"),
+        "wall_s": round(wall, 4),
+        "phases": phases,
+        "replay": store.metrics,
+        "llm_usage": usage.summary(),
+    }
+    if args.record:
+        store.save(args.record)
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+def run_once(args, env: dict) -> dict:
+    """One fresh interpreter in an empty directory; process totals from wait4()."""
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as workdir:
+        result_path = os.path.join(workdir, "result.json")
+        log_path = os.path.join(workdir, "run.log")
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--result", result_path]
+        if args.replay:
+            command += ["--replay", os.path.abspath(args.replay)]
+        if args.record:
+            command += ["--record", os.path.abspath(args.record)]
+        # Caches and the scene index live under the (empty) working directory
+        child_env = {key: value for key, value in os.environ.items() if key not in CACHE_ENV}
+        child_env.update(env)
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(command, cwd=workdir, env=child_env, stdout=log, stderr=log)
+            _, status, usage = os.wait4(process.pid, 0)
+        if os.path.exists(result_path):
+            with open(result_path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+        else:
+            with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+                tail = [line.rstrip() for line in f if line.strip()][-1:]
+            result = {"status": "failed", "error": tail[0] if tail else None, "phases": {}}
+        result["returncode"] = os.waitstatus_to_exitcode(status)
+        result["process"] = {
+            "cpu_s": round(usage.ru_utime + usage.ru_stime, 4),  # includes manim and ffmpeg
+            "maxrss_mb": round(usage.ru_maxrss / 1024, 1),
+        }
+        return result
+
+
+def summarize(runs: list) -> dict:
+    """Median wall/CPU and max peak RSS per phase over the successful runs."""
+    ok = [run for run in runs if run["status"] == "ok"]
+    names = []
+    for run in ok:
+        names += [name for name in run["phases"] if name not in names]
+    phases = {}
+    for name in names:
+        samples = [run["phases"][name] for run in ok if name in run["phases"]]
+        phases[name] = {
+            "wall_median_s": round(statistics.median(s["wall_s"] for s in samples), 4),
+            "cpu_median_s": round(statistics.median(s["cpu_s"] for s in samples), 4),
+            "children_cpu_median_s": round(statistics.median(s["children_cpu_s"] for s in samples), 4),
+            "peak_rss_mb": max(s["peak_rss_mb"] for s in samples),
+            "children_maxrss_mb": max(s["children_maxrss_mb"] for s in samples),
+        }
+    return {
+        "ok_runs": len(ok),
+        "wall_median_s": round(statistics.median(run["wall_s"] for run in ok), 4) if ok else None,
+        "phases": phases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--replay", help="recording to replay (default: built-in scripted session)")
+    parser.add_argument("--record", help="call Gemini for real and save the answers to this file")
+    parser.add_argument("--tts", default="silent", help="TTS backend: silent (default), espeak or gtts")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    env = {
+        "TTS_BACKEND": args.tts,
+        "SERPER_API_KEY": os.environ.get("SERPER_API_KEY", "offline-benchmark"),
+        "OTEL_SDK_DISABLED": "true",  # no crewai telemetry from benchmark runs
+        "SPECULATIVE_CANDIDATES": "1",  # replays follow the sequential call order
+    }
+    runs = [run_once(args, env) for _ in range(1 if args.record else args.repeat)]
+    report = dict(
+        {
+            "python": sys.version.split()[0],
+            "replay": "record" if args.record else (args.replay or "scripted"),
+            "tts_backend": args.tts,
+            "repeat": len(runs),
+        },
+        **summarize(runs),
+        runs=runs,
+    )
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/startup.py - Cold-start time and memory of the CLI and the API server
+#
+# Usage: python benchmarks/startup.py [--targets cli_preflight api_server] [--repeat 5] [--top 10]
+#
+# Every run is a fresh interpreter, so numbers include Python start-up and
+# reflect what a new container pays before it can serve its first request.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (python arguments, extra environment)
+TARGETS = {
+    # main.py up to the SERPER_API_KEY check (the fail-fast path)
+    "cli_preflight": (["main.py"], {"SERPER_API_KEY": ""}),
+    # Everything main.py imports once the key check has passed
+    "cli_imports": ([
+        "-c",
+        "import src.agents, src.tasks, src.pipeline, src.qa, src.repair, src.response_cache, src.scene_index, src.speculative, src.timing, "
+        "src.tools.manim_tools, langchain_google_genai",
+    ], {}),
+    # Flask app ready to serve; agents are warmed separately (AGENT_POOL_WARM=0)
+    "api_server": (["-c", "import api.server"], {"AGENT_POOL_WARM": "0", "JOB_STORE": "memory"}),
+    # Agent factory module alone: must not pull in crewai or build tools
+    "agents_module": (["-c", "import src.agents"], {}),
+}
+
+
+def run_once(args: list, env: dict, import_time: bool = False) -> dict:
+    """Run one fresh interpreter; wall time from here, CPU and peak RSS from wait4()."""
+    command = [sys.executable] + (["-X", "importtime"] if import_time else []) + args
+    with tempfile.TemporaryFile() as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            command, cwd=ROOT, env=dict(os.environ, **env),
+            stdout=subprocess.DEVNULL, stderr=stderr
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stderr.seek(0)
+        err = stderr.read().decode("utf-8", "replace")
+    return {
+        "wall_s": wall,
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        "maxrss_mb": usage.ru_maxrss / 1024,  # kilobytes on Linux
+        "returncode": process.returncode,
+        "stderr": err,
+    }
+
+
+def slowest_imports(importtime_output: str, top: int) -> list:
+    """Top-level packages by cumulative import time from `python -X importtime`."""
+    totals = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue
+        package = name.strip().split(".")[0]
+        # Only outermost imports (no indentation) so nested modules are not double counted
+        if name == name.lstrip():
+            totals[package] = totals.get(package, 0) + cumulative_us
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def bench_target(name: str, repeat: int, top: int) -> dict:
+    args, env = TARGETS[name]
+    runs = [run_once(args, env) for _ in range(repeat)]
+    walls = [run["wall_s"] for run in runs]
+    profile = run_once(args, env, import_time=True)
+    result = {
+        "target": name,
+        "returncode": runs[-1]["returncode"],
+        "wall_median_s": round(statistics.median(walls), 4),
+        "wall_min_s": round(min(walls), 4),
+        "cpu_median_s": round(statistics.median(run["cpu_s"] for run in runs), 4),
+        "maxrss_mb": round(max(run["maxrss_mb"] for run in runs), 1),
+        "slowest_imports": slowest_imports(profile["stderr"], top),
+    }
+    if result["returncode"] not in (0, None):
+        # e.g. a dependency missing in this environment; keep the reason visible
+        tail = [line for line in runs[-1]["stderr"].splitlines() if line.strip()][-1:]
+        result["error"] = tail[0] if tail else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark")
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list per target")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "results": [bench_target(name, args.repeat, args.top) for name in args.targets],
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
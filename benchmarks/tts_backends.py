@@ -0,0 +1,108 @@
+# benchmarks/tts_backends.py - Compare TTS backend latency and throughput on the same scripts
+#
+# Usage: python benchmarks/tts_backends.py [--backends gtts espeak] [--repeat 3] [--workers 4]
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools.media import get_duration
+from src.tools.tts_backends import BACKENDS, get_backend
+from src.tools.tts_cache import split_sentences
+
+# Fixed scripts so numbers are comparable between runs and backends
+SCRIPTS = {
+    "en": (
+        "Welcome to this short lesson on derivatives. "
+        "The derivative measures how fast a function changes. "
+        "For x to the power n, the derivative is n times x to the power n minus one. "
+        "The derivative of sine x is cosine x. "
+        "And the exponential function is its own derivative. "
+        "Thanks for watching!"
+    ),
+    "vi": (
+        "Chào mừng bạn đến với bài học ngắn về đạo hàm. "
+        "Đạo hàm đo tốc độ thay đổi của một hàm số. "
+        "Đạo hàm của sin x là cos x. "
+        "Cảm ơn bạn đã xem!"
+    ),
+}
+
+
+def bench_backend(name: str, repeat: int, workers: int) -> dict:
+    backend = get_backend(name)
+    if not backend.is_available():
+        return {"backend": name, "available": False}
+
+    latencies, audio_seconds, char_count = [], 0.0, 0
+    parallel_walls = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for run in range(repeat):
+            for language, script in SCRIPTS.items():
+                sentences = split_sentences(script)
+
+                # Serial: per-sentence latency
+                for i, sentence in enumerate(sentences):
+                    path = os.path.join(out_dir, f"{run}_{language}_{i}.mp3")
+                    started = time.perf_counter()
+                    backend.synthesize(sentence, language, False, path)
+                    latencies.append(time.perf_counter() - started)
+                    audio_seconds += get_duration(path)
+                    char_count += len(sentence)
+
+                # Parallel: whole script with a bounded pool, as chunked mode does
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    list(pool.map(
+                        lambda item: backend.synthesize(
+                            item[1], language, False,
+                            os.path.join(out_dir, f"p{run}_{language}_{item[0]}.mp3")
+                        ),
+                        enumerate(sentences),
+                    ))
+                parallel_walls.append(time.perf_counter() - started)
+
+    total = sum(latencies)
+    ordered = sorted(latencies)
+    return {
+        "backend": name,
+        "available": True,
+        "sentences": len(latencies),
+        "latency_mean_s": round(statistics.mean(latencies), 4),
+        "latency_p50_s": round(ordered[len(ordered) // 2], 4),
+        "latency_p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "chars_per_second": round(char_count / total, 1) if total else None,
+        "realtime_factor": round(audio_seconds / total, 2) if total and audio_seconds else None,
+        "parallel_script_wall_s": round(statistics.mean(parallel_walls), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS backend benchmark")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "results": [bench_backend(name, args.repeat, args.workers) for name in args.backends],
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,26 @@ from dotenv import load_dotenv
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = 'credentials.json'
 load_dotenv()
 
+# Checked before crewai, langchain and manim are loaded, so a missing key fails fast
+# Kiem tra truoc khi nap cac thu vien nang
+serper_api_key = os.getenv("SERPER_API_KEY")
+if not serper_api_key:
+    print("[ERROR] Please set SERPER_API_KEY in .env file")
+    print("[LOI] Vui long thiet lap SERPER_API_KEY trong file .env")
+    exit()
+
 from src.agents import VideoAgents
 from src.tasks import VideoTasks
+from src.pipeline import Pipeline, PipelineError, format_timings
+from src.llm_usage import format_usage, usage, usage_callback
+from src.qa import run_qa
+from src.repair import repair_or_report
+from src.response_cache import ResponseCache
+from src.scene_index import SceneIndex
+from src.speculative import SPECULATIVE_CANDIDATES, generate_candidates
+from src.timing import build_timing_manifest, measure_voiceover_loudness, script_section
+from src.tools.manim_tools import ManimExecutionTool, find_scene_classes
+from src.tools.media import get_duration
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 
@@ -18,24 +36,20 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 # BUOC 2: KHOI TAO LLM VA AGENTS
 # --------------------------------------------------------------------------
 
-serper_api_key = os.getenv("SERPER_API_KEY")
-if not serper_api_key:
-    print("[ERROR] Please set SERPER_API_KEY in .env file")
-    print("[LOI] Vui long thiet lap SERPER_API_KEY trong file .env")
-    exit()
-
 print("[INFO] Initializing LLM Flash for creative tasks...")
 print("[INFO] Khoi tao LLM Flash cho cac tac vu sang tao...")
 llm_flash = ChatGoogleGenerativeAI(
     model="gemini-3-flash-preview",
-    temperature=1
+    temperature=1,
+    callbacks=[usage_callback()]
 )
 
 print("[INFO] Initializing LLM Pro for coding tasks...")
 print("[INFO] Khoi tao LLM Pro cho tac vu viet code...")
 llm_pro = ChatGoogleGenerativeAI(
     model="gemini-3-pro-preview",
-    temperature=0.4
+    temperature=0.4,
+    callbacks=[usage_callback()]
 )
 
 agents = VideoAgents()
@@ -45,101 +59,235 @@ print("[INFO] Assigning LLMs to specialized Agents...")
 print("[INFO] Phan cong LLM cho cac Agent chuyen biet...")
 storyteller = agents.storyteller_agent(llm_flash)
 manim_dev = agents.manim_developer_agent(llm_pro) 
-qa_engineer = agents.qa_engineer_agent(llm_flash)
-voice_artist = agents.voiceover_artist_agent(llm_flash)
 producer = agents.production_engineer_agent(llm_flash)
 
+# Approved script/code per topic, reused across runs / Kich ban & ma da duyet
+response_cache = ResponseCache()
+# Approved code of earlier runs, shown to the developer for similar topics
+scene_index = SceneIndex()
+
 
 # --------------------------------------------------------------------------
 # STEP 3: MAIN WORKFLOW / QUY TRINH CHINH
 # --------------------------------------------------------------------------
 
-def main():
-    """
-    Main function controlling the entire video production process.
-    Ham chinh dieu khien toan bo quy trinh san xuat video.
-    """
-    # Change topic here / Thay doi chu de o day
-    video_topic = "Basic Derivatives - derivative of x^n, sin(x), e^x - 1 minute video"
-    # Vietnamese example / Vi du tieng Viet:
-    # video_topic = "Dao ham co ban - derivative of x^n, sin(x), e^x - video 1 phut tieng Viet"
-    
-    max_retries = 5
+def cache_request(video_topic):
+    """Response cache key fields for this run. / Khoa bo nho dem."""
+    return dict(
+        model=f"{llm_flash.model}|{llm_pro.model}",
+        prompt=tasks.storytelling_prompt("{topic}"),
+        topic=video_topic,
+    )
+
+
+def read_file(file_name):
+    with open(tasks.path(file_name), "r", encoding="utf-8") as f:
+        return f.read()
 
-    print(f"\n[START] Beginning video production for topic: '{video_topic}'")
-    print(f"[BAT DAU] Bat dau quy trinh san xuat video cho chu de: '{video_topic}'")
 
-    # --- PHASE 1: SCRIPT CREATION / GIAI DOAN 1: TAO KICH BAN ---
+def write_file(file_name, content):
+    with open(tasks.path(file_name), "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def create_script(video_topic, reuse):
+    """Phase 1: write the script file. / Giai doan 1: tao kich ban."""
     print("\n[PHASE 1] CREATING SCRIPT...")
     print("[GIAI DOAN 1] TAO KICH BAN...")
+    request = cache_request(video_topic)
+    cached = response_cache.lookup(**request)
+    if cached:
+        print(f"[CACHE] Reusing script of '{cached['topic']}' ({cached['match']} match) / Dung lai kich ban da luu")
+        write_file(tasks.script_file, cached["script"])
+        reuse["code"] = cached["code"]
+        return
+
     story_task = tasks.storytelling_task(storyteller, video_topic)
     script_result = story_task.execute(agent=storyteller)
     print(f"[OK] Script created / Kich ban da duoc tao: {script_result}")
+    response_cache.store(**request, script=read_file(tasks.script_file))
 
-    # --- PHASE 2: DEVELOPMENT & ERROR FIX LOOP / GIAI DOAN 2: PHAT TRIEN & SUA LOI ---
+
+def repair_after_failure(qa):
+    """Targeted patch first; regenerate the whole file only if it does not apply."""
+    patched, note, error_report = repair_or_report(llm_pro, tasks.manim_code_file, qa)
+    if patched:
+        print(f"[PATCH] Applied a targeted fix / Da va loi ({note})")
+    else:
+        print(f"[PATCH] No usable patch, regenerating / Khong va duoc, viet lai: {note}")
+    return patched, error_report
+
+
+def develop_code(video_topic, reuse, max_retries=5):
+    """Phase 2: write, QA and render the Manim code. / Giai doan 2: phat trien & sua loi."""
     print("\n[PHASE 2] STARTING DEVELOPMENT & ERROR FIX LOOP...")
     print("[GIAI DOAN 2] BAT DAU VONG LAP PHAT TRIEN & SUA LOI...")
     
-    code_task = tasks.manim_development_task(manim_dev)
+    # Code that rendered for similar topics before grounds the first attempt
+    visual_script = script_section(read_file(tasks.script_file), "VISUAL SCRIPT")
+    references = scene_index.prompt_examples(video_topic, visual_script)
+    if references:
+        print(f"[INDEX] {references.count('```python')} approved example(s) for similar topics / vi du da duyet")
+
+    code_task = tasks.manim_development_task(manim_dev, references)
     current_error_report = ""
     is_code_approved = False
+    attempts = 0
 
-    for i in range(max_retries):
+    # Previously approved code for this topic skips the developer entirely
+    if reuse.get("code"):
+        write_file(tasks.manim_code_file, reuse["code"])
+        is_code_approved = run_qa(tasks.manim_code_file).passed
+        if is_code_approved:
+            print("[CACHE] Reusing approved code / Dung lai ma da duyet")
+
+    patched = False
+    # Several candidates at once; the first that passes QA wins (SPECULATIVE_CANDIDATES > 1)
+    if not is_code_approved and SPECULATIVE_CANDIDATES > 1:
+        print(f"[DEV] Writing {SPECULATIVE_CANDIDATES} candidates in parallel / Viet {SPECULATIVE_CANDIDATES} ban song song...")
+        speculative = generate_candidates(llm_pro, tasks, SPECULATIVE_CANDIDATES, references=references)
+        if speculative.qa is not None:
+            attempts += 1
+        for candidate in speculative.candidates:
+            print(f"  #{candidate.index} T={candidate.temperature}: {candidate.status} "
+                  f"{candidate.qa.error_class if candidate.qa else candidate.error or ''}")
+        if speculative.passed:
+            print(f"[SUCCESS] Candidate #{speculative.winner.index} passed QA ({speculative.elapsed:.1f}s)")
+            is_code_approved = True
+        elif speculative.qa is not None:
+            patched, current_error_report = repair_after_failure(speculative.qa)
+
+    for i in range(0 if is_code_approved else max_retries):
         print(f"\n--- Attempt #{i + 1}/{max_retries} / Lan thu #{i + 1}/{max_retries} ---")
         
-        if current_error_report:
-            code_task.description = (
-                "Your previous code had execution errors. "
-                "Read the error report below, analyze the cause and rewrite the code correctly. "
-                "Make sure to follow the 'Manim Programming Handbook' strictly.\n"
-                "---\n"
-                "Ma truoc do cua ban da gap loi. "
-                "Doc bao cao loi ben duoi, phan tich nguyen nhan va viet lai ma cho chinh xac.\n"
-                f"--- ERROR REPORT / BAO CAO LOI ---\n{current_error_report}\n--- END / KET THUC ---\n\n"
-                f"Read [VISUAL SCRIPT] from file '{tasks.script_file}' and write complete Manim code. "
-                f"Save code to file '{tasks.manim_code_file}'."
-            )
-        
-        print("[DEV] Developer is writing/fixing code...")
-        print("[DEV] Lap trinh vien dang viet/sua ma...")
-        code_result = code_task.execute(agent=manim_dev)
-        print(f"[OK] Code written/fixed / Ma da duoc viet/sua: {code_result}")
+        if patched:
+            # The last failure was fixed by a patch; only QA has to run again
+            print("[DEV] Checking the patched code / Kiem tra ma da va...")
+        else:
+            if current_error_report:
+                code_task.description = tasks.manim_fix_description(current_error_report)
 
-        print("[QA] Checking code / Dang kiem tra ma...")
-        qa_task = tasks.qa_task(qa_engineer)
-        qa_result = qa_task.execute(agent=qa_engineer)
+            print("[DEV] Developer is writing/fixing code...")
+            print("[DEV] Lap trinh vien dang viet/sua ma...")
+            code_result = code_task.execute(agent=manim_dev)
+            print(f"[OK] Code written/fixed / Ma da duoc viet/sua: {code_result}")
 
-        print(f"[REPORT] QA Result / Ket qua QA:\n{qa_result}")
+        print("[QA] Checking code / Dang kiem tra ma...")
+        qa = run_qa(tasks.manim_code_file)
+        attempts += 1
 
-        if "SUCCESS" in qa_result.upper() or "THANH CONG" in qa_result.upper():
-            print("\n[SUCCESS] QA approved code! Moving to production phase.")
+        if qa.passed:
+            print(f"\n[SUCCESS] QA approved code ({qa.class_name}, {qa.elapsed:.1f}s)! Moving to production phase.")
             print("[THANH CONG] QA da phe duyet ma! Chuyen sang giai doan san xuat.")
             is_code_approved = True
             break
         else:
-            print("[BUG] QA found errors. Preparing for next fix attempt.")
+            print(f"[BUG] QA found errors: {qa.error_class}. Preparing for next fix attempt.")
             print("[LOI] QA tim thay loi. Chuan bi cho lan sua tiep theo.")
-            current_error_report = qa_result
+            for line in qa.traceback[-5:]:
+                print(f"  {line}")
+            # A patch after the last attempt would never be checked
+            if i + 1 < max_retries:
+                patched, current_error_report = repair_after_failure(qa)
     
     if not is_code_approved:
-        print(f"\n[ERROR] CRITICAL: Developer could not fix errors after {max_retries} attempts. Stopping.")
-        print(f"[LOI] NGHIEM TRONG: Lap trinh vien khong the sua loi sau {max_retries} lan thu. Dung lai.")
-        return
+        raise RuntimeError(
+            f"Developer could not fix errors after {max_retries} attempts / "
+            f"Lap trinh vien khong the sua loi sau {max_retries} lan thu"
+        )
+
+    # QA only validated the code; render the approved version once at full quality
+    print("\n[RENDER] Final 1080p render of approved code / Render 1080p ma da duyet...")
+    render_result = ManimExecutionTool().render_file(tasks.manim_code_file, quality="h", fps=30)
+    print(render_result)
+    if not render_result.startswith("[OK]"):
+        raise RuntimeError(f"Final render failed / Render cuoi that bai: {render_result}")
+    code = read_file(tasks.manim_code_file)
+    response_cache.store(**cache_request(video_topic), script=read_file(tasks.script_file), code=code)
+    scene_index.add(
+        video_topic, visual_script, code,
+        class_name=(find_scene_classes(code) or [None])[-1],
+        duration=get_duration(tasks.path(tasks.silent_video_file)), attempts=attempts,
+    )
 
-    # --- PHASE 3: PRODUCTION / GIAI DOAN 3: SAN XUAT ---
+
+def create_timing():
+    """Voiceover per scene + timing.json, before any code is written. / Do thoi luong tung scene."""
+    print("[TTS] Creating voiceover and timing manifest / Dang tao loi thoai va bang thoi luong...")
+    manifest = build_timing_manifest(tasks.script_file, tasks.voiceover_file, tasks.timing_file)
+    for scene in manifest["scenes"]:
+        print(f"  SCENE {scene['scene']}: {scene['duration']:.2f}s")
+    print(f"[OK] Voiceover created / Loi thoai da duoc tao: {manifest['total_duration']:.2f}s")
+
+
+def measure_loudness():
+    """First loudness pass over the voiceover, alongside development. / Do am luong loi thoai."""
+    measurements = measure_voiceover_loudness(tasks.voiceover_file, tasks.loudness_file)
+    if measurements:
+        print(f"[OK] Voiceover loudness / Am luong loi thoai: {measurements['input_i']:.1f} LUFS")
+
+
+def merge_video():
+    """Phase 3b: merge video and voiceover. / Ghep video va loi thoai."""
     print("\n[PHASE 3] PRODUCTION...")
     print("[GIAI DOAN 3] SAN XUAT...")
-    
-    print("[TTS] Creating voiceover / Dang tao loi thoai...")
-    voice_task = tasks.voiceover_task(voice_artist)
-    voice_result = voice_task.execute(agent=voice_artist)
-    print(f"[OK] Voiceover created / Loi thoai da duoc tao: {voice_result}")
-
     print("[RENDER] Building final video / Dang dung video cuoi cung...")
     production_task = tasks.production_task(producer)
     final_result = production_task.execute(agent=producer)
     print(f"[OK] Final video created / Video cuoi cung da duoc tao: {final_result}")
-    
+
+
+def main():
+    """
+    Main function controlling the entire video production process.
+    Ham chinh dieu khien toan bo quy trinh san xuat video.
+    """
+    # Change topic here / Thay doi chu de o day
+    video_topic = "Basic Derivatives - derivative of x^n, sin(x), e^x - 1 minute video"
+    # Vietnamese example / Vi du tieng Viet:
+    # video_topic = "Dao ham co ban - derivative of x^n, sin(x), e^x - video 1 phut tieng Viet"
+
+    print(f"\n[START] Beginning video production for topic: '{video_topic}'")
+    print(f"[BAT DAU] Bat dau quy trinh san xuat video cho chu de: '{video_topic}'")
+
+    # The voiceover is measured per scene first so the code is timed to it
+    # Loi thoai duoc do theo tung scene truoc de ma Manim khop voi audio
+    reuse = {}
+    pipeline = Pipeline()
+    pipeline.add("script", lambda: create_script(video_topic, reuse), outputs=[tasks.script_file])
+    pipeline.add(
+        "timing", create_timing,
+        inputs=[tasks.script_file], outputs=[tasks.voiceover_file, tasks.timing_file]
+    )
+    pipeline.add(
+        "develop", lambda: develop_code(video_topic, reuse),
+        inputs=[tasks.script_file, tasks.timing_file],
+        outputs=[tasks.manim_code_file, tasks.silent_video_file]
+    )
+    pipeline.add(
+        "loudness", measure_loudness,
+        inputs=[tasks.voiceover_file], outputs=[tasks.loudness_file]
+    )
+    pipeline.add(
+        "merge", merge_video,
+        inputs=[tasks.silent_video_file, tasks.voiceover_file, tasks.loudness_file],
+        outputs=[tasks.final_video_file]
+    )
+
+    try:
+        with tasks.workspace():
+            results = pipeline.run()
+    except PipelineError as e:
+        print(f"\n[ERROR] CRITICAL: {e}. Stopping.")
+        print(f"[LOI] NGHIEM TRONG: {e}. Dung lai.")
+        return
+
+    print(f"\n[TIMING] Phase durations / Thoi gian tung giai doan: {format_timings(results)}")
+    print(f"[CACHE] Response cache / Bo nho dem phan hoi: {response_cache.stats()}")
+    print(f"[INDEX] Approved code index / Chi muc ma da duyet: {scene_index.stats()}")
+    print("[TOKENS] LLM usage per phase / Token theo giai doan:")
+    for line in format_usage(usage.summary()):
+        print(f"  {line}")
     print("\n=== VIDEO PRODUCTION COMPLETE! / QUY TRINH SAN XUAT VIDEO DA HOAN TAT! ===")
 
 
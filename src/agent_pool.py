@@ -0,0 +1,145 @@
+# src/agent_pool.py - Process-wide warm pool of LLM clients and agents
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Models used by the API / Mo hinh dung cho API
+FLASH_MODEL = ("gemini-3-flash-preview", 1.0)
+PRO_MODEL = ("gemini-3-pro-preview", 0.4)
+
+
+def create_llms():
+    """(llm_flash, llm_pro). Each client keeps its own connection to the API,
+    so sharing them across jobs reuses those connections."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from .llm_usage import usage_callback
+    callbacks = [usage_callback()]
+    llm_flash = ChatGoogleGenerativeAI(model=FLASH_MODEL[0], temperature=FLASH_MODEL[1], callbacks=callbacks)
+    llm_pro = ChatGoogleGenerativeAI(model=PRO_MODEL[0], temperature=PRO_MODEL[1], callbacks=callbacks)
+    return llm_flash, llm_pro
+
+
+@dataclass
+class AgentBundle:
+    """The agents one job needs. A bundle is used by one job at a time."""
+
+    llm_flash: object
+    llm_pro: object
+    storyteller: object
+    manim_dev: object
+    producer: object
+
+    def agents(self) -> list:
+        return [self.storyteller, self.manim_dev, self.producer]
+
+    def reset(self):
+        """Forget tool results cached by the previous job (e.g. file reads)."""
+        from crewai.agents import CacheHandler
+        for agent in self.agents():
+            agent.set_cache_handler(CacheHandler())
+
+
+def build_bundle(llm_flash, llm_pro) -> AgentBundle:
+    from .agents import VideoAgents
+    agents = VideoAgents()
+    return AgentBundle(
+        llm_flash=llm_flash,
+        llm_pro=llm_pro,
+        storyteller=agents.storyteller_agent(llm_flash),
+        manim_dev=agents.manim_developer_agent(llm_pro),
+        producer=agents.production_engineer_agent(llm_flash),
+    )
+
+
+class AgentPool:
+    """Up to `size` agent bundles sharing one pair of LLM clients.
+
+    crewai Agents keep per-run state (executor, tool cache), so bundles are
+    checked out exclusively; the LLM clients and tools are stateless and shared.
+    Bundles are built on demand or ahead of time with warm().
+    """
+
+    def __init__(self, size: int = 4, llm_factory=create_llms, bundle_factory=build_bundle):
+        self.size = size
+        self._llm_factory = llm_factory
+        self._bundle_factory = bundle_factory
+        self._llms = None
+        self._idle = queue.LifoQueue()  # most recently used first
+        self._lock = threading.Lock()
+        self._created = 0
+        self._checkouts = 0
+        self._build_seconds = 0.0
+
+    def llms(self) -> tuple:
+        with self._lock:
+            if self._llms is None:
+                started = time.perf_counter()
+                self._llms = self._llm_factory()
+                self._build_seconds += time.perf_counter() - started
+            return self._llms
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _build(self) -> AgentBundle:
+        llm_flash, llm_pro = self.llms()
+        started = time.perf_counter()
+        try:
+            bundle = self._bundle_factory(llm_flash, llm_pro)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._build_seconds += time.perf_counter() - started
+        return bundle
+
+    def warm(self, count: int = None) -> int:
+        """Build bundles ahead of the first jobs. Returns how many were built."""
+        built = 0
+        for _ in range(self.size if count is None else min(count, self.size)):
+            if not self._reserve():
+                break
+            self._idle.put(self._build())
+            built += 1
+        return built
+
+    @contextmanager
+    def checkout(self, timeout: float = None):
+        """Borrow a bundle for one job; it goes back to the pool afterwards."""
+        try:
+            bundle = self._idle.get_nowait()
+        except queue.Empty:
+            if self._reserve():
+                bundle = self._build()
+            else:
+                try:
+                    bundle = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError("No agent bundle available / Khong con bo agent ranh") from None
+        bundle.reset()
+        with self._lock:
+            self._checkouts += 1
+        try:
+            yield bundle
+        finally:
+            self._idle.put(bundle)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = self._idle.qsize()
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": idle,
+                "in_use": self._created - idle,
+                "checkouts": self._checkouts,
+                "build_seconds": round(self._build_seconds, 3),
+            }
@@ -1,21 +1,36 @@
 # src/agents.py - 3BLUE1BROWN AESTHETIC + MANIM COMMUNITY COMPATIBLE
 
-from crewai import Agent
-from crewai_tools import SerperDevTool, ScrapeWebsiteTool
-from .tools.file_tools import FileWriteTool, CustomFileReadTool
-from .tools.manim_tools import ManimExecutionTool, FFmpegTool, VideoDurationTool
-from .tools.tts_tools import TextToSpeechTool, EnhancedTTSTool
-
-# Khởi tạo các công cụ
-search_tool = SerperDevTool()
-scrape_tool = ScrapeWebsiteTool()
-file_write_tool = FileWriteTool()
-file_read_tool = CustomFileReadTool() 
-tts_tool = TextToSpeechTool()
-enhanced_tts_tool = EnhancedTTSTool()
-manim_tool = ManimExecutionTool()
-ffmpeg_tool = FFmpegTool()
-duration_tool = VideoDurationTool()
+import os
+import re
+from functools import lru_cache
+
+
+# Khởi tạo các công cụ khi dùng lần đầu (crewai, langchain, gTTS nạp chậm)
+# Tools are built on first use; importing this module stays cheap
+@lru_cache(maxsize=None)
+def get_tool(name: str):
+    """Shared tool instance by name, created on first request."""
+    if name == "search":
+        from crewai_tools import SerperDevTool
+        return SerperDevTool()
+    if name == "scrape":
+        from crewai_tools import ScrapeWebsiteTool
+        return ScrapeWebsiteTool()
+    if name in ("file_write", "file_read"):
+        from .tools.file_tools import FileWriteTool, CustomFileReadTool
+        return FileWriteTool() if name == "file_write" else CustomFileReadTool()
+    if name in ("manim", "ffmpeg", "duration"):
+        from .tools.manim_tools import ManimExecutionTool, FFmpegTool, VideoDurationTool
+        return {"manim": ManimExecutionTool, "ffmpeg": FFmpegTool, "duration": VideoDurationTool}[name]()
+    if name in ("tts", "enhanced_tts"):
+        from .tools.tts_tools import TextToSpeechTool, EnhancedTTSTool
+        return TextToSpeechTool() if name == "tts" else EnhancedTTSTool()
+    raise ValueError(f"Unknown tool '{name}'")
+
+
+def _agent(**kwargs):
+    from crewai import Agent
+    return Agent(**kwargs)
 
 
 # ============================================================================
@@ -171,9 +186,83 @@ LUẬT BẮT BUỘC
 '''
 
 
+# full: whole handbook in the developer's backstory (every call pays for the example)
+# compact: rules only in the backstory, a stable prefix the provider can cache;
+#          the example scenes relevant to the script go into the task instead
+HANDBOOK_MODE = os.environ.get("HANDBOOK_MODE", "compact").lower()
+
+_SECTION_RULE = re.compile(r"^━+\n", re.MULTILINE)
+_SCENE_MARKER = re.compile(r"^ *# === SCENE", re.MULTILINE)
+
+# Words in the script -> Manim names in an example scene that show how to draw them
+_EXAMPLE_HINTS = (
+    (("đồ thị", "graph", "trục", "axes", "hàm số", "function", "đường cong", "curve"), ("Axes(", ".plot(")),
+    (("công thức", "formula", "phương trình", "equation", "đạo hàm", "derivative", "tích phân", "integral"), ("MathTex(",)),
+    (("biến đổi", "transform", "chuyển thành"), ("Transform(",)),
+    (("sin", "cos", "lượng giác", "trig"), ("np.sin", "np.cos")),
+    (("e^x", "hàm mũ", "exponential", "logarit", "log"), ("np.exp",)),
+    (("tổng kết", "summary", "tóm tắt", "recap", "danh sách", "list"), (".arrange(",)),
+)
+
+
+@lru_cache(maxsize=None)
+def handbook_sections() -> tuple:
+    """(title, body) pairs of MANIM_HANDBOOK; the text before the first section has title ''."""
+    parts = _SECTION_RULE.split(MANIM_HANDBOOK)
+    sections = [("", parts[0])]
+    for i in range(1, len(parts) - 1, 2):
+        sections.append((parts[i].strip(), parts[i + 1]))
+    return tuple(sections)
+
+
+def _is_example(title: str) -> bool:
+    return title.startswith("MẪU")
+
+
+@lru_cache(maxsize=None)
+def handbook_rules() -> str:
+    """The handbook without its example code: identical for every job."""
+    rule = "━" * 56
+    text = ""
+    for title, body in handbook_sections():
+        if not title:
+            text += body
+        elif not _is_example(title):
+            text += f"{rule}\n{title}\n{rule}\n{body}"
+    return text
+
+
+def handbook_examples(script: str, limit: int = 2) -> str:
+    """Example scenes from the handbook most relevant to `script`, with the example's imports."""
+    script = (script or "").lower()
+    wanted = [names for words, names in _EXAMPLE_HINTS if any(word in script for word in words)]
+    blocks = []
+    for title, body in handbook_sections():
+        if not _is_example(title) or "```python" not in body:
+            continue
+        code = body.split("```python", 1)[1].split("```", 1)[0]
+        starts = [match.start() for match in _SCENE_MARKER.finditer(code)]
+        if not starts:
+            blocks.append(f"{title}\n```python{code}```")
+            continue
+        preamble = code[:starts[0]]
+        scenes = [code[start:end] for start, end in zip(starts, starts[1:] + [len(code)])]
+        scored = [
+            (sum(1 for names in wanted if any(name in scene for name in names)), -i)
+            for i, scene in enumerate(scenes)
+        ]
+        chosen = sorted(sorted(range(len(scenes)), key=lambda i: scored[i], reverse=True)[:limit])
+        chosen = [i for i in chosen if scored[i][0] > 0] or [0]
+        blocks.append(
+            f"{title} ({len(chosen)}/{len(scenes)} scenes)\n```python{preamble}"
+            + "".join(scenes[i] for i in chosen).rstrip() + "\n```"
+        )
+    return "\n\n".join(blocks)
+
+
 class VideoAgents:
     def storyteller_agent(self, llm):
-        return Agent(
+        return _agent(
             role="Nhà biên kịch Video đơn giản",
             goal="Viết kịch bản video đơn giản, không yêu cầu tangent line hay moving dots.",
             backstory=(
@@ -182,13 +271,13 @@ class VideoAgents:
                 "- KHÔNG mô tả điểm di chuyển trên graph\n"
                 "- CHỈ mô tả: vẽ graph, hiển thị công thức, transform formula\n"
             ),
-            tools=[file_write_tool],
+            tools=[get_tool("file_write")],
             llm=llm,
             verbose=True
         )
 
     def manim_developer_agent(self, llm_pro):
-        return Agent(
+        return _agent(
             role="Lập trình viên Manim Community v0.18",
             goal="Viết mã Manim đơn giản, KHÔNG dùng tangent line, KHÔNG dùng always_redraw.",
             backstory=(
@@ -201,39 +290,19 @@ class VideoAgents:
                 "- Create(), Write(), FadeOut(), Transform()\n"
                 "- MathTex(), Text()\n"
                 "- VGroup().arrange()\n\n"
-                f"{MANIM_HANDBOOK}"
+                f"{MANIM_HANDBOOK if HANDBOOK_MODE == 'full' else handbook_rules()}"
             ),
-            tools=[file_read_tool, file_write_tool],
+            tools=[get_tool("file_read"), get_tool("file_write")],
             llm=llm_pro,
             verbose=True
         )
 
-    def qa_engineer_agent(self, llm):
-        return Agent(
-            role="Kỹ sư QA",
-            goal="Chạy mã Manim.",
-            backstory="Chạy mã. Nếu lỗi, báo lỗi cụ thể.",
-            tools=[file_read_tool, manim_tool],
-            llm=llm,
-            verbose=True
-        )
-
-    def voiceover_artist_agent(self, llm):
-        return Agent(
-            role="Nghệ sĩ Lồng tiếng",
-            goal="Tạo audio từ script.",
-            backstory="Đọc [VOICEOVER SCRIPT] và tạo MP3.",
-            tools=[file_read_tool, tts_tool],
-            verbose=True,
-            llm=llm
-        )
-
     def production_engineer_agent(self, llm):
-        return Agent(
+        return _agent(
             role="Kỹ sư Sản xuất",
             goal="Ghép video và audio.",
             backstory="Dùng FFmpeg merge.",
-            tools=[ffmpeg_tool, duration_tool],
+            tools=[get_tool("ffmpeg"), get_tool("duration")],
             verbose=True,
             llm=llm
         )
\ No newline at end of file
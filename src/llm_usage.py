@@ -0,0 +1,190 @@
+# src/llm_usage.py - Token and latency accounting for LLM calls, per phase and per job
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+# Set by the pipeline for each node and by the API for each job
+current_phase = ContextVar("llm_phase", default="other")
+current_job = ContextVar("llm_job", default=None)
+
+# Rough characters per token, used when the provider reports no usage
+CHARS_PER_TOKEN = 4
+
+
+@contextmanager
+def use_phase(name: str):
+    """Attribute LLM calls made inside the block to phase `name`."""
+    token = current_phase.set(name)
+    try:
+        yield
+    finally:
+        current_phase.reset(token)
+
+
+@contextmanager
+def use_job(job_id: str):
+    """Attribute LLM calls made inside the block to job `job_id`."""
+    token = current_job.set(job_id)
+    try:
+        yield
+    finally:
+        current_job.reset(token)
+
+
+def _counters() -> dict:
+    return {"calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0, "estimated_calls": 0}
+
+
+def _add(target: dict, source: dict):
+    for key, value in source.items():
+        target[key] += value
+
+
+def _rounded(counters: dict) -> dict:
+    return dict(counters, seconds=round(counters["seconds"], 3))
+
+
+class UsageTracker:
+    """Token counts and latency of LLM calls, grouped by job and phase.
+
+    Jobs are kept until pop() so the API can store them with the job record;
+    totals() covers every call since the process started.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}    # job -> phase -> counters
+        self._totals = {}  # phase -> counters
+
+    def record(self, job, phase: str, input_tokens: int = 0, output_tokens: int = 0,
+               seconds: float = 0.0, estimated: bool = False, error: bool = False):
+        call = {
+            "calls": 1, "errors": int(error), "input_tokens": int(input_tokens),
+            "output_tokens": int(output_tokens), "seconds": seconds, "estimated_calls": int(estimated),
+        }
+        with self._lock:
+            for phases in (self._jobs.setdefault(job, {}), self._totals):
+                _add(phases.setdefault(phase, _counters()), call)
+
+    @staticmethod
+    def _summary(phases: dict) -> dict:
+        total = _counters()
+        for counters in phases.values():
+            _add(total, counters)
+        return {
+            "phases": {phase: _rounded(counters) for phase, counters in phases.items()},
+            "total": _rounded(total),
+        }
+
+    def summary(self, job=None) -> dict:
+        """{"phases": {phase: counters}, "total": counters} for one job (None = CLI run)."""
+        with self._lock:
+            return self._summary({phase: dict(c) for phase, c in self._jobs.get(job, {}).items()})
+
+    def pop(self, job) -> dict:
+        """Summary of a finished job; its counters are dropped afterwards."""
+        with self._lock:
+            phases = self._jobs.pop(job, {})
+        return self._summary(phases)
+
+    def totals(self) -> dict:
+        with self._lock:
+            return self._summary({phase: dict(c) for phase, c in self._totals.items()})
+
+
+usage = UsageTracker()
+
+
+def format_usage(summary: dict) -> list:
+    """Printable lines, one per phase plus the total."""
+    rows = list(summary["phases"].items()) + [("TOTAL", summary["total"])]
+    return [
+        f"{phase:<16} calls={c['calls']:<3} in={c['input_tokens']:<8} out={c['output_tokens']:<7} "
+        f"{c['seconds']:.1f}s" + (" (estimated)" if c["estimated_calls"] else "")
+        for phase, c in rows
+    ]
+
+
+def _reported_tokens(response):
+    """(input, output) tokens reported by the provider, or None."""
+    for generations in response.generations:
+        for generation in generations:
+            meta = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if meta:
+                return meta.get("input_tokens", 0), meta.get("output_tokens", 0)
+            meta = (generation.generation_info or {}).get("usage_metadata")
+            if meta:
+                return meta.get("prompt_token_count", 0), meta.get("candidates_token_count", 0)
+    llm_output = response.llm_output or {}
+    meta = llm_output.get("token_usage") or llm_output.get("usage_metadata")
+    if meta:
+        return (meta.get("prompt_tokens", meta.get("input_tokens", 0)),
+                meta.get("completion_tokens", meta.get("output_tokens", 0)))
+    return None
+
+
+def message_text(message) -> str:
+    """Text of a chat message (or plain string), joining multi-part content."""
+    content = getattr(message, "content", message)
+    if isinstance(content, list):
+        content = "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+    return content or ""
+
+
+def _message_chars(messages) -> int:
+    return sum(len(message_text(message)) for message in messages)
+
+
+@lru_cache(maxsize=None)
+def usage_callback():
+    """Shared langchain callback that feeds `usage`; pass it in the LLM's `callbacks`.
+
+    langchain is imported on first use, like the tools in src/agents.py.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsageCallbackHandler(BaseCallbackHandler):
+        def __init__(self, tracker: UsageTracker):
+            self.tracker = tracker
+            self._runs = {}  # run_id -> (job, phase, started, prompt chars)
+            self._lock = threading.Lock()
+
+        def _start(self, run_id, chars: int):
+            # Phase and job are read here: the end callback may come from another thread
+            with self._lock:
+                self._runs[run_id] = (current_job.get(), current_phase.get(), time.perf_counter(), chars)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._start(run_id, sum(len(prompt) for prompt in prompts))
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._start(run_id, sum(_message_chars(batch) for batch in messages))
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            with self._lock:
+                run = self._runs.pop(run_id, None)
+            if run is None:
+                return
+            job, phase, started, chars = run
+            tokens = _reported_tokens(response)
+            estimated = tokens is None
+            if estimated:
+                output_chars = sum(
+                    len(getattr(generation, "text", "") or "") for batch in response.generations for generation in batch
+                )
+                tokens = (chars // CHARS_PER_TOKEN, output_chars // CHARS_PER_TOKEN)
+            self.tracker.record(job, phase, tokens[0], tokens[1], time.perf_counter() - started, estimated=estimated)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            with self._lock:
+                run = self._runs.pop(run_id, None)
+            if run is not None:
+                job, phase, started, chars = run
+                self.tracker.record(
+                    job, phase, chars // CHARS_PER_TOKEN, 0, time.perf_counter() - started, estimated=True, error=True
+                )
+
+    return UsageCallbackHandler(usage)
@@ -0,0 +1,152 @@
+# src/pipeline.py - Small dependency-graph executor for the production phases
+
+import asyncio
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from .llm_usage import use_phase
+
+
+class PipelineError(Exception):
+    """Raised by Pipeline.run() when a node fails. / Loi khi chay pipeline."""
+
+    def __init__(self, node: str, error: BaseException, results: dict):
+        super().__init__(f"Phase '{node}' failed / Giai doan '{node}' that bai: {error}")
+        self.node = node
+        self.error = error
+        self.results = results
+
+
+@dataclass
+class PipelineNode:
+    name: str
+    fn: callable
+    inputs: tuple = ()   # file names the node reads
+    outputs: tuple = ()  # file names the node produces
+
+
+@dataclass
+class NodeResult:
+    name: str
+    status: str = "pending"  # pending | ok | failed | skipped
+    started: float = 0.0
+    finished: float = 0.0
+    value: object = None
+    error: BaseException = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.finished - self.started)
+
+
+def ensure_event_loop():
+    """CrewAI expects an asyncio event loop in every thread that runs a task."""
+    try:
+        asyncio.get_event_loop()
+    except RuntimeError:
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+
+class Pipeline:
+    """Runs nodes as soon as the nodes producing their inputs have finished.
+
+    Edges come from file names: a node depends on every node whose outputs
+    include one of its inputs. Independent nodes run concurrently; each runs
+    in a copy of the caller's context, so the job workspace follows it.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.nodes = {}
+
+    def add(self, name: str, fn, inputs=(), outputs=()):
+        if name in self.nodes:
+            raise ValueError(f"Duplicate pipeline node '{name}'")
+        self.nodes[name] = PipelineNode(name, fn, tuple(inputs), tuple(outputs))
+        return self
+
+    def dependencies(self) -> dict:
+        producers = {}
+        for node in self.nodes.values():
+            for output in node.outputs:
+                producers[output] = node.name
+        deps = {
+            node.name: {producers[i] for i in node.inputs if i in producers and producers[i] != node.name}
+            for node in self.nodes.values()
+        }
+        self._check_acyclic(deps)
+        return deps
+
+    def _check_acyclic(self, deps: dict):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle at '{name}'")
+            visiting.add(name)
+            for dep in deps[name]:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in deps:
+            visit(name)
+
+    def _run_node(self, node: PipelineNode, result: NodeResult):
+        ensure_event_loop()
+        result.started = time.perf_counter()
+        try:
+            # LLM calls made by the node are accounted to it (src/llm_usage.py)
+            with use_phase(node.name):
+                result.value = node.fn()
+            result.status = "ok"
+        except Exception as e:
+            result.error = e
+            result.status = "failed"
+        finally:
+            result.finished = time.perf_counter()
+        return result
+
+    def run(self) -> dict:
+        """Execute the graph. Returns {name: NodeResult}; raises PipelineError on failure."""
+        deps = self.dependencies()
+        results = {name: NodeResult(name) for name in self.nodes}
+        remaining = dict(deps)
+        running = {}
+        failed = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as pool:
+            while remaining or running:
+                # Nodes downstream of a failure never start
+                for name in list(remaining):
+                    if any(results[d].status in ("failed", "skipped") for d in remaining[name]):
+                        results[name].status = "skipped"
+                        del remaining[name]
+
+                ready = [name for name, d in remaining.items() if all(results[x].status == "ok" for x in d)]
+                for name in ready:
+                    del remaining[name]
+                    context = contextvars.copy_context()
+                    future = pool.submit(context.run, self._run_node, self.nodes[name], results[name])
+                    running[future] = name
+
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if results[name].status == "failed" and failed is None:
+                        failed = name
+
+        if failed:
+            raise PipelineError(failed, results[failed].error, results)
+        return results
+
+
+def format_timings(results: dict) -> dict:
+    """{node: seconds} for reporting. / Thoi gian tung giai doan."""
+    return {name: round(result.duration, 2) for name, result in results.items() if result.status == "ok"}
@@ -0,0 +1,158 @@
+# src/qa.py - Deterministic QA: run the Manim code directly, no LLM round trip
+
+import re
+import subprocess
+import time
+from dataclasses import asdict, dataclass, field
+
+from .tools.manim_tools import ManimExecutionTool, RenderCancelled, find_scene_classes, preflight_check
+from .tools.workspace import get_workspace_dir, workspace_path
+
+# Last lines of a traceback worth showing the developer
+TRACEBACK_LINES = 25
+
+# File name manim runs during QA; traceback frames in it point at the scene code
+SCENE_FILE_NAME = "animation_scene"
+
+_EXCEPTION_LINE = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Interrupt|Exit))(?::|$)")
+_BOX_CHARS = "│║|╭╰╮╯─ "
+
+
+@dataclass
+class QAResult:
+    """Outcome of one QA run. / Ket qua kiem tra."""
+
+    status: str                      # passed | failed | cancelled
+    class_name: str = None
+    error_class: str = None          # e.g. AttributeError, PreflightError, NoSceneClass
+    error_type: str = None           # bilingual category from the Manim tool
+    suggestion: str = ""
+    traceback: list = field(default_factory=list)
+    video_path: str = None
+    duration: float = 0.0
+    elapsed: float = 0.0
+    line_offset: int = 0             # lines added before the code ran (Vietnamese support)
+    scene_name: str = SCENE_FILE_NAME  # file name manim ran, as it appears in the traceback
+    report: str = ""                 # full error report for the developer prompt
+
+    @property
+    def passed(self) -> bool:
+        return self.status == "passed"
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("report")
+        data["elapsed"] = round(self.elapsed, 3)
+        return data
+
+
+def traceback_lines(output: str, limit: int = TRACEBACK_LINES) -> list:
+    """The last traceback in manim's output, without rich's box drawing."""
+    lines = [line.strip(_BOX_CHARS).rstrip() for line in (output or "").splitlines()]
+    lines = [line for line in lines if line]
+    for i in range(len(lines) - 1, -1, -1):
+        if lines[i].startswith("Traceback"):
+            lines = lines[i:]
+            break
+    return lines[-limit:]
+
+
+def exception_class(lines: list) -> str:
+    """Name of the exception raised last, or None."""
+    for line in reversed(lines):
+        match = _EXCEPTION_LINE.match(line)
+        if match:
+            return match.group(1).rsplit(".", 1)[-1]
+    return None
+
+
+def run_qa(code_file: str, class_name: str = None, validate_only: bool = True,
+           quality: str = "h", fps: int = 30, tool: ManimExecutionTool = None,
+           scene_name: str = SCENE_FILE_NAME, cancel=None) -> QAResult:
+    """Check a code file in the workspace the way the QA agent did, but directly.
+
+    Finds the Scene class with the AST, runs the pre-flight check, then a manim
+    dry run (or a real render with validate_only=False). Concurrent checks in
+    one workspace need distinct `scene_name`s; setting the `cancel` event stops
+    a dry run and returns status "cancelled".
+    """
+    tool = tool or ManimExecutionTool()
+    started = time.perf_counter()
+
+    def failed(**fields) -> QAResult:
+        return QAResult(status="failed", scene_name=scene_name, elapsed=time.perf_counter() - started, **fields)
+
+    try:
+        with open(workspace_path(code_file), "r", encoding="utf-8") as f:
+            manim_code = f.read()
+    except OSError as e:
+        return failed(
+            error_class=type(e).__name__,
+            report=f"[ERROR] Error reading Manim code file / Loi doc file ma Manim: {e}",
+        )
+
+    if not class_name:
+        scene_classes = find_scene_classes(manim_code)
+        if not scene_classes:
+            return failed(
+                error_class="NoSceneClass",
+                report="[ERROR] No Scene class found in code / Khong tim thay lop Scene trong ma",
+            )
+        class_name = scene_classes[-1]
+
+    original_lines = manim_code.count("\n")
+    manim_code = tool._inject_vietnamese_support(manim_code)
+    line_offset = manim_code.count("\n") - original_lines
+    preflight = preflight_check(manim_code, class_name)
+    if preflight:
+        error_type, suggestion, details = preflight
+        return failed(
+            class_name=class_name,
+            line_offset=line_offset,
+            error_class="PreflightError",
+            error_type=error_type,
+            suggestion=suggestion,
+            traceback=details.splitlines(),
+            report=tool._error_report(error_type, "Pre-flight check failed, manim was not run", suggestion, details),
+        )
+
+    try:
+        if validate_only:
+            tool._validate_file(manim_code, class_name, get_workspace_dir(), scene_name, cancel)
+            return QAResult(
+                status="passed", class_name=class_name, scene_name=scene_name, elapsed=time.perf_counter() - started
+            )
+
+        quality_info = tool.QUALITY_MAP.get(quality, tool.QUALITY_MAP["h"])
+        video_path, duration, _ = tool._render_file(
+            manim_code, class_name, quality_info, fps, get_workspace_dir(), scene_name
+        )
+        return QAResult(
+            status="passed", class_name=class_name, scene_name=scene_name, video_path=video_path,
+            duration=duration, elapsed=time.perf_counter() - started,
+        )
+    except subprocess.CalledProcessError as e:
+        lines = traceback_lines(e.stderr) or traceback_lines(e.stdout)
+        error_type, suggestion = tool._classify_error(e.stderr or "", e.stdout or "")
+        return failed(
+            class_name=class_name,
+            line_offset=line_offset,
+            error_class=exception_class(lines) or "ManimError",
+            error_type=error_type,
+            suggestion=suggestion,
+            traceback=lines,
+            report=tool._format_error(e),
+        )
+    except RenderCancelled:
+        return QAResult(
+            status="cancelled", class_name=class_name, scene_name=scene_name, elapsed=time.perf_counter() - started
+        )
+    except FileNotFoundError:
+        return failed(
+            class_name=class_name,
+            error_class="ManimNotFound",
+            report=(
+                "[ERROR] 'manim' command not found. Please install Manim. / "
+                "Khong tim thay lenh 'manim'. Vui long cai dat Manim."
+            ),
+        )
@@ -0,0 +1,253 @@
+# src/repair.py - Patch-based repair of Manim code that failed QA
+#
+# Instead of resending the whole handbook, script and stderr to the Manim
+# developer, the model sees only the failing frames and the code around them
+# and answers with SEARCH/REPLACE blocks. The patch is applied and checked
+# locally; full regeneration is the fallback when that does not work.
+
+import ast
+import os
+import re
+
+from .llm_usage import current_phase, message_text, use_phase
+from .qa import exception_class
+from .tools.manim_tools import BANNED_CALLS, preflight_check
+from .tools.workspace import workspace_path
+
+# Code lines shown above and below each failing line
+CONTEXT_LINES = 3
+# Without a usable line number, send the whole file only when it is this short
+MAX_FULL_CODE_LINES = 150
+
+_FRAME_LINE = re.compile(r"""([\w.\\/-]+\.py)"?(?:, line |:)(\d+)""")
+_DETAIL_LINE = re.compile(r"\bline (\d+)\b")
+_PATCH_BLOCK = re.compile(
+    r"^<{5,9} SEARCH[ \t]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[ \t]*$",
+    re.MULTILINE | re.DOTALL,
+)
+
+REPAIR_PROMPT = """You are fixing a Manim Community v0.18 scene that failed QA.
+Sua loi trong ma Manim bang thay doi nho nhat co the.
+
+ERROR / LOI: {error_class} - {error_type}
+SUGGESTION / GOI Y: {suggestion}
+
+FAILING FRAMES / DONG LOI:
+{frames}
+
+CODE AROUND THE ERROR (line numbers are for reference, not part of the code):
+{snippets}
+
+Rules / Luat: do not use {banned}; keep the Scene class name and the timing.
+Answer ONLY with SEARCH/REPLACE blocks. SEARCH copies lines exactly from the code
+(without line numbers) and must match one place in the file; REPLACE is the new text.
+
+<<<<<<< SEARCH
+    old lines
+=======
+    new lines
+>>>>>>> REPLACE
+"""
+
+
+class PatchError(ValueError):
+    """The model's patch cannot be parsed or applied. / Khong ap dung duoc patch."""
+
+
+def _anchor_line(code: str) -> int:
+    """Line after which _inject_vietnamese_support inserts its block (0 if none)."""
+    for number, line in enumerate(code.splitlines(), 1):
+        if "from manim import *" in line or line.strip() == "import manim":
+            return number
+    return 0
+
+
+def failing_lines(qa, code: str) -> list:
+    """Line numbers in the saved file that the QA traceback points at, deepest frame last."""
+    scene_lines = []
+    if qa.error_class == "PreflightError":
+        for line in qa.traceback:
+            scene_lines += [int(n) for n in _DETAIL_LINE.findall(line)]
+    else:
+        for line in qa.traceback:
+            for file_name, number in _FRAME_LINE.findall(line):
+                if re.split(r"[\\/]", file_name)[-1] == f"{qa.scene_name}.py":
+                    scene_lines.append(int(number))
+
+    # Both manim and the pre-flight check saw the code after Vietnamese support was injected
+    anchor, offset, total = _anchor_line(code), qa.line_offset, code.count("\n") + 1
+    mapped = []
+    for number in scene_lines:
+        if offset and number > anchor:
+            number = max(anchor, number - offset)
+        if 1 <= number <= total and number not in mapped:
+            mapped.append(number)
+    return mapped
+
+
+def failing_frames(qa) -> list:
+    """Frames in the scene file, the source line after each, and the exception itself."""
+    if qa.error_class == "PreflightError":
+        return list(qa.traceback)
+    traceback = qa.traceback
+    keep = set()
+    for i, line in enumerate(traceback):
+        if qa.scene_name in line:
+            keep.update((i, i + 1))
+    # The exception message runs from the last "SomeError: ..." line to the end
+    for i in range(len(traceback) - 1, -1, -1):
+        if exception_class([traceback[i]]):
+            keep.update(range(i, len(traceback)))
+            break
+    else:
+        keep.update(range(max(len(traceback) - 3, 0), len(traceback)))
+    return [traceback[i] for i in sorted(keep) if i < len(traceback)]
+
+
+def code_snippets(code: str, lines: list, context: int = CONTEXT_LINES) -> str:
+    """Numbered code around each failing line, overlapping windows merged; '>>' marks the line."""
+    code_lines = code.splitlines()
+    if not lines:
+        if len(code_lines) > MAX_FULL_CODE_LINES:
+            return ""
+        return "\n".join(f"{n:4d}   {text}" for n, text in enumerate(code_lines, 1))
+
+    windows = []
+    for number in sorted(lines):
+        start, end = max(1, number - context), min(len(code_lines), number + context)
+        if windows and start <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], end)
+        else:
+            windows.append([start, end])
+
+    blocks = []
+    for start, end in windows:
+        blocks.append("\n".join(
+            f"{n:4d}{' >>' if n in lines else '   '} {code_lines[n - 1]}" for n in range(start, end + 1)
+        ))
+    return "\n   ...\n".join(blocks)
+
+
+def compact_report(qa, code: str = None) -> str:
+    """Short error report for regeneration: category, suggestion, failing frames and lines."""
+    parts = [f"[ERROR] {qa.error_class or 'ManimError'}: {qa.error_type or ''}".rstrip(": ")]
+    if qa.suggestion:
+        parts.append(f"Suggestion / Goi y: {qa.suggestion}")
+    frames = failing_frames(qa)
+    if frames:
+        parts.append("\n".join(frames))
+    if code is not None:
+        lines = failing_lines(qa, code)
+        if lines:
+            parts.append(code_snippets(code, lines))
+    return "\n\n".join(parts)
+
+
+def repair_prompt(qa, code: str) -> str:
+    lines = failing_lines(qa, code)
+    snippets = code_snippets(code, lines)
+    if not snippets:
+        return None
+    return REPAIR_PROMPT.format(
+        error_class=qa.error_class or "ManimError",
+        error_type=qa.error_type or "",
+        suggestion=qa.suggestion or "-",
+        frames="\n".join(failing_frames(qa)) or "-",
+        snippets=snippets,
+        banned=", ".join(f"{name}()" for name in sorted(BANNED_CALLS)),
+    )
+
+
+def parse_patch(text: str) -> list:
+    """[(search, replace), ...] from the model's answer."""
+    text = (text or "").replace("\r\n", "\n")
+    blocks = [(search, replace) for search, replace in _PATCH_BLOCK.findall(text)]
+    if not blocks:
+        raise PatchError("No SEARCH/REPLACE block in the answer / Khong co khoi SEARCH/REPLACE")
+    return blocks
+
+
+def _apply_block(code: str, search: str, replace: str) -> str:
+    if not search.strip():
+        raise PatchError("Empty SEARCH block / Khoi SEARCH rong")
+    count = code.count(search)
+    if count == 1:
+        return code.replace(search, replace)
+    if count > 1:
+        raise PatchError(f"SEARCH matches {count} places / SEARCH khop {count} cho:\n{search}")
+
+    # Models often drop trailing spaces or the final newline; match line by line instead
+    code_lines = code.splitlines(keepends=True)
+    wanted = [line.rstrip() for line in search.rstrip("\n").split("\n")]
+    found = [
+        i for i in range(len(code_lines) - len(wanted) + 1)
+        if [line.rstrip() for line in code_lines[i:i + len(wanted)]] == wanted
+    ]
+    if len(found) != 1:
+        raise PatchError(f"SEARCH matches {len(found)} places / SEARCH khop {len(found)} cho:\n{search}")
+    i = found[0]
+    replacement = replace if replace.endswith("\n") or not replace else replace + "\n"
+    return "".join(code_lines[:i]) + replacement + "".join(code_lines[i + len(wanted):])
+
+
+def apply_patch(code: str, blocks: list) -> str:
+    """Apply the blocks in order; each SEARCH must match exactly one place."""
+    for search, replace in blocks:
+        code = _apply_block(code, search, replace)
+    return code
+
+
+def repair_code(llm, code_file: str, qa) -> tuple:
+    """Ask `llm` for a patch to the failing code and apply it if it checks out locally.
+
+    Returns (patched, note). On success the file is rewritten and still has to
+    go through QA; on failure it is left untouched so the caller can regenerate.
+    """
+    path = workspace_path(code_file)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+    except OSError as e:
+        return False, f"cannot read code / khong doc duoc ma: {e}"
+
+    prompt = repair_prompt(qa, code)
+    if prompt is None:
+        return False, "no failing line to show / khong xac dinh duoc dong loi"
+
+    try:
+        with use_phase(f"{current_phase.get()}/repair"):
+            answer = message_text(llm.invoke(prompt))
+    except Exception as e:
+        return False, f"model call failed / goi mo hinh that bai: {e}"
+    try:
+        patched = apply_patch(code, parse_patch(answer))
+    except PatchError as e:
+        return False, str(e).splitlines()[0]
+    if patched == code:
+        return False, "patch changes nothing / patch khong thay doi gi"
+
+    try:
+        ast.parse(patched)
+    except SyntaxError as e:
+        return False, f"patched code has a SyntaxError / ma sau patch loi cu phap: {e.msg} (line {e.lineno})"
+    if qa.class_name:
+        problem = preflight_check(patched, qa.class_name)
+        if problem:
+            return False, f"patched code fails pre-flight / ma sau patch khong qua kiem tra: {problem[0]}"
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(patched)
+    return True, f"{len(prompt)} prompt chars / ky tu"
+
+
+def repair_or_report(llm, code_file: str, qa) -> tuple:
+    """repair_code(), or a compact report for full regeneration: (patched, note, report)."""
+    patched, note = repair_code(llm, code_file, qa)
+    if patched:
+        return True, note, ""
+    path = workspace_path(code_file)
+    code = None
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+    return False, note, compact_report(qa, code)
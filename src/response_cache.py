@@ -0,0 +1,198 @@
+# src/response_cache.py - Persistent cache of approved LLM outputs (script + Manim code)
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# Kept out of workspace/, which the API serves files from
+DEFAULT_CACHE_PATH = os.path.join("data", "response_cache.db")
+
+
+def normalize_topic(topic: str) -> str:
+    """Lowercase, accent-free, punctuation-free topic text for matching."""
+    text = unicodedata.normalize("NFKD", topic or "").replace("đ", "d").replace("Đ", "D")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join(re.sub(r"[^\w^]+", " ", text).split())
+
+
+# Words that never change what a topic is about (English + unaccented Vietnamese)
+STOP_WORDS = frozenset(
+    "a an the of for to in on about and with how what why is are "
+    "ve cua va cac nhung".split()
+)
+
+
+def content_words(topic_norm: str) -> frozenset:
+    """Set of the words of a normalized topic, minus stop words."""
+    words = set(topic_norm.split())
+    return frozenset(words - STOP_WORDS or words)
+
+
+def topic_similarity(a: str, b: str) -> float:
+    """Overlap (Jaccard) of the content words of two normalized topics.
+
+    1.0 only when both use the same content words, in any order. Single
+    symbols count as words, so "sin x" and "cos x" or "x^2" and "x^3" differ.
+    """
+    words_a, words_b = content_words(a), content_words(b)
+    if words_a == words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+class ResponseCache:
+    """Script and code produced for a request, keyed on (model, prompt, topic, language, duration).
+
+    The script is stored once Phase 1 finishes and the code once it has been
+    approved and rendered, so a hit can skip the storyteller and, with code
+    present, the whole development loop. Entries expire after `ttl_seconds`
+    and the least recently used ones are dropped beyond `max_entries`.
+    A topic with the same content words (same model, prompt, language and
+    duration) is also a hit; `similarity` < 1 loosens that to partial overlap.
+    """
+
+    def __init__(self, path: str = None, ttl_seconds: float = None, max_entries: int = None,
+                 similarity: float = None, enabled: bool = None):
+        self.path = path or os.environ.get("RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 500))
+        self.similarity = similarity if similarity is not None else float(
+            os.environ.get("RESPONSE_CACHE_SIMILARITY", 1.0))
+        self.enabled = enabled if enabled is not None else (
+            os.environ.get("RESPONSE_CACHE", "on").lower() not in ("0", "off", "false"))
+        self._lock = threading.Lock()
+        self._conn = None
+        self._metrics = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _db(self):
+        # Opened on first use so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " scope TEXT NOT NULL,"
+                " topic TEXT NOT NULL,"
+                " topic_norm TEXT NOT NULL,"
+                " script TEXT,"
+                " code TEXT,"
+                " created_ts REAL NOT NULL,"
+                " last_used_ts REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_scope ON responses(scope)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_used ON responses(last_used_ts)")
+        return self._conn
+
+    @staticmethod
+    def _scope(model: str, prompt: str, language: str, duration) -> str:
+        """Everything in the key except the topic; near matches stay inside one scope."""
+        payload = "\x00".join([model, hashlib.sha256(prompt.encode("utf-8")).hexdigest(), language, str(duration)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def make_key(self, model: str, prompt: str, topic: str, language: str = "auto", duration=1) -> str:
+        scope = self._scope(model, prompt, language, duration)
+        return hashlib.sha256(f"{scope}\x00{normalize_topic(topic)}".encode("utf-8")).hexdigest()
+
+    def lookup(self, model: str, prompt: str, topic: str, language: str = "auto", duration=1):
+        """Cached entry as a dict (script, code, topic, match), or None on a miss."""
+        if not self.enabled:
+            return None
+        scope = self._scope(model, prompt, language, duration)
+        key = self.make_key(model, prompt, topic, language, duration)
+        topic_norm = normalize_topic(topic)
+        cutoff = time.time() - self.ttl_seconds
+
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT key, topic, script, code FROM responses"
+                " WHERE key = ? AND created_ts >= ? AND script IS NOT NULL",
+                (key, cutoff),
+            ).fetchone()
+            match = "exact"
+            if row is None:
+                candidates = db.execute(
+                    "SELECT key, topic, script, code, topic_norm FROM responses"
+                    " WHERE scope = ? AND created_ts >= ? AND script IS NOT NULL",
+                    (scope, cutoff),
+                ).fetchall()
+                scored = [(topic_similarity(topic_norm, c[4]), c[3] is not None, c) for c in candidates]
+                scored = [item for item in scored if item[0] >= self.similarity]
+                if scored:
+                    # Closest topic first; prefer entries that already have approved code
+                    row = max(scored, key=lambda item: (item[0], item[1]))[2][:4]
+                    match = "near"
+
+            if row is None:
+                self._metrics["misses"] += 1
+                return None
+            db.execute(
+                "UPDATE responses SET last_used_ts = ?, hits = hits + 1 WHERE key = ?",
+                (time.time(), row[0]),
+            )
+            self._metrics["exact_hits" if match == "exact" else "near_hits"] += 1
+        return {"key": row[0], "topic": row[1], "script": row[2], "code": row[3], "match": match}
+
+    def store(self, model: str, prompt: str, topic: str, language: str = "auto", duration=1,
+              script: str = None, code: str = None):
+        """Insert or update an entry; only the fields passed are overwritten.
+
+        A new script always replaces the code too (with `code`, or with nothing),
+        since code is timed to the script it was written for.
+        """
+        if not self.enabled:
+            return
+        scope = self._scope(model, prompt, language, duration)
+        key = self.make_key(model, prompt, topic, language, duration)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO responses (key, scope, topic, topic_norm, script, code, created_ts, last_used_ts)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET"
+                "  script = COALESCE(excluded.script, script),"
+                "  code = CASE WHEN excluded.script IS NOT NULL THEN excluded.code"
+                "   ELSE COALESCE(excluded.code, code) END,"
+                "  created_ts = CASE WHEN excluded.script IS NOT NULL THEN excluded.created_ts ELSE created_ts END,"
+                "  last_used_ts = excluded.last_used_ts",
+                (key, scope, topic, normalize_topic(topic), script, code, now, now),
+            )
+            self._metrics["stores"] += 1
+        self.evict(now)
+
+    def evict(self, now: float = None) -> int:
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        now = now or time.time()
+        with self._lock:
+            db = self._db()
+            removed = db.execute(
+                "DELETE FROM responses WHERE created_ts < ?", (now - self.ttl_seconds,)
+            ).rowcount
+            removed += db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_used_ts DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._metrics["evictions"] += removed
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+            entries = self._db().execute("SELECT COUNT(*) FROM responses").fetchone()[0] if self.enabled else 0
+        lookups = metrics["exact_hits"] + metrics["near_hits"] + metrics["misses"]
+        hits = metrics["exact_hits"] + metrics["near_hits"]
+        return dict(
+            metrics, enabled=self.enabled, entries=entries, lookups=lookups,
+            hit_rate=round(hits / lookups, 3) if lookups else 0.0,
+        )
@@ -0,0 +1,159 @@
+# src/scene_index.py - Local index of approved Manim code for few-shot prompting
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from .response_cache import normalize_topic
+
+# Kept out of workspace/, which the API serves files from
+DEFAULT_INDEX_PATH = os.path.join("data", "scene_index.db")
+
+# Longest code excerpt put into a prompt per example (characters)
+MAX_EXAMPLE_CHARS = 6000
+
+# Topic words count this many times more than visual script words
+TOPIC_WEIGHT = 3
+
+
+def _terms(topic: str, visual_script: str) -> Counter:
+    """Accent-free word counts of a record; short tokens and numbers are dropped."""
+    def words(text):
+        return [word for word in normalize_topic(text).split() if len(word) > 1 and not word.isdigit()]
+
+    terms = Counter(words(visual_script))
+    for word in words(topic):
+        terms[word] += TOPIC_WEIGHT
+    return terms
+
+
+class SceneIndex:
+    """Approved (topic, visual script, code, render stats) records with TF-IDF search.
+
+    Records are stored in SQLite, keyed on a hash of the code; the TF-IDF
+    vectors are rebuilt in memory after each change, which is cheap at a
+    few hundred records. The oldest records are dropped beyond `max_entries`.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = None, examples: int = None,
+                 min_score: float = None, enabled: bool = None):
+        self.path = path or os.environ.get("SCENE_INDEX_PATH", DEFAULT_INDEX_PATH)
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.environ.get("SCENE_INDEX_MAX_ENTRIES", 500))
+        self.examples = examples if examples is not None else int(os.environ.get("SCENE_INDEX_EXAMPLES", 2))
+        self.min_score = min_score if min_score is not None else float(
+            os.environ.get("SCENE_INDEX_MIN_SCORE", 0.15))
+        self.enabled = enabled if enabled is not None else (
+            os.environ.get("SCENE_INDEX", "on").lower() not in ("0", "off", "false"))
+        self._lock = threading.Lock()
+        self._conn = None
+        self._vectors = None  # [(key, {term: weight})], None = rebuild
+        self._idf = {}
+        self._metrics = {"searches": 0, "matches": 0, "adds": 0}
+
+    def _db(self):
+        # Opened on first use so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS scenes ("
+                " key TEXT PRIMARY KEY,"
+                " topic TEXT NOT NULL,"
+                " visual_script TEXT NOT NULL,"
+                " code TEXT NOT NULL,"
+                " class_name TEXT,"
+                " duration REAL,"
+                " attempts INTEGER,"
+                " created_ts REAL NOT NULL)"
+            )
+        return self._conn
+
+    def _build(self):
+        """TF-IDF vectors (unit length) of every record. Caller holds the lock."""
+        rows = self._db().execute("SELECT key, topic, visual_script FROM scenes").fetchall()
+        documents = [(key, _terms(topic, script)) for key, topic, script in rows]
+        df = Counter(term for _, terms in documents for term in terms)
+        total = len(documents)
+        self._idf = {term: math.log((1 + total) / (1 + count)) + 1 for term, count in df.items()}
+        self._vectors = [(key, self._vector(terms)) for key, terms in documents]
+
+    def _vector(self, terms: Counter) -> dict:
+        vector = {term: (1 + math.log(count)) * self._idf[term] for term, count in terms.items() if term in self._idf}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def add(self, topic: str, visual_script: str, code: str, class_name: str = None,
+            duration: float = None, attempts: int = None):
+        """Record code that passed QA and rendered."""
+        if not self.enabled or not code.strip():
+            return
+        key = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO scenes"
+                " (key, topic, visual_script, code, class_name, duration, attempts, created_ts)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, topic, visual_script, code, class_name, duration, attempts, time.time()),
+            )
+            db.execute(
+                "DELETE FROM scenes WHERE key IN ("
+                " SELECT key FROM scenes ORDER BY created_ts DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._vectors = None
+            self._metrics["adds"] += 1
+
+    def search(self, topic: str, visual_script: str = "", limit: int = None) -> list:
+        """Best matching records above min_score, as dicts with a `score`."""
+        if not self.enabled:
+            return []
+        limit = self.examples if limit is None else limit
+        with self._lock:
+            if self._vectors is None:
+                self._build()
+            query = self._vector(_terms(topic, visual_script))
+            scored = sorted(
+                ((sum(weight * vector.get(term, 0.0) for term, weight in query.items()), key)
+                 for key, vector in self._vectors),
+                reverse=True,
+            )
+            keys = [(score, key) for score, key in scored[:limit] if score >= self.min_score]
+            self._metrics["searches"] += 1
+            self._metrics["matches"] += len(keys)
+            matches = []
+            for score, key in keys:
+                row = self._db().execute(
+                    "SELECT topic, code, class_name, duration, attempts FROM scenes WHERE key = ?", (key,)
+                ).fetchone()
+                matches.append({
+                    "score": round(score, 3), "topic": row[0], "code": row[1],
+                    "class_name": row[2], "duration": row[3], "attempts": row[4],
+                })
+        return matches
+
+    def prompt_examples(self, topic: str, visual_script: str = "") -> str:
+        """Approved code for similar topics, formatted for the development task ('' if none)."""
+        blocks = []
+        for match in self.search(topic, visual_script):
+            code = match["code"]
+            if len(code) > MAX_EXAMPLE_CHARS:
+                code = code[:MAX_EXAMPLE_CHARS].rsplit("\n", 1)[0] + "\n        # ... (rut gon / truncated)\n"
+            stats = f"{match['duration']:.1f}s video" if match["duration"] else "rendered"
+            blocks.append(
+                f"# Chu de / Topic: {match['topic']} (do giong / similarity {match['score']}, {stats})\n"
+                f"```python\n{code.rstrip()}\n```"
+            )
+        return "\n\n".join(blocks)
+
+    def stats(self) -> dict:
+        with self._lock:
+            metrics = dict(self._metrics)
+            entries = self._db().execute("SELECT COUNT(*) FROM scenes").fetchone()[0] if self.enabled else 0
+        return dict(metrics, enabled=self.enabled, entries=entries)
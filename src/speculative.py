@@ -0,0 +1,175 @@
+# src/speculative.py - Speculative code generation: K candidates written and checked in parallel
+#
+# Instead of generate -> QA -> fail -> regenerate, the Pro model is asked for
+# several candidates at once (one per temperature). Each is dry-run as soon as
+# it arrives; the first that passes wins and the other manim runs are killed.
+# This trades extra LLM calls for a shorter worst case of the development phase.
+
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from contextvars import copy_context
+from dataclasses import dataclass, field
+
+from .llm_usage import current_phase, message_text, use_phase
+from .qa import SCENE_FILE_NAME, run_qa
+
+# Candidates per development run; 1 keeps the sequential agent loop only
+SPECULATIVE_CANDIDATES = int(os.environ.get("SPECULATIVE_CANDIDATES", 1))
+
+# Temperature of candidate i (None = the client's own setting)
+CANDIDATE_TEMPERATURES = (None, 0.7, 1.0, 0.2, 0.9, 0.5)
+
+_CODE_BLOCK = re.compile(r"```(?:python|py)?[ \t]*\n(.*?)```", re.DOTALL)
+
+
+@dataclass
+class Candidate:
+    index: int
+    temperature: float = None
+    code_file: str = None
+    qa: object = None
+    generate_seconds: float = 0.0
+    error: str = None
+
+    @property
+    def status(self) -> str:
+        return self.qa.status if self.qa else ("error" if self.error else "pending")
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "temperature": self.temperature,
+            "status": self.status,
+            "error_class": self.qa.error_class if self.qa else None,
+            "error": self.error,
+            "generate_seconds": round(self.generate_seconds, 3),
+            "qa_seconds": round(self.qa.elapsed, 3) if self.qa else None,
+        }
+
+
+@dataclass
+class SpeculativeResult:
+    """Outcome of one speculative round. `qa` is the winner's or, if none passed, the first failure's."""
+
+    candidates: list = field(default_factory=list)
+    winner: Candidate = None
+    qa: object = None
+    elapsed: float = 0.0
+
+    @property
+    def passed(self) -> bool:
+        return self.winner is not None
+
+    def to_dict(self) -> dict:
+        return {
+            "passed": self.passed,
+            "winner": self.winner.index if self.winner else None,
+            "elapsed": round(self.elapsed, 3),
+            "candidates": [candidate.to_dict() for candidate in self.candidates],
+        }
+
+
+def extract_code(text: str):
+    """The Python code in a model answer: the longest fenced block defining a class."""
+    text = text or ""
+    blocks = [block for block in _CODE_BLOCK.findall(text) if "class " in block]
+    if blocks:
+        return max(blocks, key=len).strip() + "\n"
+    if "from manim import" in text and "class " in text:
+        return text.strip() + "\n"
+    return None
+
+
+def with_temperature(llm, temperature):
+    """A copy of the client with another temperature; it shares the connection."""
+    if temperature is None:
+        return llm
+    copy = getattr(llm, "model_copy", None) or llm.copy
+    return copy(update={"temperature": temperature})
+
+
+def generate_candidates(llm, tasks, count: int = SPECULATIVE_CANDIDATES, resource=None,
+                        references: str = "") -> SpeculativeResult:
+    """Ask `llm` for `count` code candidates concurrently and keep the first that passes QA.
+
+    `resource(kind)` returns a context manager limiting "llm" calls and "cpu"
+    work (the API scheduler's resource()); by default nothing is limited.
+    `references` is approved code from earlier jobs for the prompt.
+    The chosen code, or the first failing candidate for the repair loop, ends
+    up in tasks.manim_code_file. Model calls already in flight when a winner
+    is found cannot be aborted; their answers are discarded.
+    """
+    resource = resource or (lambda kind: nullcontext())
+    started = time.perf_counter()
+    cancel = threading.Event()
+    prompt = tasks.manim_candidate_prompt(references)
+    phase = f"{current_phase.get()}/candidates"
+    stem, ext = os.path.splitext(tasks.manim_code_file)
+
+    def attempt(candidate: Candidate) -> Candidate:
+        if cancel.is_set():
+            return candidate
+        generate_started = time.perf_counter()
+        try:
+            with resource("llm"), use_phase(phase):
+                answer = message_text(with_temperature(llm, candidate.temperature).invoke(prompt))
+        except Exception as e:
+            candidate.error = f"model call failed / goi mo hinh that bai: {e}"
+            return candidate
+        finally:
+            candidate.generate_seconds = time.perf_counter() - generate_started
+
+        code = extract_code(answer)
+        if code is None:
+            candidate.error = "no Python code in the answer / khong co ma Python"
+            return candidate
+        if cancel.is_set():
+            return candidate
+        with open(tasks.path(candidate.code_file), "w", encoding="utf-8") as f:
+            f.write(code)
+        with resource("cpu"):
+            if not cancel.is_set():
+                candidate.qa = run_qa(
+                    candidate.code_file, scene_name=f"{SCENE_FILE_NAME}_c{candidate.index}", cancel=cancel
+                )
+        return candidate
+
+    result = SpeculativeResult(candidates=[
+        Candidate(
+            index=i,
+            temperature=CANDIDATE_TEMPERATURES[i % len(CANDIDATE_TEMPERATURES)],
+            code_file=f"{stem}.c{i}{ext}",
+        )
+        for i in range(count)
+    ])
+    pool = ThreadPoolExecutor(max_workers=count, thread_name_prefix="candidate")
+    try:
+        # One context copy per thread: the workspace and job follow each candidate
+        futures = [pool.submit(copy_context().run, attempt, candidate) for candidate in result.candidates]
+        for future in as_completed(futures):
+            candidate = future.result()
+            if candidate.qa is not None and candidate.qa.passed:
+                result.winner = candidate
+                break
+    finally:
+        # Stop the other candidates' manim runs and anything not started yet
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    chosen = result.winner or next((c for c in result.candidates if c.qa is not None and c.qa.status == "failed"), None)
+    if chosen is not None:
+        shutil.copyfile(tasks.path(chosen.code_file), tasks.path(tasks.manim_code_file))
+        result.qa = chosen.qa
+    for candidate in result.candidates:
+        for file_name in (candidate.code_file, f"{SCENE_FILE_NAME}_c{candidate.index}.py"):
+            try:
+                os.remove(tasks.path(file_name))
+            except OSError:
+                pass
+    result.elapsed = time.perf_counter() - started
+    return result
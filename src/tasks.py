@@ -1,53 +1,115 @@
 # src/tasks.py - Enhanced version with timing support
 
-from crewai import Task
+import os
+from .agents import HANDBOOK_MODE, MANIM_HANDBOOK, handbook_examples, handbook_rules
+from .timing import format_timing_for_prompt, load_timing_manifest
+from .tools.workspace import get_workspace_dir, use_workspace
+
+def _task(**kwargs):
+    """crewai.Task, imported on first use so importing this module stays cheap."""
+    from crewai import Task
+    return Task(**kwargs)
+
 
 class VideoTasks:
-    def __init__(self):
+    def __init__(self, workspace_dir=None):
+        # Every tool resolves file names below this directory while inside workspace()
+        self.workspace_dir = workspace_dir or get_workspace_dir()
         self.script_file = "video_script.txt"
         self.manim_code_file = "manim_animation.py"
         self.voiceover_file = "voiceover.mp3"
+        self.timing_file = "timing.json"
+        self.loudness_file = "loudness.json"
         self.silent_video_file = "animation_scene.mp4"
         self.final_video_file = "final_video.mp4"
 
+    def workspace(self):
+        """Context manager that points all tools at this job's directory."""
+        return use_workspace(self.workspace_dir)
+
+    def path(self, file_name):
+        return os.path.join(self.workspace_dir, file_name)
+
+    def storytelling_prompt(self, topic):
+        """Storyteller instructions; also part of the response cache key."""
+        return (
+            f"Nghiên cứu chủ đề '{topic}', sau đó viết một kịch bản video ngắn gọn.\n\n"
+            "YÊU CẦU QUAN TRỌNG:\n"
+            "1. Phần [VOICEOVER SCRIPT] phải có độ dài khoảng 130-150 từ (cho video 1 phút).\n"
+            "2. Phần [VISUAL SCRIPT] nên chia thành 3-4 SCENE với timing.\n"
+            "3. Lời thoại chia theo đúng các SCENE đó: mỗi SCENE một dòng 'SCENE n: ...', "
+            "cùng số thứ tự với [VISUAL SCRIPT] (thời lượng thật của từng scene sẽ được đo từ audio).\n"
+            "4. Thêm phần [TIMING] ở cuối với tổng thời lượng ước tính.\n\n"
+            "FORMAT:\n"
+            "```\n"
+            "[VISUAL SCRIPT]\n"
+            "SCENE 1 (10s): Mô tả scene 1\n"
+            "SCENE 2 (15s): Mô tả scene 2\n"
+            "...\n\n"
+            "[VOICEOVER SCRIPT]\n"
+            "SCENE 1: Lời thoại cho scene 1...\n"
+            "SCENE 2: Lời thoại cho scene 2...\n"
+            "...\n\n"
+            "[TIMING]\n"
+            "- Tổng thời lượng video: ~60s (1 phút)\n"
+            "- Tổng thời lượng audio ước tính: ~55s\n"
+            "```\n\n"
+            f"Cuối cùng, sử dụng công cụ 'File Write Tool' để lưu toàn bộ kịch bản vào tệp '{self.script_file}'."
+        )
+
     def storytelling_task(self, agent, topic):
-        return Task(
-            description=(
-                f"Nghiên cứu chủ đề '{topic}', sau đó viết một kịch bản video ngắn gọn.\n\n"
-                "YÊU CẦU QUAN TRỌNG:\n"
-                "1. Phần [VOICEOVER SCRIPT] phải có độ dài khoảng 130-150 từ (cho video 1 phút).\n"
-                "2. Phần [VISUAL SCRIPT] nên chia thành 3-4 SCENE với timing.\n"
-                "3. Thêm phần [TIMING] ở cuối với tổng thời lượng ước tính.\n\n"
-                "FORMAT:\n"
-                "```\n"
-                "[VISUAL SCRIPT]\n"
-                "SCENE 1 (10s): Mô tả scene 1\n"
-                "SCENE 2 (15s): Mô tả scene 2\n"
-                "...\n\n"
-                "[VOICEOVER SCRIPT]\n"
-                "Nội dung lời thoại...\n\n"
-                "[TIMING]\n"
-                "- Tổng thời lượng video: ~60s (1 phút)\n"
-                "- Tổng thời lượng audio ước tính: ~55s\n"
-                "```\n\n"
-                f"Cuối cùng, sử dụng công cụ 'File Write Tool' để lưu toàn bộ kịch bản vào tệp '{self.script_file}'."
-            ),
+        return _task(
+            description=self.storytelling_prompt(topic),
             expected_output=(
                 f"Chuỗi xác nhận từ công cụ 'File Write Tool' cho biết tệp '{self.script_file}' đã được ghi thành công."
             ),
             agent=agent
         )
 
-    def manim_development_task(self, agent):
-        return Task(
+    def timing_instructions(self):
+        """Exact per-scene durations from the timing manifest, if it exists yet."""
+        with self.workspace():
+            manifest = load_timing_manifest(self.timing_file)
+        if not manifest:
+            return "Sử dụng timing từ script để đặt run_time phù hợp cho mỗi animation.\n"
+        return (
+            f"THỜI LƯỢNG CHÍNH XÁC (đo từ lời thoại thật, tệp '{self.timing_file}'):\n"
+            f"{format_timing_for_prompt(manifest)}\n"
+            "   Mỗi scene bắt đầu bằng comment '# === SCENE n ===' và tổng run_time + self.wait() "
+            "của scene phải BẰNG đúng thời lượng trên (sai lệch < 0.2s), để video khớp audio mà không phải co giãn.\n"
+        )
+
+    def handbook_examples(self):
+        """Handbook example scenes matching the script (compact handbook mode only)."""
+        if HANDBOOK_MODE == "full" or not os.path.exists(self.path(self.script_file)):
+            return ""
+        with open(self.path(self.script_file), "r", encoding="utf-8") as f:
+            examples = handbook_examples(f.read())
+        return f"\n\nMẪU THAM KHẢO TỪ SỔ TAY (đã test):\n{examples}" if examples else ""
+
+    @staticmethod
+    def approved_examples(references):
+        """Section with approved code from earlier jobs (src/scene_index.py)."""
+        if not references:
+            return ""
+        return (
+            "\n\nMÃ ĐÃ DUYỆT CHO CHỦ ĐỀ TƯƠNG TỰ (đã render thành công, dùng làm tham khảo, "
+            "không chép nguyên văn):\n"
+            f"{references}"
+        )
+
+    def manim_development_task(self, agent, references=""):
+        return _task(
             description=(
                 f"Đọc nội dung từ tệp '{self.script_file}'. Dựa vào phần [VISUAL SCRIPT], hãy viết mã Manim hoàn chỉnh.\n\n"
                 "YÊU CẦU QUAN TRỌNG:\n"
                 "1. Tuân thủ nghiêm ngặt SỔ TAY LẬP TRÌNH MANIM trong backstory của bạn.\n"
-                "2. Sử dụng timing từ script để đặt run_time phù hợp cho mỗi animation.\n"
+                f"2. {self.timing_instructions()}"
                 "3. Thêm self.wait() giữa các scene để người xem có thời gian hiểu.\n"
                 "4. Render với chất lượng 'h' (1080p) khi hoàn tất.\n\n"
                 f"Sau đó, sử dụng công cụ 'File Write Tool' để lưu mã vào tệp '{self.manim_code_file}'."
+                f"{self.handbook_examples()}"
+                f"{self.approved_examples(references)}"
             ),
             expected_output=(
                 f"Chuỗi xác nhận từ 'File Write Tool' cho biết tệp '{self.manim_code_file}' đã được ghi thành công."
@@ -55,57 +117,55 @@ class VideoTasks:
             agent=agent
         )
 
-    def qa_task(self, agent):
-        return Task(
-            description=(
-                f"Đọc nội dung mã Python từ tệp '{self.manim_code_file}'.\n"
-                "Tìm tên của lớp Manim trong mã.\n\n"
-                "Sử dụng công cụ 'Manim Code Execution Tool' với các tham số:\n"
-                "- manim_code: nội dung mã Python\n"
-                "- class_name: tên lớp Manim\n"
-                "- quality: 'h' (1080p - mặc định, chất lượng cao)\n"
-                "- fps: 30 (frame rate mặc định)\n\n"
-                "NẾU THẤT BẠI: Tạo báo cáo lỗi theo format trong backstory của bạn.\n"
-                "NẾU THÀNH CÔNG: Ghi nhận thời lượng video và xác nhận thành công."
-            ),
-            expected_output=(
-                "Một chuỗi xác nhận việc thực thi Manim thành công (bao gồm đường dẫn video và thời lượng) "
-                "hoặc một báo cáo lỗi chi tiết theo format chuẩn nếu thất bại."
-            ),
-            agent=agent
+    def manim_candidate_prompt(self, references=""):
+        """Self-contained prompt for one code candidate, sent straight to the LLM (no agent, no tools)."""
+        with open(self.path(self.script_file), "r", encoding="utf-8") as f:
+            script = f.read()
+        # Handbook first: the same prefix for every candidate and every job
+        rules = MANIM_HANDBOOK if HANDBOOK_MODE == "full" else handbook_rules()
+        return (
+            f"{rules}\n"
+            "Bạn là Lập trình viên Manim Community v0.18. "
+            "Dựa vào phần [VISUAL SCRIPT] của kịch bản dưới đây, hãy viết mã Manim hoàn chỉnh.\n\n"
+            "YÊU CẦU QUAN TRỌNG:\n"
+            "1. Tuân thủ nghiêm ngặt SỔ TAY LẬP TRÌNH MANIM ở trên.\n"
+            f"2. {self.timing_instructions()}"
+            "3. Thêm self.wait() giữa các scene để người xem có thời gian hiểu.\n"
+            "4. Chỉ trả lời bằng MỘT khối ```python chứa toàn bộ mã.\n\n"
+            f"--- KỊCH BẢN / SCRIPT ---\n{script}\n--- HẾT / END ---"
+            f"{self.handbook_examples()}"
+            f"{self.approved_examples(references)}"
         )
 
-    def voiceover_task(self, agent):
-        return Task(
-            description=(
-                f"Đọc nội dung từ tệp '{self.script_file}'.\n\n"
-                "Sử dụng phần [VOICEOVER SCRIPT] để tạo tệp âm thanh bằng công cụ 'Text to Speech Tool'.\n\n"
-                "LƯU Ý:\n"
-                "1. Công cụ sẽ tự động detect ngôn ngữ (English/Vietnamese).\n"
-                "2. Ghi nhận thời lượng audio được trả về.\n"
-                "3. Nếu nội dung phức tạp, có thể dùng slow=True để đọc chậm hơn.\n\n"
-                f"Lưu audio vào tệp '{self.voiceover_file}'."
-            ),
-            expected_output=(
-                f"Chuỗi xác nhận từ 'Text to Speech Tool' cho biết tệp '{self.voiceover_file}' đã được lưu thành công, "
-                "bao gồm thông tin về thời lượng audio."
-            ),
-            agent=agent
+    def manim_fix_description(self, error_report):
+        """Task description for rewriting code that failed QA."""
+        return (
+            "Your previous code had execution errors. "
+            "Read the error report below, analyze the cause and rewrite the code correctly. "
+            "Make sure to follow the 'Manim Programming Handbook' strictly.\n"
+            "---\n"
+            "Ma truoc do cua ban da gap loi. "
+            "Doc bao cao loi ben duoi, phan tich nguyen nhan va viet lai ma cho chinh xac.\n"
+            f"--- ERROR REPORT / BAO CAO LOI ---\n{error_report}\n--- END / KET THUC ---\n\n"
+            f"Read [VISUAL SCRIPT] from file '{self.script_file}' and write complete Manim code.\n"
+            f"{self.timing_instructions()}"
+            f"Save code to file '{self.manim_code_file}'."
         )
 
     def production_task(self, agent):
-        return Task(
+        return _task(
             description=(
                 f"Ghép tệp video '{self.silent_video_file}' với tệp âm thanh '{self.voiceover_file}'.\n\n"
                 "Sử dụng công cụ 'FFmpeg Video-Audio Merger' với các tham số:\n"
-                "- video_file: '{self.silent_video_file}'\n"
-                "- audio_file: '{self.voiceover_file}'\n"
-                "- output_file: '{self.final_video_file}'\n"
-                "- speed_adjust: True (tự động điều chỉnh tốc độ video để khớp audio)\n\n"
+                f"- video_file: '{self.silent_video_file}'\n"
+                f"- audio_file: '{self.voiceover_file}'\n"
+                f"- output_file: '{self.final_video_file}'\n"
+                "- speed_adjust: True (tự động khớp thời lượng video và audio)\n"
+                "- strategy: 'auto' (giữ nguyên video, chỉ co giãn audio; chỉ encode lại video khi lệch quá nhiều)\n\n"
                 "TRƯỚC KHI MERGE: Có thể dùng 'Media Duration Tool' để kiểm tra thời lượng của cả hai file."
             ),
             expected_output=(
-                f"Một thông báo xác nhận video cuối cùng đã được tạo tại 'workspace/{self.final_video_file}', "
+                f"Một thông báo xác nhận video cuối cùng đã được tạo tại '{self.path(self.final_video_file)}', "
                 "bao gồm thông tin về duration và speed adjustment nếu có."
             ),
             agent=agent
@@ -0,0 +1,154 @@
+# src/timing.py - Per-scene voiceover timing manifest (timing.json)
+#
+# The voiceover is synthesized scene by scene before any Manim code is
+# written, so the code can be timed to the real audio instead of guesses.
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .tools.audio import loudness_cache
+from .tools.media import probe_many
+from .tools.tts_backends import get_backend
+from .tools.tts_cache import split_sentences
+from .tools.workspace import workspace_path
+
+MANIFEST_VERSION = 1
+
+_SECTION_HEADER = re.compile(r"^\s*\[([A-Z ]+)\]\s*$", re.MULTILINE)
+_SCENE_LABEL = re.compile(r"^\s*SCENE\s+(\d+)\s*(?:\([^)]*\))?\s*[:.-]\s*", re.IGNORECASE)
+
+
+def script_section(script: str, name: str) -> str:
+    """Text between the `[name]` header and the next `[...]` header."""
+    headers = list(_SECTION_HEADER.finditer(script))
+    for i, header in enumerate(headers):
+        if header.group(1).strip() == name:
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(script)
+            return script[header.end():end]
+    return ""
+
+
+def parse_voiceover_scenes(script: str) -> list:
+    """[(scene_number, text), ...] from the script's [VOICEOVER SCRIPT] section.
+
+    Lines starting with 'SCENE n:' open a scene; following lines continue it.
+    A voiceover without scene labels becomes a single scene.
+    """
+    voiceover = script_section(script, "VOICEOVER SCRIPT")
+    if not voiceover.strip():
+        raise ValueError("Script has no [VOICEOVER SCRIPT] section / Kich ban thieu phan [VOICEOVER SCRIPT]")
+
+    scenes, current = [], None
+    for line in voiceover.strip("`\n").splitlines():
+        label = _SCENE_LABEL.match(line)
+        if label:
+            current = [int(label.group(1)), [line[label.end():]]]
+            scenes.append(current)
+        elif line.strip():
+            if current is None:
+                current = [1, []]
+                scenes.append(current)
+            current[1].append(line)
+
+    scenes = [(number, " ".join(" ".join(lines).split())) for number, lines in scenes]
+    return [(number, text) for number, text in scenes if text]
+
+
+def build_timing_manifest(script_file: str, voiceover_file: str, manifest_file: str,
+                          language: str = "auto", slow: bool = False, backend: str = None,
+                          max_workers: int = None) -> dict:
+    """Synthesize the voiceover per scene, then write the audio and timing.json.
+
+    All sentences go through the shared TTS cache concurrently. Scene durations
+    are the measured lengths of their sentence segments, and the segments are
+    joined into the voiceover without re-encoding, so the file matches them.
+    """
+    # The TTS tools pull in langchain; only needed once a timing run starts
+    from .tools.tts_tools import TTS_MAX_WORKERS, detect_language, join_segments, tts_cache
+
+    max_workers = max_workers or TTS_MAX_WORKERS
+    with open(workspace_path(script_file), "r", encoding="utf-8") as f:
+        scenes = parse_voiceover_scenes(f.read())
+    if language == "auto":
+        language = detect_language(" ".join(text for _, text in scenes))
+    engine = get_backend(backend)
+
+    work = [(index, sentence) for index, (_, text) in enumerate(scenes) for sentence in split_sentences(text)]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(work)))) as pool:
+        segments = list(pool.map(lambda item: tts_cache.synthesize(item[1], language, slow, engine), work))
+    segment_paths = [path for path, _ in segments]
+    probed = probe_many(segment_paths)
+
+    durations = [0.0] * len(scenes)
+    sentence_counts = [0] * len(scenes)
+    for (index, _), path in zip(work, segment_paths):
+        info = probed.get(path)
+        durations[index] += info.duration if info else 0.0
+        sentence_counts[index] += 1
+
+    join_segments(segment_paths, workspace_path(voiceover_file))
+
+    start = 0.0
+    manifest_scenes = []
+    for (number, text), duration, count in zip(scenes, durations, sentence_counts):
+        manifest_scenes.append({
+            "scene": number,
+            "start": round(start, 3),
+            "duration": round(duration, 3),
+            "sentences": count,
+            "text": text,
+        })
+        start += duration
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "language": language,
+        "backend": engine.name,
+        "voiceover_file": voiceover_file,
+        "total_duration": round(start, 3),
+        "cached_sentences": sum(1 for _, cached in segments if cached),
+        "scenes": manifest_scenes,
+    }
+    manifest_path = workspace_path(manifest_file)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def measure_voiceover_loudness(voiceover_file: str, loudness_file: str):
+    """First loudnorm pass over the voiceover, written to `loudness_file`.
+
+    Runs as its own pipeline node next to the code development, so the merge
+    finds the measurements in the cache without waiting for a decode pass.
+    Returns the measurements, or None when they cannot be taken.
+    """
+    measurements = loudness_cache.measure(workspace_path(voiceover_file))
+    path = workspace_path(loudness_file)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(measurements, f)
+    os.replace(f"{path}.tmp", path)
+    return measurements
+
+
+def load_timing_manifest(manifest_file: str):
+    """The manifest from the current workspace, or None when it does not exist."""
+    path = workspace_path(manifest_file)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_timing_for_prompt(manifest: dict) -> str:
+    """One line per scene, for the Manim developer's task description."""
+    lines = [
+        f"SCENE {scene['scene']}: {scene['duration']:.2f}s "
+        f"(bat dau / starts at {scene['start']:.2f}s) - \"{scene['text']}\""
+        for scene in manifest["scenes"]
+    ]
+    lines.append(f"TONG / TOTAL: {manifest['total_duration']:.2f}s")
+    return "\n".join(lines)
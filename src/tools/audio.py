@@ -0,0 +1,172 @@
+# src/tools/audio.py - One-pass audio finishing: tempo, EBU R128 loudness, resample
+
+import hashlib
+import json
+import os
+import subprocess
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join("workspace", ".loudnorm_cache")
+
+# Speech target for online video (EBU R128 style); loudnorm works at 192 kHz
+# internally, so the chain always ends with a resample to the output rate
+LOUDNESS_TARGET = {"I": -16.0, "TP": -1.5, "LRA": 11.0}
+OUTPUT_SAMPLE_RATE = 48000
+
+_MEASURED_FIELDS = ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")
+
+
+def atempo_chain(tempo: float) -> str:
+    """Build an atempo filter chain; each atempo stage only accepts 0.5-2.0."""
+    stages = []
+    while tempo > 2.0:
+        stages.append(2.0)
+        tempo /= 2.0
+    while tempo < 0.5:
+        stages.append(0.5)
+        tempo /= 0.5
+    stages.append(tempo)
+    return ",".join(f"atempo={stage:.6f}" for stage in stages)
+
+
+def _target_args() -> str:
+    return ":".join(f"{name}={value}" for name, value in LOUDNESS_TARGET.items())
+
+
+def _parse_loudnorm_json(stderr: str):
+    """loudnorm prints its measurements as the last JSON object on stderr."""
+    start, end = stderr.rfind("{"), stderr.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(stderr[start:end + 1])
+        values = {name: float(data[name]) for name in _MEASURED_FIELDS}
+    except (ValueError, KeyError):
+        return None
+    # Silence measures as -inf; linear mode cannot use that
+    if any(value != value or abs(value) == float("inf") for value in values.values()):
+        return None
+    return values
+
+
+class LoudnessCache:
+    """First-pass loudnorm measurements, keyed on the audio file's content.
+
+    Measuring means decoding the whole file once. The pipeline measures the
+    voiceover while the code is being developed, so the merge (and any
+    re-merge with the same audio) finds the numbers ready and only runs the
+    second, encoding pass.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or os.environ.get("LOUDNORM_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self._memory = {}  # (abspath, size, mtime_ns) -> measurements
+        self._lock = threading.Lock()
+
+    def _content_key(self, path: str) -> str:
+        digest = hashlib.sha256(_target_args().encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def measure(self, path: str):
+        """Return the measurements for `path`, or None when they cannot be taken."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stat_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if stat_key in self._memory:
+                return self._memory[stat_key]
+
+        key = self._content_key(path)
+        cache_file = os.path.join(self.cache_dir, f"{key}.json")
+        values = None
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    values = json.load(f)
+            except (OSError, ValueError):
+                values = None
+
+        if values is None:
+            try:
+                result = subprocess.run(
+                    [
+                        "ffmpeg", "-hide_banner", "-nostats", "-i", path,
+                        "-af", f"loudnorm={_target_args()}:print_format=json",
+                        "-f", "null", "-",
+                    ],
+                    capture_output=True, text=True, check=True
+                )
+            except (OSError, subprocess.CalledProcessError):
+                return None
+            values = _parse_loudnorm_json(result.stderr)
+            if values is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(values, f)
+                os.replace(tmp_path, cache_file)
+
+        with self._lock:
+            self._memory[stat_key] = values
+        return values
+
+
+loudness_cache = LoudnessCache()
+
+
+def finish_filter(tempo: float = 1.0, normalize: bool = True, measurements: dict = None) -> str:
+    """Audio filter chain for the final encode: atempo -> loudnorm -> aresample.
+
+    With first-pass `measurements` loudnorm runs in linear mode (a plain gain,
+    no pumping); without them it falls back to single-pass dynamic mode.
+    Returns "" when nothing needs to change.
+    """
+    stages = []
+    if abs(tempo - 1.0) > 1e-3:
+        stages.append(atempo_chain(tempo))
+    if normalize:
+        loudnorm = f"loudnorm={_target_args()}"
+        if measurements:
+            loudnorm += (
+                f":measured_I={measurements['input_i']}"
+                f":measured_TP={measurements['input_tp']}"
+                f":measured_LRA={measurements['input_lra']}"
+                f":measured_thresh={measurements['input_thresh']}"
+                f":offset={measurements['target_offset']}"
+                ":linear=true"
+            )
+        stages.append(loudnorm)
+        stages.append(f"aresample={OUTPUT_SAMPLE_RATE}")
+    return ",".join(stages)
+
+
+def encode_segments(segment_paths: list, output_path: str, tempo: float = 1.0):
+    """Encode MP3 segments to one MP3 in a single ffmpeg pass, fed through stdin.
+
+    The segments' frames are streamed straight into ffmpeg, so no joined
+    intermediate file is written before the tempo change.
+    Raises CalledProcessError on failure, FileNotFoundError without ffmpeg.
+    """
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "mp3", "-i", "pipe:0"]
+    audio_filter = finish_filter(tempo, normalize=False)
+    if audio_filter:
+        command += ["-filter:a", audio_filter]
+    command += ["-codec:a", "libmp3lame", "-q:a", "2", "-f", "mp3", output_path]
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        for path in segment_paths:
+            with open(path, "rb") as segment:
+                process.stdin.write(segment.read())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr.decode("utf-8", "replace"))
+    return output_path
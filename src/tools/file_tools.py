@@ -2,14 +2,15 @@
 
 import os
 from langchain.tools import BaseTool # Đảm bảo import từ langchain.tools
+from .workspace import get_workspace_dir
 
 # --- Công cụ Ghi tệp (giữ nguyên) ---
 class FileWriteTool(BaseTool):
     name: str = "File Write Tool"
-    description: str = "Writes content to a specified file in the 'workspace' directory. Creates the directory if it doesn't exist."
+    description: str = "Writes content to a specified file in the job's workspace directory. Creates the directory if it doesn't exist."
 
     def _run(self, file_path: str, content: str) -> str:
-        workspace_dir = "workspace"
+        workspace_dir = get_workspace_dir()
         full_path = os.path.join(workspace_dir, file_path)
         
         try:
@@ -23,10 +24,10 @@ class FileWriteTool(BaseTool):
 # --- THÊM CÔNG CỤ ĐỌC TỆP MỚI VÀO ĐÂY ---
 class CustomFileReadTool(BaseTool):
     name: str = "File Read Tool"
-    description: str = "Reads the content of a specified file from the 'workspace' directory."
+    description: str = "Reads the content of a specified file from the job's workspace directory."
     
     def _run(self, file_path: str) -> str:
-        workspace_dir = "workspace"
+        workspace_dir = get_workspace_dir()
         full_path = os.path.join(workspace_dir, file_path)
         
         try:
@@ -1,14 +1,182 @@
 import os
+import ast
 import subprocess
-import json
-import re
+import time
+import glob
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from langchain.tools import BaseTool 
+from .render_cache import RenderCache
+from .scene_sections import split_scene_sections
+from .workspace import get_workspace_dir, workspace_path
+from .media import concat_media, get_duration, probe_media, probe_many
+from .audio import finish_filter, loudness_cache
+
+# Shared render cache / Bo nho dem render dung chung
+render_cache = RenderCache()
+
+# Final renders split '# === SCENE n ===' blocks across manim processes only when enabled
+PARALLEL_SECTIONS = os.environ.get("PARALLEL_SECTIONS", "off").lower() in ("1", "on", "true")
+
+
+def find_scene_classes(code: str) -> list:
+    """Names of classes deriving from a *Scene base, directly or through classes in the code, in definition order."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    classes = [node for node in tree.body if isinstance(node, ast.ClassDef)]
+    scenes = set()
+    changed = True
+    while changed:
+        changed = False
+        for node in classes:
+            if node.name in scenes:
+                continue
+            for base in node.bases:
+                base_name = base.attr if isinstance(base, ast.Attribute) else getattr(base, "id", "")
+                if base_name.endswith("Scene") or base_name in scenes:
+                    scenes.add(node.name)
+                    changed = True
+                    break
+    return [node.name for node in classes if node.name in scenes]
+
+
+# Handbook rules / Luat trong so tay (MANIM_HANDBOOK, src/agents.py)
+BANNED_CALLS = {
+    "get_tangent_line": "get_tangent_line() does not exist in Manim Community / KHONG TON TAI",
+    "always_redraw": "always_redraw() is banned by the handbook / always_redraw() bi cam",
+}
+
+# Scene methods (Scene, ThreeDScene, MovingCameraScene, ZoomedScene); anything else on self is reported
+SCENE_METHOD_ALLOWLIST = {
+    "play", "wait", "pause", "add", "remove", "clear", "bring_to_front", "bring_to_back",
+    "add_foreground_mobject", "add_foreground_mobjects", "remove_foreground_mobject",
+    "remove_foreground_mobjects", "next_section", "add_sound", "add_subcaption", "wait_until",
+    "add_updater", "remove_updater", "get_top_level_mobjects", "get_mobject_family_members",
+    "get_moving_mobjects", "setup", "tear_down",
+    # ThreeDScene
+    "set_camera_orientation", "move_camera", "begin_ambient_camera_rotation",
+    "stop_ambient_camera_rotation", "begin_3dillusion_camera_rotation",
+    "stop_3dillusion_camera_rotation", "add_fixed_in_frame_mobjects",
+    "remove_fixed_in_frame_mobjects", "add_fixed_orientation_mobjects",
+    "remove_fixed_orientation_mobjects", "set_to_default_angled_camera_orientation",
+    # ZoomedScene (MovingCameraScene adds no methods; self.camera.frame is an attribute)
+    "activate_zooming", "get_zoom_in_animation", "get_zoomed_display_pop_out_animation", "get_zoom_factor",
+}
+
+
+def preflight_check(code: str, class_name: str):
+    """Static checks that run in milliseconds before any manim process starts.
+
+    Returns None when the code passes, otherwise (error_type, suggestion, details)
+    where details lists each problem with its line number.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        pointer = " " * max((e.offset or 1) - 1, 0) + "^"
+        details = f"SyntaxError: {e.msg} (line {e.lineno})\n{(e.text or '').rstrip()}\n{pointer}"
+        return (
+            "SYNTAX ERROR / LOI CU PHAP",
+            "Check Python syntax: parentheses, colons, indentation. / Kiem tra cu phap Python: dau ngoac, dau hai cham, indent.",
+            details,
+        )
+
+    scene_classes = find_scene_classes(code)
+    if class_name not in scene_classes:
+        found = ", ".join(scene_classes) if scene_classes else "none / khong co"
+        return (
+            "CLASS NOT FOUND / KHONG TIM THAY LOP",
+            "Pass the name of a class that inherits from Scene. / Dung ten lop ke thua tu Scene.",
+            f"Class '{class_name}' is not a Scene subclass in this code. Scene classes found: {found}",
+        )
+
+    own_methods = {
+        item.name
+        for node in tree.body if isinstance(node, ast.ClassDef)
+        for item in node.body if isinstance(item, ast.FunctionDef)
+    }
+
+    problems = []
+    uses_value_tracker = False
+    uses_updaters = False
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+        if name in BANNED_CALLS:
+            problems.append((node.lineno, BANNED_CALLS[name]))
+        elif name == "ValueTracker":
+            uses_value_tracker = True
+        elif name in ("add_updater", "always_redraw"):
+            uses_updaters = True
+
+        if (
+            isinstance(func, ast.Attribute)
+            and isinstance(func.value, ast.Name)
+            and func.value.id == "self"
+            and func.attr not in SCENE_METHOD_ALLOWLIST
+            and func.attr not in own_methods
+        ):
+            problems.append((node.lineno, f"self.{func.attr}() is not an allowed Scene method / khong duoc phep"))
+
+    if uses_value_tracker and uses_updaters:
+        problems.append((0, "ValueTracker with updaters (moving dots/lines) is banned by the handbook / ValueTracker phuc tap bi cam"))
+
+    if problems:
+        return (
+            "HANDBOOK VIOLATION / VI PHAM SO TAY",
+            "Only use the APIs allowed by the Manim handbook: axes.plot(), Create(), Write(), FadeIn/FadeOut(), Transform(), VGroup(). / Chi dung API trong so tay.",
+            "\n".join(
+                f"line {lineno}: {message}" if lineno else message
+                for lineno, message in sorted(problems)
+            ),
+        )
+    return None
+
+
+class RenderCancelled(Exception):
+    """A manim run was stopped from outside. / Lan chay manim da bi huy."""
+
+
+# How often a cancellable manim run checks its cancel event (seconds)
+CANCEL_POLL_SECONDS = 0.2
+
+
+def run_manim(command: list, cwd: str, cancel=None):
+    """subprocess.run(command, check=True) that kills manim once `cancel` is set.
+
+    `cancel` is a threading.Event; without one this is a plain subprocess.run.
+    Raises CalledProcessError on failure and RenderCancelled when killed.
+    """
+    if cancel is None:
+        subprocess.run(command, capture_output=True, text=True, cwd=cwd, check=True)
+        return
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=CANCEL_POLL_SECONDS)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel.is_set():
+                process.kill()
+                process.communicate()
+                raise RenderCancelled(" ".join(command)) from None
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+
+
+# Merge tuning / Tinh chinh ghep video-audio
+DURATION_TOLERANCE = 0.03        # 3% gap: mux as-is, -shortest trims the tail
+AUDIO_TEMPO_RANGE = (0.8, 1.25)  # speech stays natural inside this range
+MERGE_STRATEGIES = ("auto", "audio", "video")
 
-# Ensure workspace directory exists / Dam bao thu muc workspace ton tai
-os.makedirs("workspace", exist_ok=True)
 
 class FFmpegTool(BaseTool):
-    """Enhanced FFmpeg tool with speed adjustment. / Cong cu FFmpeg voi dieu chinh toc do."""
+    """FFmpeg merge tool that avoids re-encoding video when it can. / Cong cu FFmpeg ghep video-audio."""
     
     name: str = "FFmpeg Video-Audio Merger"
     description: str = (
@@ -16,92 +184,121 @@ class FFmpegTool(BaseTool):
         "Ghep video va audio thanh mot file output. "
         "Can adjust video speed to match audio duration. "
         "Arguments: video_file (str), audio_file (str), output_file (str, default='final_video.mp4'), "
-        "speed_adjust (bool, default=True) - automatically adjust video speed to match audio duration."
+        "speed_adjust (bool, default=True) - automatically match video and audio durations, "
+        "strategy (str, default='auto') - 'auto' stream-copies the video and stretches the audio, "
+        "re-encoding the video only when the gap is too large; 'audio' or 'video' forces one side "
+        "('audio' fails if the gap is too large to stretch), "
+        "tolerance (float, default=0.03) - relative duration gap merged without any stretching, "
+        "normalize_audio (bool, default=True) - normalize speech loudness (EBU R128) in the same pass. "
+        "Reports which merge path was taken."
     )
 
-    def _get_duration(self, file_path: str) -> float:
-        """Get media file duration using ffprobe."""
-        try:
-            result = subprocess.run(
-                [
-                    "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                    "-of", "json", file_path
-                ],
-                capture_output=True, text=True, check=True
-            )
-            data = json.loads(result.stdout)
-            return float(data["format"]["duration"])
-        except Exception:
-            return 0.0
-
     def _run(
         self, 
         video_file: str, 
         audio_file: str, 
         output_file: str = "final_video.mp4",
         speed_adjust: bool = True,
-        normalize_audio: bool = True
+        normalize_audio: bool = True,
+        strategy: str = "auto",
+        tolerance: float = DURATION_TOLERANCE
     ) -> str:
-        video_path = os.path.join("workspace", video_file)
-        audio_path = os.path.join("workspace", audio_file)
-        output_path = os.path.join("workspace", output_file)
+        video_path = workspace_path(video_file)
+        audio_path = workspace_path(audio_file)
+        output_path = workspace_path(output_file)
 
+        if strategy not in MERGE_STRATEGIES:
+            return (
+                f"[ERROR] Unknown strategy '{strategy}' (use {', '.join(MERGE_STRATEGIES)}) / "
+                f"Khong co strategy nay"
+            )
         if not os.path.exists(video_path):
             return f"Error: Video file not found at {video_path} / Khong tim thay file video"
         if not os.path.exists(audio_path):
             return f"Error: Audio file not found at {audio_path} / Khong tim thay file audio"
 
-        # Get duration of both files
-        video_duration = self._get_duration(video_path)
-        audio_duration = self._get_duration(audio_path)
+        # Get duration of both files (one concurrent, cached probe)
+        probed = probe_many([video_path, audio_path])
+        video_duration = probed[video_path].duration if probed[video_path] else 0.0
+        audio_duration = probed[audio_path].duration if probed[audio_path] else 0.0
 
         if video_duration <= 0 or audio_duration <= 0:
             speed_adjust = False
 
-        # Calculate speed factor
-        if speed_adjust and video_duration > 0 and audio_duration > 0:
+        # Pick the cheapest path: copy video > stretch audio > re-encode video
+        merge_path = "copy"
+        audio_tempo = 1.0
+        if speed_adjust:
+            mismatch = abs(video_duration - audio_duration) / audio_duration
+            audio_tempo = audio_duration / video_duration
+            audio_range_ok = AUDIO_TEMPO_RANGE[0] <= audio_tempo <= AUDIO_TEMPO_RANGE[1]
+            if strategy == "video":
+                merge_path = "video-retime"
+            elif mismatch <= tolerance:
+                merge_path = "copy"
+            elif strategy in ("auto", "audio") and audio_range_ok:
+                merge_path = "audio-stretch"
+            elif strategy == "auto":
+                merge_path = "video-retime"
+            elif strategy == "audio":
+                # Copying the video unchanged would leave the durations out of
+                # sync; only "auto" may fall back to re-timing the video
+                return (
+                    f"[ERROR] Audio tempo {audio_tempo:.3f}x is outside the supported range "
+                    f"{AUDIO_TEMPO_RANGE[0]}-{AUDIO_TEMPO_RANGE[1]}x (video={video_duration:.2f}s, "
+                    f"audio={audio_duration:.2f}s). Use strategy='auto' or 'video'. / "
+                    f"Toc do audio nam ngoai khoang ho tro, hay dung strategy='auto' hoac 'video'."
+                )
+
+        # One audio filter graph does tempo, loudness and resampling, so the
+        # voiceover is encoded exactly once (to AAC) on the way into the merge
+        audio_tempo = audio_tempo if merge_path == "audio-stretch" else 1.0
+        measurements = loudness_cache.measure(audio_path) if normalize_audio else None
+        audio_filter = finish_filter(audio_tempo, normalize_audio, measurements)
+
+        filters = []
+        if merge_path == "video-retime":
             speed_factor = video_duration / audio_duration
             speed_factor = max(0.5, min(2.0, speed_factor))
-            video_filter = f"setpts={1/speed_factor}*PTS"
-            
-            command = [
-                "ffmpeg",
-                "-y",
-                "-i", video_path,
-                "-i", audio_path,
-                "-filter_complex", f"[0:v]{video_filter}[v]",
-                "-map", "[v]",
-                "-map", "1:a",
-                "-c:v", "libx264",
-                "-preset", "medium",
-                "-crf", "23",
-                "-c:a", "aac",
-                "-b:a", "192k",
-                "-shortest",
-                output_path,
-            ]
-            
+            filters.append(f"[0:v]setpts={1/speed_factor}*PTS[v]")
             duration_info = (
                 f"\nInfo: Video={video_duration:.2f}s, Audio={audio_duration:.2f}s, "
                 f"Speed factor={speed_factor:.2f}x"
             )
+        elif merge_path == "audio-stretch":
+            # Video is stream-copied; only the (cheap) audio track is re-timed
+            duration_info = (
+                f"\nInfo: Video={video_duration:.2f}s, Audio={audio_duration:.2f}s, "
+                f"Audio tempo={audio_tempo:.3f}x"
+            )
         else:
-            command = [
-                "ffmpeg",
-                "-y",
-                "-i", video_path,
-                "-i", audio_path,
-                "-c:v", "copy",
-                "-c:a", "aac",
-                "-b:a", "192k",
-                "-shortest",
-                output_path,
-            ]
             duration_info = ""
+        if audio_filter:
+            filters.append(f"[1:a]{audio_filter}[a]")
+
+        command = ["ffmpeg", "-y", "-i", video_path, "-i", audio_path]
+        if filters:
+            command += ["-filter_complex", ";".join(filters)]
+        command += ["-map", "[v]" if merge_path == "video-retime" else "0:v"]
+        command += ["-map", "[a]" if audio_filter else "1:a"]
+        if merge_path == "video-retime":
+            command += ["-c:v", "libx264", "-preset", "medium", "-crf", "23"]
+        else:
+            command += ["-c:v", "copy"]
+        command += ["-c:a", "aac", "-b:a", "192k", "-shortest", output_path]
+        if normalize_audio:
+            loudness = "two-pass" if measurements else "one-pass"
+            duration_info += f"\nLoudness / Am luong: {loudness} loudnorm"
 
         try:
+            started = time.perf_counter()
             subprocess.run(command, check=True, capture_output=True, text=True)
-            return f"[OK] Video and audio merged successfully! / Ghep video va audio thanh cong!\nFinal video at: {output_path}{duration_info}"
+            elapsed = time.perf_counter() - started
+            return (
+                f"[OK] Video and audio merged successfully! / Ghep video va audio thanh cong!\n"
+                f"Final video at: {output_path}{duration_info}\n"
+                f"Merge path / Cach ghep: {merge_path} ({elapsed:.2f}s)"
+            )
         except subprocess.CalledProcessError as e:
             return f"[ERROR] FFmpeg execution failed / FFmpeg that bai: {e.stderr}"
         except FileNotFoundError:
@@ -117,7 +314,10 @@ class ManimExecutionTool(BaseTool):
         "Supports Vietnamese text in animations. "
         "Arguments: manim_code (str) - Python code, class_name (str) - Manim class name, "
         "quality (str, default='h') - 'l'=480p, 'm'=720p, 'h'=1080p, 'p'=1440p, 'k'=4K, "
-        "fps (int, default=30) - frame rate (15, 30, or 60). "
+        "fps (int, default=30) - frame rate (15, 30, or 60), "
+        "use_cache (bool, default=True) - reuse a previous render of identical code, "
+        "parallel_sections (bool, default=False) - render '# === SCENE n ===' blocks in parallel, "
+        "validate_only (bool, default=False) - only check that the code runs (fast dry run, no video). "
         "Returns the path to the rendered video file, duration, and resolution info."
     )
 
@@ -129,21 +329,6 @@ class ManimExecutionTool(BaseTool):
         "k": {"flag": "-qk", "resolution": "4K", "default_fps": 60},
     }
 
-    def _get_video_duration(self, video_path: str) -> float:
-        """Get video duration using ffprobe."""
-        try:
-            result = subprocess.run(
-                [
-                    "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                    "-of", "json", video_path
-                ],
-                capture_output=True, text=True, check=True
-            )
-            data = json.loads(result.stdout)
-            return float(data["format"]["duration"])
-        except Exception:
-            return 0.0
-
     def _detect_vietnamese(self, code: str) -> bool:
         """Check if code contains Vietnamese characters."""
         vietnamese_chars = 'àáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬÈÉẺẼẸÊỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢÙÚỦŨỤƯỪỨỬỮỰỲÝỶỸỴĐ'
@@ -178,13 +363,248 @@ vietnamese_template.preamble = r'''
         
         return code
 
+    def _format_success(self, video_file_path: str, quality_info: dict, fps: int,
+                        duration: float, cached: bool = False) -> str:
+        duration_str = f"{duration:.2f}s" if duration > 0 else "unknown"
+        cache_note = " (cached / tu bo nho dem)" if cached else ""
+        return (
+            f"[OK] Manim scene rendered successfully!{cache_note} / Manim scene render thanh cong!\n"
+            f"Video path: {video_file_path}\n"
+            f"Resolution / Do phan giai: {quality_info['resolution']} @ {fps}fps\n"
+            f"Duration / Thoi luong: {duration_str}"
+        )
+
+    def _render_file(
+        self,
+        manim_code: str,
+        class_name: str,
+        quality_info: dict,
+        fps: int,
+        work_dir: str,
+        file_name: str,
+        use_cache: bool = True
+    ):
+        """Render one source file into work_dir/file_name.mp4.
+
+        Returns (video_path, duration, cached). Raises CalledProcessError when
+        manim fails and FileNotFoundError when manim is not installed.
+        """
+        os.makedirs(work_dir, exist_ok=True)
+        py_file_path = os.path.join(work_dir, f"{file_name}.py")
+        expected_video_path = os.path.join(work_dir, f"{file_name}.mp4")
+
+        # Write Manim code to .py file
+        with open(py_file_path, "w", encoding="utf-8") as f:
+            f.write(manim_code)
+
+        cache_key = render_cache.make_key(manim_code, class_name, quality_info["flag"], fps)
+
+        # Reuse a previous render of the same code / Dung lai ban render truoc
+        if use_cache:
+            cached = render_cache.get(cache_key)
+            if cached:
+                cached_video, duration = cached
+                try:
+                    shutil.copy2(cached_video, expected_video_path)
+                    return expected_video_path, duration, True
+                except OSError:
+                    # Pruned since get(); render it again like a miss
+                    pass
+
+        # Build Manim command
+        command = [
+            "manim",
+            quality_info["flag"],
+            "--fps", str(fps),
+            f"{file_name}.py",
+            class_name,
+            "--media_dir", ".",
+            "-o", file_name,
+        ]
+        subprocess.run(command, capture_output=True, text=True, cwd=work_dir, check=True)
+
+        # Find and copy video to work dir root
+        search_pattern = os.path.join(work_dir, "videos", file_name, "*", f"{file_name}.mp4")
+        found_videos = glob.glob(search_pattern)
+        if found_videos:
+            shutil.copy2(found_videos[0], expected_video_path)
+
+        # Get video duration
+        duration = get_duration(expected_video_path)
+
+        if use_cache and found_videos:
+            try:
+                render_cache.put(
+                    cache_key, expected_video_path, duration,
+                    class_name=class_name, flag=quality_info["flag"], fps=fps
+                )
+            except OSError:
+                pass  # Cache is best-effort / Bo nho dem khong bat buoc
+
+        return expected_video_path, duration, False
+
+    def _validate_file(self, manim_code: str, class_name: str, work_dir: str, file_name: str, cancel=None):
+        """Execute construct() at the lowest quality without writing any video.
+
+        Uses manim's --dry_run at 480p/15fps: Python and LaTeX errors surface
+        exactly as in a real render, but no frames are encoded. Setting the
+        `cancel` event stops the run (RenderCancelled).
+        """
+        os.makedirs(work_dir, exist_ok=True)
+        with open(os.path.join(work_dir, f"{file_name}.py"), "w", encoding="utf-8") as f:
+            f.write(manim_code)
+
+        validation_quality = self.QUALITY_MAP["l"]
+        command = [
+            "manim",
+            validation_quality["flag"],
+            "--fps", str(validation_quality["default_fps"]),
+            "--dry_run",
+            f"{file_name}.py",
+            class_name,
+            "--media_dir", ".",
+        ]
+        run_manim(command, work_dir, cancel)
+
+    def render_file(
+        self,
+        code_file: str,
+        class_name: str = None,
+        quality: str = "h",
+        fps: int = 30,
+        parallel_sections: bool = None,
+        cpu_slot=None
+    ) -> str:
+        """Final render of an approved code file in the workspace. / Render ban cuoi.
+
+        parallel_sections=None follows PARALLEL_SECTIONS. `cpu_slot()` returns a
+        context manager held around every manim process (the whole render or
+        each section), e.g. the API scheduler's CPU slot.
+        """
+        try:
+            with open(workspace_path(code_file), "r", encoding="utf-8") as f:
+                manim_code = f.read()
+        except OSError as e:
+            return f"[ERROR] Error reading Manim code file / Loi doc file ma Manim: {e}"
+
+        if not class_name:
+            scene_classes = find_scene_classes(manim_code)
+            if not scene_classes:
+                return "[ERROR] No Scene class found in code / Khong tim thay lop Scene trong ma"
+            class_name = scene_classes[-1]
+
+        if parallel_sections is None:
+            parallel_sections = PARALLEL_SECTIONS
+        return self._render(
+            manim_code, class_name, quality=quality, fps=fps,
+            parallel_sections=parallel_sections, cpu_slot=cpu_slot
+        )
+
+    def _render_sections(
+        self,
+        sections: list,
+        class_name: str,
+        quality_info: dict,
+        fps: int,
+        output_path: str,
+        use_cache: bool = True,
+        cpu_slot=nullcontext
+    ):
+        """Render scene sections concurrently and join them with stream copy.
+
+        Each section runs in its own manim process, inside one cpu_slot(); the
+        thread pool only waits on those processes. Returns (video_path,
+        duration, cached_sections).
+        """
+        sections_dir = workspace_path("sections")
+        max_workers = min(len(sections), os.cpu_count() or 1)
+
+        def render(i, code):
+            with cpu_slot():
+                return self._render_file(
+                    code, class_name, quality_info, fps,
+                    os.path.join(sections_dir, f"section_{i + 1}"), f"section_{i + 1}", use_cache
+                )
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(render, i, code) for i, code in enumerate(sections)]
+            results = [future.result() for future in futures]
+
+        concat_media([video_path for video_path, _, _ in results], output_path)
+        duration = get_duration(output_path)
+        cached_sections = sum(1 for _, _, cached in results if cached)
+        return output_path, duration, cached_sections
+
+    def _format_error(self, e: subprocess.CalledProcessError) -> str:
+        stderr = e.stderr or ""
+        stdout = e.stdout or ""
+        error_type, suggestion = self._classify_error(stderr, stdout)
+        return self._error_report(
+            error_type, f"Manim execution failed (code {e.returncode})", suggestion, stderr, stdout
+        )
+
+    def _classify_error(self, stderr: str, stdout: str = "") -> tuple:
+        """(error_type, suggestion) for manim's output. / Phan loai loi."""
+        error_type = "Unknown Error / Loi khong xac dinh"
+        suggestion = ""
+        
+        if "SyntaxError" in stderr or "SyntaxError" in stdout:
+            error_type = "SYNTAX ERROR / LOI CU PHAP"
+            suggestion = "Check Python syntax: parentheses, colons, indentation. / Kiem tra cu phap Python: dau ngoac, dau hai cham, indent."
+        elif "ImportError" in stderr or "ModuleNotFoundError" in stderr:
+            error_type = "IMPORT ERROR / LOI IMPORT"
+            suggestion = "Module does not exist. Only use classes from 'from manim import *'. / Module khong ton tai."
+        elif "AttributeError" in stderr:
+            error_type = "ATTRIBUTE ERROR / LOI ATTRIBUTE"
+            suggestion = "Method or property does not exist. Check method name spelling. / Method hoac property khong ton tai."
+        elif "TypeError" in stderr:
+            error_type = "TYPE ERROR / LOI KIEU DU LIEU"
+            suggestion = "Wrong data type. Check parameters passed. / Sai kieu du lieu."
+        elif "ValueError" in stderr:
+            error_type = "VALUE ERROR / LOI GIA TRI"
+            suggestion = "Invalid value. / Gia tri khong hop le."
+        elif "RuntimeError" in stderr or "Exception" in stderr:
+            error_type = "RUNTIME ERROR / LOI RUNTIME"
+            suggestion = "Error during execution. Check logic in construct(). / Loi khi thuc thi."
+        
+        return error_type, suggestion
+
+    def _error_report(self, error_type: str, headline: str, suggestion: str,
+                      stderr: str, stdout: str = "") -> str:
+        return (
+            f"[ERROR] {error_type} - {headline}\n\n"
+            f"Suggestion / Goi y: {suggestion}\n\n"
+            f"--- STDERR ---\n{stderr}\n\n"
+            f"--- STDOUT ---\n{stdout}"
+        )
+
     def _run(
         self, 
         manim_code: str, 
         class_name: str, 
         quality: str = "h",
-        fps: int = 30
+        fps: int = 30,
+        use_cache: bool = True,
+        parallel_sections: bool = False,
+        validate_only: bool = False
     ) -> str:
+        return self._render(
+            manim_code, class_name, quality=quality, fps=fps, use_cache=use_cache,
+            parallel_sections=parallel_sections, validate_only=validate_only
+        )
+
+    def _render(
+        self,
+        manim_code: str,
+        class_name: str,
+        quality: str = "h",
+        fps: int = 30,
+        use_cache: bool = True,
+        parallel_sections: bool = False,
+        validate_only: bool = False,
+        cpu_slot=None
+    ) -> str:
+        cpu_slot = cpu_slot or nullcontext
         # Validate quality
         quality = quality.lower()
         if quality not in self.QUALITY_MAP:
@@ -197,101 +617,69 @@ vietnamese_template.preamble = r'''
             fps = quality_info["default_fps"]
         
         file_name = "animation_scene"
-        py_file_path_to_write = os.path.join("workspace", f"{file_name}.py")
-        py_file_path_for_command = f"{file_name}.py"
         
         # Inject Vietnamese support if needed
         manim_code = self._inject_vietnamese_support(manim_code)
 
-        # Write Manim code to .py file
+        # Static pre-flight check: fail in milliseconds instead of after manim starts
+        preflight = preflight_check(manim_code, class_name)
+        if preflight:
+            error_type, suggestion, details = preflight
+            return self._error_report(error_type, "Pre-flight check failed, manim was not run", suggestion, details)
+
         try:
-            with open(py_file_path_to_write, "w", encoding="utf-8") as f:
-                f.write(manim_code)
-        except Exception as e:
-            return f"[ERROR] Error writing Manim code to file / Loi ghi ma Manim vao file: {e}"
+            if validate_only:
+                with cpu_slot():
+                    self._validate_file(manim_code, class_name, get_workspace_dir(), file_name)
+                return (
+                    "[OK] Manim code validated successfully (dry run, no video written) / "
+                    "Ma Manim hop le (chay thu, khong xuat video)\n"
+                    "Run again with validate_only=False for the final render. / "
+                    "Chay lai voi validate_only=False de render ban cuoi."
+                )
 
-        # Build Manim command
-        command = [
-            "manim",
-            quality_info["flag"],
-            "--fps", str(fps),
-            py_file_path_for_command,
-            class_name,
-            "--media_dir", ".",
-            "-o", file_name,
-        ]
+            whole_key = render_cache.make_key(manim_code, class_name, quality_info["flag"], fps)
+            sections = split_scene_sections(manim_code, class_name) if parallel_sections else None
+
+            # A whole-file cache hit is cheaper than any section work
+            if sections and not (use_cache and render_cache.get(whole_key)):
+                # Keep the full source next to the video for reference
+                with open(workspace_path(f"{file_name}.py"), "w", encoding="utf-8") as f:
+                    f.write(manim_code)
+
+                output_path = workspace_path(f"{file_name}.mp4")
+                video_file_path, duration, cached_sections = self._render_sections(
+                    sections, class_name, quality_info, fps, output_path, use_cache, cpu_slot
+                )
+                if use_cache:
+                    try:
+                        render_cache.put(
+                            whole_key, video_file_path, duration,
+                            class_name=class_name, flag=quality_info["flag"], fps=fps
+                        )
+                    except OSError:
+                        pass
+                return (
+                    self._format_success(video_file_path, quality_info, fps, duration)
+                    + f"\nSections / Phan doan: {len(sections)} rendered in parallel "
+                    f"({cached_sections} cached)"
+                )
+
+            with cpu_slot():
+                video_file_path, duration, cached = self._render_file(
+                    manim_code, class_name, quality_info, fps, get_workspace_dir(), file_name, use_cache
+                )
+            return self._format_success(video_file_path, quality_info, fps, duration, cached=cached)
 
-        try:
-            result = subprocess.run(
-                command,
-                capture_output=True,
-                text=True,
-                cwd="workspace", 
-                check=True
-            )
-            
-            # Find and copy video to workspace root
-            import shutil
-            import glob
-            
-            search_pattern = os.path.join("workspace", "videos", file_name, "*", f"{file_name}.mp4")
-            found_videos = glob.glob(search_pattern)
-            expected_video_path = os.path.join("workspace", f"{file_name}.mp4")
-            
-            if found_videos:
-                shutil.copy2(found_videos[0], expected_video_path)
-                video_file_path = expected_video_path
-            else:
-                video_file_path = expected_video_path
-            
-            # Get video duration
-            duration = self._get_video_duration(video_file_path)
-            duration_str = f"{duration:.2f}s" if duration > 0 else "unknown"
-            
-            return (
-                f"[OK] Manim scene rendered successfully! / Manim scene render thanh cong!\n"
-                f"Video path: {video_file_path}\n"
-                f"Resolution / Do phan giai: {quality_info['resolution']} @ {fps}fps\n"
-                f"Duration / Thoi luong: {duration_str}"
-            )
-            
         except subprocess.CalledProcessError as e:
-            stderr = e.stderr
-            stdout = e.stdout
-            
-            error_type = "Unknown Error / Loi khong xac dinh"
-            suggestion = ""
-            
-            if "SyntaxError" in stderr or "SyntaxError" in stdout:
-                error_type = "SYNTAX ERROR / LOI CU PHAP"
-                suggestion = "Check Python syntax: parentheses, colons, indentation. / Kiem tra cu phap Python: dau ngoac, dau hai cham, indent."
-            elif "ImportError" in stderr or "ModuleNotFoundError" in stderr:
-                error_type = "IMPORT ERROR / LOI IMPORT"
-                suggestion = "Module does not exist. Only use classes from 'from manim import *'. / Module khong ton tai."
-            elif "AttributeError" in stderr:
-                error_type = "ATTRIBUTE ERROR / LOI ATTRIBUTE"
-                suggestion = "Method or property does not exist. Check method name spelling. / Method hoac property khong ton tai."
-            elif "TypeError" in stderr:
-                error_type = "TYPE ERROR / LOI KIEU DU LIEU"
-                suggestion = "Wrong data type. Check parameters passed. / Sai kieu du lieu."
-            elif "ValueError" in stderr:
-                error_type = "VALUE ERROR / LOI GIA TRI"
-                suggestion = "Invalid value. / Gia tri khong hop le."
-            elif "RuntimeError" in stderr or "Exception" in stderr:
-                error_type = "RUNTIME ERROR / LOI RUNTIME"
-                suggestion = "Error during execution. Check logic in construct(). / Loi khi thuc thi."
-            
-            error_message = (
-                f"[ERROR] {error_type} - Manim execution failed (code {e.returncode})\n\n"
-                f"Suggestion / Goi y: {suggestion}\n\n"
-                f"--- STDERR ---\n{stderr}\n\n"
-                f"--- STDOUT ---\n{stdout}"
-            )
-            return error_message
-            
+            return self._format_error(e)
+
         except FileNotFoundError:
             return "[ERROR] 'manim' command not found. Please install Manim. / Khong tim thay lenh 'manim'. Vui long cai dat Manim."
 
+        except OSError as e:
+            return f"[ERROR] Error writing Manim code to file / Loi ghi ma Manim vao file: {e}"
+
 
 class VideoDurationTool(BaseTool):
     """Tool to get video or audio duration information."""
@@ -304,23 +692,21 @@ class VideoDurationTool(BaseTool):
     )
 
     def _run(self, file_name: str) -> str:
-        file_path = os.path.join("workspace", file_name)
+        file_path = workspace_path(file_name)
         
         if not os.path.exists(file_path):
             return f"[ERROR] File not found at {file_path} / Khong tim thay file"
         
-        try:
-            result = subprocess.run(
-                [
-                    "ffprobe", "-v", "error", "-show_entries", "format=duration",
-                    "-of", "json", file_path
-                ],
-                capture_output=True, text=True, check=True
-            )
-            data = json.loads(result.stdout)
-            duration = float(data["format"]["duration"])
-            return f"[OK] Duration of {file_name} / Thoi luong cua {file_name}: {duration:.2f} seconds / giay"
-        except subprocess.CalledProcessError as e:
-            return f"[ERROR] Error getting duration / Loi lay thoi luong: {e.stderr}"
-        except Exception as e:
-            return f"[ERROR] Error / Loi: {e}"
\ No newline at end of file
+        info = probe_media(file_path)
+        if info is None or info.duration <= 0:
+            return f"[ERROR] Error getting duration / Loi lay thoi luong: could not probe {file_path}"
+        
+        details = ""
+        if info.has_video:
+            details += f"\nVideo: {info.width}x{info.height} @ {info.fps:.2f}fps ({info.video_codec})"
+        if info.has_audio:
+            details += f"\nAudio: {info.audio_codec}, {info.sample_rate}Hz, {info.channels}ch"
+        return (
+            f"[OK] Duration of {file_name} / Thoi luong cua {file_name}: {info.duration:.2f} seconds / giay"
+            f"{details}"
+        )
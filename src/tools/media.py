@@ -0,0 +1,169 @@
+# src/tools/media.py - Shared media probing (with a per-file cache) and stream-copy joins
+
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Everything the tools need from one ffprobe call. / Thong tin media."""
+
+    path: str
+    duration: float = 0.0
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    video_codec: str = None
+    audio_codec: str = None
+    sample_rate: int = 0
+    channels: int = 0
+    streams: tuple = ()  # codec_type of each stream, in order
+
+    @property
+    def has_video(self) -> bool:
+        return "video" in self.streams
+
+    @property
+    def has_audio(self) -> bool:
+        return "audio" in self.streams
+
+
+_CACHE_SIZE = 512
+_cache = OrderedDict()  # (abspath, size, mtime_ns) -> MediaInfo
+_cache_lock = threading.Lock()
+
+
+def _parse_rate(rate: str) -> float:
+    try:
+        num, _, den = (rate or "0/1").partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _run_ffprobe(path: str) -> MediaInfo:
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries",
+            "format=duration:stream=codec_type,codec_name,width,height,avg_frame_rate,sample_rate,channels",
+            "-of", "json", path
+        ],
+        capture_output=True, text=True, check=True
+    )
+    data = json.loads(result.stdout)
+    fields = {"path": path, "duration": float(data.get("format", {}).get("duration", 0.0))}
+    streams = []
+    for stream in data.get("streams", []):
+        codec_type = stream.get("codec_type")
+        streams.append(codec_type)
+        if codec_type == "video" and "video_codec" not in fields:
+            fields.update(
+                video_codec=stream.get("codec_name"),
+                width=int(stream.get("width", 0)),
+                height=int(stream.get("height", 0)),
+                fps=_parse_rate(stream.get("avg_frame_rate")),
+            )
+        elif codec_type == "audio" and "audio_codec" not in fields:
+            fields.update(
+                audio_codec=stream.get("codec_name"),
+                sample_rate=int(stream.get("sample_rate", 0)),
+                channels=int(stream.get("channels", 0)),
+            )
+    return MediaInfo(streams=tuple(streams), **fields)
+
+
+def _probe_mp3_fallback(path: str) -> MediaInfo:
+    """Duration-only probe for MP3 files when ffprobe is not installed."""
+    from mutagen.mp3 import MP3
+    audio = MP3(path)
+    return MediaInfo(
+        path=path,
+        duration=audio.info.length,
+        audio_codec="mp3",
+        sample_rate=audio.info.sample_rate,
+        channels=audio.info.channels,
+        streams=("audio",),
+    )
+
+
+def probe_media(path: str):
+    """Probe a media file, reusing the result while its size and mtime are unchanged.
+
+    Returns None when the file is missing or cannot be probed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    with _cache_lock:
+        info = _cache.get(key)
+        if info is not None:
+            _cache.move_to_end(key)
+            return info
+
+    try:
+        info = _run_ffprobe(path)
+    except FileNotFoundError:
+        if not path.lower().endswith(".mp3"):
+            return None
+        try:
+            info = _probe_mp3_fallback(path)
+        except Exception:
+            return None
+    except Exception:
+        return None
+
+    with _cache_lock:
+        _cache[key] = info
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return info
+
+
+def probe_many(paths, max_workers: int = 4) -> dict:
+    """Probe several files concurrently. Returns {path: MediaInfo or None}."""
+    paths = list(paths)
+    if len(paths) <= 1:
+        return {path: probe_media(path) for path in paths}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as pool:
+        return dict(zip(paths, pool.map(probe_media, paths)))
+
+
+def get_duration(path: str) -> float:
+    """Duration in seconds, or 0.0 when unknown."""
+    info = probe_media(path)
+    return info.duration if info else 0.0
+
+
+def concat_media(input_paths: list, output_path: str) -> str:
+    """Join media files with the ffmpeg concat demuxer using stream copy (no re-encode).
+
+    All inputs must share codec parameters, which holds for scene sections
+    rendered with the same settings and for TTS segments from one engine.
+    Raises CalledProcessError on failure, FileNotFoundError without ffmpeg.
+    """
+    list_path = f"{output_path}.concat.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in input_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-f", "concat", "-safe", "0",
+                "-i", list_path, "-c", "copy", output_path,
+            ],
+            capture_output=True, text=True, check=True
+        )
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+    return output_path
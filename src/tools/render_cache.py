@@ -0,0 +1,160 @@
+# src/tools/render_cache.py - Content-addressed cache for Manim renders
+
+import ast
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join("workspace", ".render_cache")
+
+# Caps of the cache directory; the least recently used entries go first
+DEFAULT_MAX_MB = 2048
+DEFAULT_MAX_AGE_DAYS = 30
+
+
+def get_manim_version() -> str:
+    """Installed Manim version, part of every cache key. / Phien ban Manim da cai dat."""
+    try:
+        from importlib.metadata import version
+        return version("manim")
+    except Exception:
+        return "unknown"
+
+
+def normalize_code(code: str) -> str:
+    """Normalize code so formatting-only changes hit the same cache entry.
+
+    Comments and whitespace do not change the rendered video, so the AST is
+    unparsed back to source when the code is valid Python. Invalid code falls
+    back to plain line normalization.
+    """
+    try:
+        return ast.unparse(ast.parse(code))
+    except (SyntaxError, ValueError):
+        lines = [line.rstrip() for line in code.replace("\r\n", "\n").split("\n")]
+        return "\n".join(lines).strip()
+
+
+def prune_cache_dir(cache_dir: str, max_bytes: int, max_age: float) -> int:
+    """Delete entries older than max_age seconds, then the oldest until under max_bytes.
+
+    An entry is every file sharing a name before the first '.' (e.g. '<key>.mp4'
+    and '<key>.json'); its age is the newest mtime among them. Returns the
+    number of entries removed.
+    """
+    entries = {}
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if name.endswith(".tmp"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entry = entries.setdefault(name.split(".", 1)[0], {"paths": [], "size": 0, "mtime": 0.0})
+        entry["paths"].append(path)
+        entry["size"] += stat.st_size
+        entry["mtime"] = max(entry["mtime"], stat.st_mtime)
+
+    now = time.time()
+    total = sum(entry["size"] for entry in entries.values())
+    removed = 0
+    for entry in sorted(entries.values(), key=lambda e: e["mtime"]):
+        if now - entry["mtime"] <= max_age and total <= max_bytes:
+            break
+        for path in entry["paths"]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= entry["size"]
+        removed += 1
+    return removed
+
+
+class RenderCache:
+    """Persistent mp4 cache keyed on (code, class_name, quality flag, fps, Manim version).
+
+    Each entry is stored as '<key>.mp4' plus '<key>.json' with the duration and
+    render settings. Whole-file renders and single sections share the same store.
+    Hits refresh an entry's mtime; after each put() the directory is pruned to
+    `max_bytes` and `max_age` seconds.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None, max_age: float = None):
+        self.cache_dir = cache_dir or os.environ.get("RENDER_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.environ.get("RENDER_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 2 ** 20)
+        self.max_age = max_age if max_age is not None else (
+            float(os.environ.get("RENDER_CACHE_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS)) * 86400)
+        self._lock = threading.Lock()
+        self._manim_version = None
+
+    @property
+    def manim_version(self) -> str:
+        if self._manim_version is None:
+            self._manim_version = get_manim_version()
+        return self._manim_version
+
+    def make_key(self, code: str, class_name: str, quality_flag: str, fps: int) -> str:
+        payload = "\x00".join([
+            normalize_code(code),
+            class_name,
+            quality_flag,
+            str(fps),
+            self.manim_version,
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        return (
+            os.path.join(self.cache_dir, f"{key}.mp4"),
+            os.path.join(self.cache_dir, f"{key}.json"),
+        )
+
+    def get(self, key: str):
+        """Return (video_path, duration) for a cached render, or None on miss."""
+        video_path, meta_path = self._paths(key)
+        if not (os.path.exists(video_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # Recently used entries survive pruning
+            os.utime(video_path)
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return video_path, float(meta.get("duration", 0.0))
+
+    def put(self, key: str, video_path: str, duration: float, **meta) -> str:
+        """Store a rendered video. Returns the cached video path."""
+        cached_video, meta_path = self._paths(key)
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to temp files first so readers never see a half-copied entry
+            tmp_video = f"{cached_video}.{os.getpid()}.tmp"
+            shutil.copy2(video_path, tmp_video)
+            os.replace(tmp_video, cached_video)
+
+            meta.update({
+                "duration": duration,
+                "manim_version": self.manim_version,
+                "created_at": time.time(),
+            })
+            tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+            prune_cache_dir(self.cache_dir, self.max_bytes, self.max_age)
+        return cached_video
@@ -0,0 +1,430 @@
+# src/tools/scene_sections.py - Split a Manim scene into independently renderable sections
+
+import ast
+import re
+import textwrap
+from collections import Counter
+
+# Matches the "# === SCENE 1: Power Rule ===" markers used by the handbook template
+SECTION_MARKER = re.compile(r"^\s*#\s*=+\s*SCENE\b", re.IGNORECASE)
+
+# Animations that take their mobjects off the screen
+CLEANUP_CALLS = {"FadeOut", "Uncreate", "Unwrite", "ShrinkToCenter"}
+
+# Animations whose first argument leaves and second argument stays
+REPLACING_TRANSFORMS = {"ReplacementTransform", "TransformMatchingShapes", "TransformMatchingTex", "FadeTransform"}
+
+# Containers whose animations are listed as arguments
+ANIMATION_GROUPS = {"AnimationGroup", "LaggedStart", "Succession"}
+MOBJECT_GROUPS = {"VGroup", "Group"}
+
+# Scene methods a section may call without affecting the sections after it
+SECTION_METHODS = {"play", "wait", "add", "remove", "clear"}
+
+
+def _find_construct(tree: ast.Module, class_name: str):
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and item.name == "construct":
+                    return item
+    return None
+
+
+def _is_self(node) -> bool:
+    return isinstance(node, ast.Name) and node.id == "self"
+
+
+def _is_all_mobjects(node) -> bool:
+    """`*self.mobjects`"""
+    return (
+        isinstance(node, ast.Starred)
+        and isinstance(node.value, ast.Attribute)
+        and _is_self(node.value.value)
+        and node.value.attr == "mobjects"
+    )
+
+
+def _call_name(node):
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return node.func.id
+    return None
+
+
+def _chain(node):
+    """(root name, attribute names, has a call) of an expression like `x.animate.shift(UP)`."""
+    attrs, called = [], False
+    while True:
+        if isinstance(node, ast.Attribute):
+            attrs.append(node.attr)
+            node = node.value
+        elif isinstance(node, ast.Subscript):
+            node = node.value
+        elif isinstance(node, ast.Call):
+            called = True
+            node = node.func
+        else:
+            return (node.id if isinstance(node, ast.Name) else None), attrs, called
+
+
+def _self_calls(tree: ast.AST) -> list:
+    """Calls of anything reached through `self` (self.play, self.camera.frame.set, ...)."""
+    return [
+        node for node in ast.walk(tree)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and _chain(node.func)[0] == "self"
+    ]
+
+
+class _Names(ast.NodeVisitor):
+    """Names a block binds, names it reads before binding them, and outside names it mutates.
+
+    Statements are visited in evaluation order (the value of an assignment
+    before its targets). `self.attr` is tracked as a name of its own;
+    lambda parameters and comprehension variables are ignored.
+    """
+
+    def __init__(self, hidden=()):
+        self.bound, self.free, self.mutated = set(), set(), set()
+        self._hidden = list(hidden)
+
+    @classmethod
+    def of(cls, tree: ast.AST) -> "_Names":
+        names = cls()
+        names.visit(tree)
+        return names
+
+    def _is_hidden(self, name: str) -> bool:
+        return any(name in scope for scope in self._hidden)
+
+    def _load(self, name: str):
+        if name not in self.bound and not self._is_hidden(name):
+            self.free.add(name)
+
+    def _store(self, name: str):
+        if not self._is_hidden(name):
+            self.bound.add(name)
+
+    def _mutate(self, target):
+        root = _chain(target)[0]
+        if root and root != "self" and root not in self.bound and not self._is_hidden(root):
+            self.mutated.add(root)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self._load(node.id)
+        else:
+            self._store(node.id)
+
+    def visit_Attribute(self, node):
+        if _is_self(node.value):
+            key = f"self.{node.attr}"
+            self._load(key) if isinstance(node.ctx, ast.Load) else self._store(key)
+            return
+        if not isinstance(node.ctx, ast.Load):
+            self._mutate(node.value)
+        self.visit(node.value)
+
+    def visit_Subscript(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self._mutate(node.value)
+        self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_AugAssign(self, node):
+        target = node.target
+        if isinstance(target, ast.Name):
+            self._load(target.id)
+        elif isinstance(target, ast.Attribute) and _is_self(target.value):
+            self._load(f"self.{target.attr}")
+        self.visit(node.value)
+        self.visit(target)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_NamedExpr(self, node):
+        self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self.visit(node.target)
+        for stmt in node.body + node.orelse:
+            self.visit(stmt)
+
+    visit_AsyncFor = visit_For
+
+    def visit_ExceptHandler(self, node):
+        if node.type is not None:
+            self.visit(node.type)
+        if node.name:
+            self._store(node.name)
+        for stmt in node.body:
+            self.visit(stmt)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._store(alias.asname or alias.name.split(".")[0])
+
+    visit_ImportFrom = visit_Import
+
+    def visit_Global(self, node):
+        self.mutated.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def _function(self, args: ast.arguments, body: list):
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+        params = {arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs}
+        params.update(arg.arg for arg in (args.vararg, args.kwarg) if arg is not None)
+        inner = _Names(self._hidden + [params])
+        for node in body:
+            inner.visit(node)
+        # Names the function reads from the section are read when it runs
+        for name in inner.free:
+            self._load(name)
+        self.mutated |= inner.mutated
+
+    def visit_Lambda(self, node):
+        self._function(node.args, [node.body])
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._function(node.args, node.body)
+        self._store(node.name)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def _comprehension(self, node, elements):
+        scope = set()
+        self._hidden.append(scope)
+        try:
+            for generator in node.generators:
+                self.visit(generator.iter)
+                scope.update(n.id for n in ast.walk(generator.target) if isinstance(n, ast.Name))
+                for condition in generator.ifs:
+                    self.visit(condition)
+            for element in elements:
+                self.visit(element)
+        finally:
+            self._hidden.pop()
+
+    def visit_ListComp(self, node):
+        self._comprehension(node, [node.elt])
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._comprehension(node, [node.key, node.value])
+
+
+def _mobject_names(node):
+    """Local names of the mobjects an expression refers to, or None if it creates a new one."""
+    if _call_name(node) in MOBJECT_GROUPS:
+        names = set()
+        for arg in node.args:
+            inner = _mobject_names(arg)
+            if inner is None:
+                return None
+            names |= inner
+        return names
+    root, attrs, called = _chain(node)
+    if root is None or root == "self" or (called and "animate" not in attrs):
+        return None
+    return {root}
+
+
+def _play(animation, on_screen: set) -> bool:
+    """Apply one self.play() argument to the set of names on screen; False if unknown."""
+    if isinstance(animation, ast.Starred):
+        # *[FadeOut(m) for m in self.mobjects]
+        value = animation.value
+        if (
+            isinstance(value, (ast.ListComp, ast.GeneratorExp))
+            and len(value.generators) == 1
+            and _is_all_mobjects(ast.Starred(value=value.generators[0].iter))
+            and _call_name(value.elt) in CLEANUP_CALLS
+        ):
+            on_screen.clear()
+            return True
+        return False
+
+    name = _call_name(animation)
+    if name in CLEANUP_CALLS:
+        for target in animation.args:
+            if _is_all_mobjects(target):
+                on_screen.clear()
+                continue
+            names = _mobject_names(target)
+            if names is None:
+                return False
+            on_screen -= names
+        return True
+    if name in ANIMATION_GROUPS:
+        return all(_play(arg, on_screen) for arg in animation.args)
+    if name in REPLACING_TRANSFORMS or name == "TransformFromCopy":
+        if len(animation.args) < 2:
+            return False
+        source, target = _mobject_names(animation.args[0]), _mobject_names(animation.args[1])
+        if source is None or target is None:
+            return False
+        if name != "TransformFromCopy":
+            on_screen -= source
+        on_screen |= target
+        return True
+    if name is not None and not animation.args:
+        return True  # Wait()
+    # Any other animation (or x.animate...) puts its mobject on screen
+    names = _mobject_names(animation.args[0] if name is not None else animation)
+    if names is None:
+        return False
+    on_screen |= names
+    return True
+
+
+def _clears_screen(stmt) -> bool:
+    """self.clear(), self.remove(*self.mobjects) or a self.play() fading out *self.mobjects."""
+    call = stmt.value if isinstance(stmt, ast.Expr) else None
+    if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and _is_self(call.func.value)):
+        return False
+    method = call.func.attr
+    if method == "clear":
+        return True
+    if method == "remove":
+        return any(_is_all_mobjects(arg) for arg in call.args)
+    if method == "play":
+        on_screen = {None}
+        return all(_play(arg, on_screen) for arg in call.args) and None not in on_screen
+    return False
+
+
+def _leaves_screen_empty(block: ast.Module) -> bool:
+    """Follow the section's add/play/remove calls; True if nothing it showed is left at the end."""
+    on_screen, known = set(), True
+    for stmt in block.body:
+        if _clears_screen(stmt):
+            on_screen, known = set(), True
+            continue
+        for call in _self_calls(stmt):
+            method = call.func.attr if _is_self(call.func.value) else None
+            if method == "wait":
+                continue
+            if method not in SECTION_METHODS:
+                return False
+            # Calls inside loops or conditions cannot be followed statically
+            if not (isinstance(stmt, ast.Expr) and stmt.value is call):
+                known = False
+            elif method == "play":
+                known = all(_play(arg, on_screen) for arg in call.args) and known
+            elif method == "add" or method == "remove":
+                for arg in call.args:
+                    names = _mobject_names(arg)
+                    if names is None:
+                        known = False
+                    elif method == "add":
+                        on_screen |= names
+                    else:
+                        on_screen -= names
+    return known and not on_screen
+
+
+def _self_contained(block: ast.Module, names: _Names, shared: set) -> bool:
+    """A section that leaves nothing behind for the sections after it.
+
+    It only uses play/wait/add/remove/clear and its own self attributes (no
+    camera, renderer or helper methods), does not change module-level
+    objects, and removes everything it showed.
+    """
+    allowed = {f"self.{name}" for name in SECTION_METHODS | {"mobjects"}}
+    used = {name for name in names.free | names.bound if name.startswith("self.")}
+    if used - allowed - names.bound or "self" in names.free:
+        return False
+    if names.mutated - shared:
+        return False
+    return _leaves_screen_empty(block)
+
+
+def split_scene_sections(code: str, class_name: str):
+    """Split the construct() of `class_name` at its SCENE markers.
+
+    Returns a list of complete Python sources, one per section, each keeping the
+    module header, any shared setup before the first marker and the section's
+    own statements. Returns None unless the split is provably equivalent to the
+    whole scene: at least two markers, a setup that calls nothing on `self`
+    (it runs once per section), no section reading variables another section
+    creates, no setup object used by two sections, and every section but the
+    last self-contained (see _self_contained).
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    construct = _find_construct(tree, class_name)
+    if construct is None or not construct.body:
+        return None
+
+    lines = code.splitlines(keepends=True)
+
+    # Body starts after the def line, including comments above the first statement
+    body_start = construct.body[0].lineno - 1
+    while body_start > construct.lineno:
+        stripped = lines[body_start - 1].strip()
+        if stripped and not stripped.startswith("#"):
+            break
+        body_start -= 1
+    body_end = construct.end_lineno
+
+    markers = [i for i in range(body_start, body_end) if SECTION_MARKER.match(lines[i])]
+    if len(markers) < 2:
+        return None
+
+    head = lines[:body_start]
+    prelude = lines[body_start:markers[0]]
+    tail = lines[body_end:]
+    bounds = markers + [body_end]
+    chunks = [lines[bounds[i]:bounds[i + 1]] for i in range(len(markers))]
+
+    try:
+        prelude_tree = ast.parse(textwrap.dedent("".join(prelude))) if prelude else ast.Module(body=[], type_ignores=[])
+        chunk_trees = [ast.parse(textwrap.dedent("".join(chunk))) for chunk in chunks]
+    except SyntaxError:
+        return None
+
+    # The setup is repeated in every section: it must not animate or touch the scene
+    if _self_calls(prelude_tree):
+        return None
+    shared = _Names.of(prelude_tree).bound
+    names = [_Names.of(tree) for tree in chunk_trees]
+
+    readers = Counter()
+    for i, tree in enumerate(chunk_trees):
+        if not tree.body:
+            return None
+        others = set().union(*(other.bound for j, other in enumerate(names) if j != i))
+        if names[i].free & others:
+            return None
+        if i < len(chunk_trees) - 1 and not _self_contained(tree, names[i], shared):
+            return None
+        readers.update(names[i].free & shared)
+    # A setup object changed by one section would look different in the next
+    if any(count > 1 for count in readers.values()):
+        return None
+
+    sections = []
+    for chunk in chunks:
+        source = "".join(head + prelude + chunk + tail)
+        try:
+            ast.parse(source)
+        except SyntaxError:
+            return None
+        sections.append(source)
+    return sections
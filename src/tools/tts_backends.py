@@ -0,0 +1,137 @@
+# src/tools/tts_backends.py - Pluggable speech synthesis engines
+
+import os
+import shutil
+import subprocess
+import tempfile
+from abc import ABC, abstractmethod
+
+
+class TTSBackend(ABC):
+    """One speech engine. Implementations write an MP3 file for a piece of text.
+
+    All backends produce MP3 so cached segments from the same engine can be
+    joined with stream copy.
+    """
+
+    name = "base"
+
+    def is_available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def synthesize(self, text: str, language: str, slow: bool, output_path: str):
+        """Write `text` spoken in `language` to the MP3 file `output_path`."""
+
+
+class GTTSBackend(TTSBackend):
+    """Google Text-to-Speech (network round trip per request)."""
+
+    name = "gtts"
+
+    def is_available(self) -> bool:
+        try:
+            import gtts  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def synthesize(self, text: str, language: str, slow: bool, output_path: str):
+        from gtts import gTTS
+        gTTS(text=text, lang=language, slow=slow).save(output_path)
+
+
+class EspeakBackend(TTSBackend):
+    """Offline espeak-ng engine: predictable latency, no network needed.
+
+    espeak-ng writes WAV; ffmpeg encodes it to MP3 to match the other backends.
+    """
+
+    name = "espeak"
+
+    # espeak-ng voice names for the languages TextToSpeechTool accepts
+    VOICES = {"zh-CN": "cmn", "zh-TW": "cmn"}
+    WORDS_PER_MINUTE = {False: 165, True: 120}
+
+    def _binary(self):
+        return shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def is_available(self) -> bool:
+        return bool(self._binary() and shutil.which("ffmpeg"))
+
+    def synthesize(self, text: str, language: str, slow: bool, output_path: str):
+        binary = self._binary()
+        if not binary:
+            raise FileNotFoundError("espeak-ng is not installed / Chua cai dat espeak-ng")
+
+        fd, wav_path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            subprocess.run(
+                [
+                    binary, "-v", self.VOICES.get(language, language),
+                    "-s", str(self.WORDS_PER_MINUTE[bool(slow)]),
+                    "-w", wav_path, text,
+                ],
+                capture_output=True, check=True
+            )
+            subprocess.run(
+                [
+                    "ffmpeg", "-y", "-i", wav_path,
+                    "-ar", "24000", "-ac", "1",
+                    "-codec:a", "libmp3lame", "-q:a", "4",
+                    "-f", "mp3", output_path,
+                ],
+                capture_output=True, check=True
+            )
+        finally:
+            if os.path.exists(wav_path):
+                os.remove(wav_path)
+
+
+class SilenceBackend(TTSBackend):
+    """Silence as long as the text takes to read: offline and deterministic.
+
+    For benchmarks and tests of everything around speech (timing, merge).
+    """
+
+    name = "silent"
+
+    WORDS_PER_MINUTE = {False: 150, True: 110}
+    MIN_SECONDS = 0.5
+
+    def is_available(self) -> bool:
+        return bool(shutil.which("ffmpeg"))
+
+    def synthesize(self, text: str, language: str, slow: bool, output_path: str):
+        seconds = max(self.MIN_SECONDS, len(text.split()) * 60.0 / self.WORDS_PER_MINUTE[bool(slow)])
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-f", "lavfi", "-i", "anullsrc=r=24000:cl=mono",
+                "-t", f"{seconds:.3f}",
+                "-codec:a", "libmp3lame", "-q:a", "4",
+                "-f", "mp3", output_path,
+            ],
+            capture_output=True, check=True
+        )
+
+
+BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    EspeakBackend.name: EspeakBackend,
+    SilenceBackend.name: SilenceBackend,
+}
+
+_instances = {}
+
+
+def get_backend(name: str = None) -> TTSBackend:
+    """Backend by name, defaulting to the TTS_BACKEND environment variable (or gtts)."""
+    name = (name or os.environ.get("TTS_BACKEND", GTTSBackend.name)).lower()
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown TTS backend '{name}' (available: {', '.join(BACKENDS)}) / Khong co backend TTS nay"
+        )
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
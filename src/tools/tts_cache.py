@@ -0,0 +1,100 @@
+# src/tools/tts_cache.py - Sentence-level cache of synthesized speech segments
+
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from .render_cache import prune_cache_dir
+
+DEFAULT_CACHE_DIR = os.path.join("workspace", ".tts_cache")
+
+# Caps of the cache directory; the least recently used segments go first.
+# Segments are written one sentence at a time, so pruning runs at most once
+# per PRUNE_INTERVAL seconds instead of after every write.
+DEFAULT_MAX_MB = 512
+DEFAULT_MAX_AGE_DAYS = 90
+PRUNE_INTERVAL = 60.0
+
+# Sentence ends: . ! ? … followed by whitespace, or a line break
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\s*\n+\s*")
+
+
+def normalize_sentence(sentence: str) -> str:
+    """Unicode NFC + collapsed whitespace, so equal sentences share a key."""
+    return " ".join(unicodedata.normalize("NFC", sentence).split())
+
+
+def split_sentences(text: str) -> list:
+    """Split a voiceover script into normalized, non-empty sentences."""
+    sentences = (normalize_sentence(part) for part in _SENTENCE_BOUNDARY.split(text))
+    return [sentence for sentence in sentences if sentence]
+
+
+class TTSSegmentCache:
+    """Persistent MP3 segments keyed on (engine, normalized sentence, language, slow).
+
+    Stock intros, outros and phrases repeated across topics are synthesized
+    once and then reused by every job. Hits refresh a segment's mtime; new
+    segments trigger pruning to `max_bytes` and `max_age` seconds.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None, max_age: float = None):
+        self.cache_dir = cache_dir or os.environ.get("TTS_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.environ.get("TTS_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 2 ** 20)
+        self.max_age = max_age if max_age is not None else (
+            float(os.environ.get("TTS_CACHE_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS)) * 86400)
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def make_key(self, sentence: str, language: str, slow: bool = False, engine: str = "gtts") -> str:
+        payload = "\x00".join([engine, normalize_sentence(sentence), language, "slow" if slow else "normal"])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def get(self, key: str):
+        path = self.path_for(key)
+        try:
+            # Recently used segments survive pruning
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def prune(self, force: bool = False) -> int:
+        """Apply the size and age caps. Returns the number of segments removed."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_prune < PRUNE_INTERVAL:
+                return 0
+            self._last_prune = now
+            return prune_cache_dir(self.cache_dir, self.max_bytes, self.max_age)
+
+    def synthesize(self, sentence: str, language: str, slow: bool, backend):
+        """Return (segment_path, cached). A miss is written by backend.synthesize()."""
+        key = self.make_key(sentence, language, slow, backend.name)
+        cached = self.get(key)
+        if cached:
+            return cached, True
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        backend.synthesize(sentence, language, slow, tmp_path)
+        os.replace(tmp_path, path)
+        self.prune()
+        return path, False
+
+
+def assemble_segments(segment_paths: list, output_path: str) -> str:
+    """Join MP3 segments by appending their frames, like gTTS does for long text."""
+    with open(output_path, "wb") as out:
+        for path in segment_paths:
+            with open(path, "rb") as segment:
+                out.write(segment.read())
+    return output_path
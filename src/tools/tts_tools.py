@@ -1,45 +1,106 @@
 import os
-from mutagen.mp3 import MP3
-from gtts import gTTS
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from langchain.tools import BaseTool 
+from .workspace import get_workspace_dir
+from .media import concat_media, get_duration
+from .audio import encode_segments, loudness_cache
+from .tts_backends import get_backend
+from .tts_cache import TTSSegmentCache, assemble_segments, split_sentences
+
+# Shared sentence cache / Bo nho dem cau dung chung
+tts_cache = TTSSegmentCache()
+
+# Concurrent TTS requests in chunked mode / So yeu cau TTS dong thoi
+TTS_MAX_WORKERS = int(os.environ.get("TTS_MAX_WORKERS", 4))
+
+VIETNAMESE_CHARS = 'àáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬÈÉẺẼẸÊỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢÙÚỦŨỤƯỪỨỬỮỰỲÝỶỸỴĐ'
+
+
+def detect_language(text: str) -> str:
+    """Auto-detect language based on characters. / Tu dong phat hien ngon ngu."""
+    return 'vi' if any(char in VIETNAMESE_CHARS for char in text) else 'en'
+
+
+def synthesize_segments(text: str, language: str, slow: bool,
+                        max_workers: int = 1, backend: str = None) -> list:
+    """Synthesize text sentence by sentence through the cache.
+
+    `backend` names a TTS engine (see tts_backends.py; default TTS_BACKEND or gtts).
+    With max_workers > 1 the missing sentences are synthesized concurrently,
+    so wall-clock follows the slowest sentence rather than the whole script.
+    Returns [(segment_path, cached), ...] in script order.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        raise ValueError("No text to synthesize / Khong co noi dung de doc")
+    engine = get_backend(backend)
+
+    def synthesize(sentence):
+        return tts_cache.synthesize(sentence, language, slow, engine)
+
+    if max_workers > 1 and len(sentences) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(sentences))) as pool:
+            return list(pool.map(synthesize, sentences))
+    return [synthesize(sentence) for sentence in sentences]
+
+
+def synthesize_cached(text: str, language: str, slow: bool, output_path: str,
+                      max_workers: int = 1, backend: str = None):
+    """Synthesize text into output_path, joining the cached sentence segments.
+
+    Segments are joined with the ffmpeg concat demuxer (stream copy), so the
+    audio is not re-encoded here; loudness and tempo are applied at the merge.
+    Returns (segment_count, cached_count).
+    """
+    segments = synthesize_segments(text, language, slow, max_workers, backend)
+    join_segments([path for path, _ in segments], output_path)
+    return len(segments), sum(1 for _, cached in segments if cached)
+
+
+def join_segments(segment_paths: list, output_path: str) -> str:
+    """Join cached MP3 segments into output_path without re-encoding."""
+    if len(segment_paths) == 1:
+        shutil.copyfile(segment_paths[0], output_path)
+    else:
+        try:
+            concat_media(segment_paths, output_path)
+        except (OSError, subprocess.CalledProcessError):
+            # No usable ffmpeg: MP3 frames can still be appended directly
+            assemble_segments(segment_paths, output_path)
+    return output_path
+
 
 class TextToSpeechTool(BaseTool):
     """Enhanced TTS tool with multiple features. Supports English and Vietnamese."""
     
     name: str = "Text to Speech Tool"
     description: str = (
-        "Converts text into an MP3 audio file using Google Text-to-Speech. "
+        "Converts text into an MP3 audio file using Google Text-to-Speech or an offline engine. "
         "Supports both English and Vietnamese. "
         "Arguments: text (str) - text to convert, file_name (str, default='voiceover.mp3'), "
         "language (str, default='auto') - 'en', 'vi', or 'auto' for auto-detection, "
-        "slow (bool, default=False) - slower speech speed. "
+        "slow (bool, default=False) - slower speech speed, "
+        "chunked (bool, default=False) - synthesize sentences in parallel (faster for long scripts), "
+        "backend (str, optional) - 'gtts' (Google, default) or 'espeak' (offline). "
         "Returns the file path and audio duration in seconds."
     )
 
     def _detect_language(self, text: str) -> str:
         """Auto-detect language based on characters. / Tu dong phat hien ngon ngu."""
-        vietnamese_chars = 'àáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬÈÉẺẼẸÊỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢÙÚỦŨỤƯỪỨỬỮỰỲÝỶỸỴĐ'
-        for char in text:
-            if char in vietnamese_chars:
-                return 'vi'
-        return 'en'
-
-    def _get_audio_duration(self, file_path: str) -> float:
-        """Get MP3 file duration using mutagen."""
-        try:
-            audio = MP3(file_path)
-            return audio.info.length
-        except Exception:
-            return 0.0
+        return detect_language(text)
 
     def _run(
         self, 
         text: str, 
         file_name: str = "voiceover.mp3",
         language: str = "auto",
-        slow: bool = False
+        slow: bool = False,
+        chunked: bool = False,
+        backend: str = None
     ) -> str:
-        workspace_dir = "workspace"
+        workspace_dir = get_workspace_dir()
         file_path = os.path.join(workspace_dir, file_name)
         
         try:
@@ -54,19 +115,26 @@ class TextToSpeechTool(BaseTool):
             if language not in supported_langs:
                 language = 'en'
             
-            # Create audio with gTTS
-            tts = gTTS(text=text, lang=language, slow=slow)
-            tts.save(file_path)
+            # Create audio, reusing cached sentences
+            segment_count, cached_count = synthesize_cached(
+                text, language, slow, file_path,
+                max_workers=TTS_MAX_WORKERS if chunked else 1, backend=backend
+            )
+            
+            # Take the loudness measurement now, while the video is still being
+            # developed, so the merge only runs the encoding pass
+            loudness_cache.measure(file_path)
             
             # Get duration
-            duration = self._get_audio_duration(file_path)
+            duration = get_duration(file_path)
             duration_str = f"{duration:.2f}s" if duration > 0 else "unknown"
             
             return (
                 f"[OK] Audio file saved successfully! / Audio da duoc luu thanh cong!\n"
                 f"Path: {file_path}\n"
                 f"Language / Ngon ngu: {language}\n"
-                f"Duration / Thoi luong: {duration_str}"
+                f"Duration / Thoi luong: {duration_str}\n"
+                f"Sentences / So cau: {segment_count} ({cached_count} cached)"
             )
             
         except Exception as e:
@@ -85,18 +153,7 @@ class EnhancedTTSTool(BaseTool):
     )
 
     def _detect_language(self, text: str) -> str:
-        vietnamese_chars = 'àáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđÀÁẢÃẠĂẰẮẲẴẶÂẦẤẨẪẬÈÉẺẼẸÊỀẾỂỄỆÌÍỈĨỊÒÓỎÕỌÔỒỐỔỖỘƠỜỚỞỠỢÙÚỦŨỤƯỪỨỬỮỰỲÝỶỸỴĐ'
-        for char in text:
-            if char in vietnamese_chars:
-                return 'vi'
-        return 'en'
-
-    def _get_audio_duration(self, file_path: str) -> float:
-        try:
-            audio = MP3(file_path)
-            return audio.info.length
-        except Exception:
-            return 0.0
+        return detect_language(text)
 
     def _run(
         self, 
@@ -105,10 +162,7 @@ class EnhancedTTSTool(BaseTool):
         language: str = "auto",
         speed: float = 1.0
     ) -> str:
-        import subprocess
-        
-        workspace_dir = "workspace"
-        temp_file = os.path.join(workspace_dir, "temp_audio.mp3")
+        workspace_dir = get_workspace_dir()
         final_file = os.path.join(workspace_dir, file_name)
         
         try:
@@ -118,34 +172,18 @@ class EnhancedTTSTool(BaseTool):
             if language == "auto":
                 language = self._detect_language(text)
             
-            # Create initial audio
-            tts = gTTS(text=text, lang=language, slow=False)
-            
             # If no speed adjustment needed
             if abs(speed - 1.0) < 0.01:
-                tts.save(final_file)
+                synthesize_cached(text, language, False, final_file)
             else:
-                # Save temp file and adjust speed with ffmpeg
-                tts.save(temp_file)
-                
                 # Limit speed to reasonable range
                 speed = max(0.5, min(2.0, speed))
                 
-                # Use atempo filter (only supports 0.5-2.0)
-                command = [
-                    "ffmpeg", "-y",
-                    "-i", temp_file,
-                    "-filter:a", f"atempo={speed}",
-                    final_file
-                ]
-                
-                subprocess.run(command, capture_output=True, check=True)
-                
-                # Delete temp file
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
+                # Stream the cached sentences through ffmpeg's stdin: one encode, no temp file
+                segments = synthesize_segments(text, language, False)
+                encode_segments([path for path, _ in segments], final_file, tempo=speed)
             
-            duration = self._get_audio_duration(final_file)
+            duration = get_duration(final_file)
             duration_str = f"{duration:.2f}s" if duration > 0 else "unknown"
             
             return (
@@ -157,7 +195,4 @@ class EnhancedTTSTool(BaseTool):
             )
             
         except Exception as e:
-            # Cleanup temp file on error
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
             return f"[ERROR] Error generating audio file / Loi tao audio: {e}"
\ No newline at end of file
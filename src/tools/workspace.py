@@ -0,0 +1,31 @@
+# src/tools/workspace.py - Per-job working directory shared by all tools
+
+import contextvars
+import os
+from contextlib import contextmanager
+
+DEFAULT_WORKSPACE_DIR = "workspace"
+
+# Context-local so concurrent jobs (one thread each) never see each other's files
+_workspace_dir = contextvars.ContextVar("workspace_dir", default=DEFAULT_WORKSPACE_DIR)
+
+
+def get_workspace_dir() -> str:
+    """Working directory of the current job. / Thu muc lam viec cua job hien tai."""
+    return _workspace_dir.get()
+
+
+def workspace_path(*parts: str) -> str:
+    """Join a file name onto the current job's working directory."""
+    return os.path.join(get_workspace_dir(), *parts)
+
+
+@contextmanager
+def use_workspace(path: str):
+    """Run the enclosed block with `path` as the working directory of every tool."""
+    os.makedirs(path, exist_ok=True)
+    token = _workspace_dir.set(path)
+    try:
+        yield path
+    finally:
+        _workspace_dir.reset(token)
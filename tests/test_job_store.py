@@ -0,0 +1,114 @@
+# tests/test_job_store.py - Job records, status transitions and eviction
+
+import time
+
+import pytest
+
+from api.job_store import JobStore, MemoryJobStore, SQLiteJobStore, create_job_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore(ttl_seconds=60)
+    return SQLiteJobStore(str(tmp_path / "jobs.db"), ttl_seconds=60)
+
+
+def test_updates_merge_fields_and_bump_the_version(store):
+    created = store.create({"id": "a", "status": "queued", "created_ts": time.time(), "topic": "x"})
+    assert created["version"] == 1
+    updated = store.update("a", phase="script", progress=10)
+    assert updated["version"] == 2
+    assert store.get("a") == updated
+    assert updated["topic"] == "x" and updated["phase"] == "script"
+    assert store.update("missing", phase="x") is None
+    assert store.get("missing") is None
+
+
+def test_transition_only_from_the_expected_status(store):
+    store.create({"id": "a", "status": "queued", "created_ts": time.time()})
+    assert store.transition("a", ("queued",), "running", started_ts=1.0)
+    assert not store.transition("a", ("queued",), "running")
+    assert store.transition("a", ("running",), "completed", progress=100)
+    job = store.get("a")
+    assert (job["status"], job["started_ts"], job["progress"]) == ("completed", 1.0, 100)
+    assert not store.transition("missing", ("queued",), "running")
+
+
+def test_only_finished_jobs_past_the_ttl_are_evicted(store):
+    for job_id, status in (("done", "completed"), ("failed", "error"), ("busy", "running")):
+        store.create({"id": job_id, "status": status, "created_ts": time.time()})
+    assert store.evict_expired() == []
+    assert sorted(store.evict_expired(now=time.time() + 120)) == ["done", "failed"]
+    assert store.get("done") is None and store.get("busy") is not None
+
+
+def test_delete(store):
+    store.create({"id": "a", "status": "queued", "created_ts": time.time()})
+    store.delete("a")
+    assert store.get("a") is None
+
+
+def test_interrupted_jobs_fail_after_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first = SQLiteJobStore(path)
+    first.create({"id": "queued", "status": "queued", "created_ts": time.time()})
+    first.create({"id": "done", "status": "completed", "created_ts": time.time()})
+    second = SQLiteJobStore(path)
+    assert second.recover_interrupted() == 1
+    assert second.get("queued")["status"] == "error"
+    assert second.get("done")["status"] == "completed"
+
+
+def test_wait_for_change_returns_on_update_or_timeout(store):
+    import threading
+
+    store.create({"id": "a", "status": "running", "created_ts": time.time()})
+    threading.Timer(0.05, store.update, ("a",), {"progress": 50}).start()
+    job = store.wait_for_change("a", 1, timeout=5)
+    assert job["version"] == 2 and job["progress"] == 50
+
+    started = time.monotonic()
+    assert store.wait_for_change("a", 2, timeout=0.1)["version"] == 2
+    assert time.monotonic() - started >= 0.1
+    assert store.wait_for_change("missing", None, timeout=5) is None
+
+
+def test_incomplete_store_cannot_be_built():
+    class Partial(JobStore):
+        def get(self, job_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_create_job_store_kinds(tmp_path):
+    assert isinstance(create_job_store("memory"), MemoryJobStore)
+    store = create_job_store("sqlite", path=str(tmp_path / "jobs.db"), ttl_seconds=5)
+    assert isinstance(store, SQLiteJobStore) and store.ttl_seconds == 5
+
+
+def test_updates_only_wake_waiters_of_that_job(store):
+    import threading
+
+    store.create({"id": "a", "status": "running", "created_ts": time.time()})
+    store.create({"id": "b", "status": "running", "created_ts": time.time()})
+    woken = []
+    original_get = store.get
+
+    def counting_get(job_id):
+        woken.append(job_id)
+        return original_get(job_id)
+
+    store.get = counting_get
+    waiter = threading.Thread(target=store.wait_for_change, args=("a", 1, 0.5))
+    waiter.start()
+    time.sleep(0.05)
+    for i in range(20):
+        store.update("b", progress=i)
+    waiter.join()
+    # One check on entry and one when the timeout expires; the writes to
+    # "b" never wake it.
+    assert woken.count("a") <= 2
+    assert store._signals == {}
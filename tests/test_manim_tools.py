@@ -0,0 +1,146 @@
+# tests/test_manim_tools.py - Manim tool helpers that run without manim itself
+
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from src.tools import manim_tools
+from src.tools.manim_tools import ManimExecutionTool
+
+
+def test_sections_hold_one_cpu_slot_each(tmp_path, monkeypatch):
+    slots = threading.BoundedSemaphore(2)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    class Slot:
+        def __enter__(self):
+            slots.acquire()
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+
+        def __exit__(self, *exc):
+            with lock:
+                active[0] -= 1
+            slots.release()
+
+    def render_file(self, code, class_name, quality_info, fps, work_dir, file_name, use_cache):
+        time.sleep(0.05)
+        return f"{work_dir}/{file_name}.mp4", 1.0, False
+
+    monkeypatch.setattr(ManimExecutionTool, "_render_file", render_file)
+    monkeypatch.setattr(manim_tools, "concat_media", lambda paths, output: output)
+    monkeypatch.setattr(manim_tools, "get_duration", lambda path: 5.0)
+    monkeypatch.setattr(manim_tools.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(manim_tools, "workspace_path", lambda name: str(tmp_path / name))
+
+    output, duration, cached = ManimExecutionTool()._render_sections(
+        ["code"] * 5, "Demo", {"flag": "-qh"}, 30, str(tmp_path / "out.mp4"), cpu_slot=Slot
+    )
+    assert (output, duration, cached) == (str(tmp_path / "out.mp4"), 5.0, 0)
+    assert peak[0] == 2
+
+
+def test_scene_classes_are_found_through_local_bases():
+    code = (
+        "from manim import *\n"
+        "class Base(MovingCameraScene):\n    pass\n"
+        "class Helper:\n    pass\n"
+        "class Main(Base, Helper):\n    def construct(self):\n        pass\n"
+        "class Other(manim.ThreeDScene):\n    pass\n"
+    )
+    assert manim_tools.find_scene_classes(code) == ["Base", "Main", "Other"]
+    assert manim_tools.find_scene_classes("class (") == []
+
+
+def test_preflight_accepts_3d_and_camera_scenes():
+    code = (
+        "from manim import *\n"
+        "class Base(ThreeDScene):\n    pass\n"
+        "class Demo(Base):\n"
+        "    def construct(self):\n"
+        "        self.set_camera_orientation(phi=75 * DEGREES, theta=30 * DEGREES)\n"
+        "        self.begin_ambient_camera_rotation(rate=0.2)\n"
+        "        self.add_fixed_in_frame_mobjects(Text('3D'))\n"
+        "        self.play(self.camera.frame.animate.scale(0.5))\n"
+        "        self.stop_ambient_camera_rotation()\n"
+    )
+    assert manim_tools.preflight_check(code, "Demo") is None
+
+
+def test_preflight_reports_unknown_scene_methods_and_banned_calls():
+    code = (
+        "from manim import *\n"
+        "class Demo(Scene):\n"
+        "    def construct(self):\n"
+        "        self.play_sound('x')\n"
+        "        self.play(Create(axes.get_tangent_line(1)))\n"
+    )
+    error_type, _, details = manim_tools.preflight_check(code, "Demo")
+    assert error_type.startswith("HANDBOOK VIOLATION")
+    assert "line 4: self.play_sound()" in details
+    assert "line 5: get_tangent_line()" in details
+
+
+def test_preflight_reports_syntax_errors_and_missing_classes():
+    assert manim_tools.preflight_check("def f(:\n", "Demo")[0].startswith("SYNTAX ERROR")
+    assert manim_tools.preflight_check("class Demo:\n    pass\n", "Demo")[0].startswith("CLASS NOT FOUND")
+
+
+@pytest.mark.parametrize("strategy, merge_path", [("auto", "video-retime"), ("audio", None)])
+def test_merge_only_auto_falls_back_to_retiming_the_video(tmp_path, monkeypatch, strategy, merge_path):
+    from src.tools.manim_tools import FFmpegTool
+    from src.tools.media import MediaInfo
+
+    (tmp_path / "video.mp4").write_bytes(b"v")
+    (tmp_path / "audio.mp3").write_bytes(b"a")
+    durations = {"video.mp4": 10.0, "audio.mp3": 20.0}  # tempo 2.0x, past atempo's range
+    monkeypatch.setattr(manim_tools, "workspace_path", lambda name: str(tmp_path / name))
+    monkeypatch.setattr(manim_tools, "probe_many", lambda paths: {
+        path: MediaInfo(path, duration=durations[os.path.basename(path)]) for path in paths
+    })
+    commands = []
+    monkeypatch.setattr(manim_tools.subprocess, "run", lambda command, **kwargs: commands.append(command))
+
+    result = FFmpegTool()._run("video.mp4", "audio.mp3", "out.mp4", normalize_audio=False, strategy=strategy)
+    if merge_path:
+        assert result.startswith("[OK]") and f"Merge path / Cach ghep: {merge_path}" in result
+        assert "libx264" in commands[0]
+    else:
+        assert result.startswith("[ERROR]") and "outside the supported range" in result
+        assert commands == []
+
+
+def test_cache_hit_pruned_before_the_copy_renders_again(tmp_path, monkeypatch):
+    work_dir = tmp_path / "work"
+    monkeypatch.setattr(manim_tools.render_cache, "get", lambda key: (str(tmp_path / "pruned.mp4"), 3.0))
+    commands = []
+
+    def run(command, cwd=None, **kwargs):
+        commands.append(command)
+        output = work_dir / "videos" / "demo" / "1080p30" / "demo.mp4"
+        output.parent.mkdir(parents=True)
+        output.write_bytes(b"video")
+
+    monkeypatch.setattr(manim_tools.subprocess, "run", run)
+    monkeypatch.setattr(manim_tools.render_cache, "put", lambda *args, **kwargs: None)
+    monkeypatch.setattr(manim_tools, "get_duration", lambda path: 4.0)
+
+    path, duration, cached = ManimExecutionTool()._render_file(
+        "code", "Demo", {"flag": "-qh"}, 30, str(work_dir), "demo"
+    )
+    assert (path, duration, cached) == (str(work_dir / "demo.mp4"), 4.0, False)
+    assert commands and commands[0][0] == "manim"
+
+
+def test_merge_rejects_unknown_strategies(tmp_path, monkeypatch):
+    from src.tools.manim_tools import FFmpegTool
+
+    monkeypatch.setattr(manim_tools.subprocess, "run", lambda *args, **kwargs: pytest.fail("ffmpeg ran"))
+    result = FFmpegTool()._run("video.mp4", "audio.mp3", strategy="fast")
+    assert result.startswith("[ERROR] Unknown strategy 'fast'")
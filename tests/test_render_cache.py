@@ -0,0 +1,77 @@
+# tests/test_render_cache.py - Render cache keys, storage and pruning
+
+import os
+import time
+
+from src.tools.render_cache import RenderCache, normalize_code, prune_cache_dir
+
+CODE = """from manim import *
+
+class Demo(Scene):
+    def construct(self):
+        self.play(Create(Circle()))
+"""
+
+
+def make_cache(tmp_path, **kwargs):
+    cache = RenderCache(str(tmp_path / "cache"), **kwargs)
+    cache._manim_version = "0.18.0"
+    return cache
+
+
+def test_formatting_changes_share_a_key(tmp_path):
+    cache = make_cache(tmp_path)
+    reformatted = CODE.replace("self.play(Create(Circle()))", "self.play( Create(Circle()) )  # draw") + "\n\n"
+    assert normalize_code(CODE) == normalize_code(reformatted)
+    assert cache.make_key(CODE, "Demo", "-ql", 15) == cache.make_key(reformatted, "Demo", "-ql", 15)
+
+
+def test_settings_and_code_change_the_key(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key(CODE, "Demo", "-ql", 15)
+    assert key != cache.make_key(CODE, "Other", "-ql", 15)
+    assert key != cache.make_key(CODE, "Demo", "-qh", 15)
+    assert key != cache.make_key(CODE, "Demo", "-ql", 30)
+    assert key != cache.make_key(CODE.replace("Circle", "Square"), "Demo", "-ql", 15)
+    cache._manim_version = "0.19.0"
+    assert key != cache.make_key(CODE, "Demo", "-ql", 15)
+
+
+def test_put_then_get(tmp_path):
+    cache = make_cache(tmp_path)
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"mp4")
+    key = cache.make_key(CODE, "Demo", "-ql", 15)
+    assert cache.get(key) is None
+    cache.put(key, str(video), 2.5, class_name="Demo")
+    cached_video, duration = cache.get(key)
+    assert duration == 2.5
+    with open(cached_video, "rb") as f:
+        assert f.read() == b"mp4"
+
+
+def test_put_keeps_the_cache_under_its_size_cap(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=2500, max_age=3600)
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"x" * 1000)
+    keys = [cache.make_key(CODE, f"Scene{i}", "-ql", 15) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, str(video), 1.0)
+        old = time.time() - 100 + i
+        for path in cache._paths(key):
+            os.utime(path, (old, old))
+    # The third put pushed the total over 2500 bytes: the oldest entry went first
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[1]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+def test_prune_drops_expired_entries_and_ignores_temp_files(tmp_path):
+    for name in ("old.mp4", "old.json", "new.mp4", "new.json", "busy.mp4.123.tmp"):
+        (tmp_path / name).write_bytes(b"x")
+    stale = time.time() - 7200
+    for name in ("old.mp4", "old.json", "busy.mp4.123.tmp"):
+        os.utime(tmp_path / name, (stale, stale))
+
+    assert prune_cache_dir(str(tmp_path), max_bytes=10 ** 6, max_age=3600) == 1
+    assert sorted(os.listdir(tmp_path)) == ["busy.mp4.123.tmp", "new.json", "new.mp4"]
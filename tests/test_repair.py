@@ -0,0 +1,89 @@
+# tests/test_repair.py - Parsing and applying SEARCH/REPLACE patches from the model
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from src.llm_usage import message_text
+from src.repair import PatchError, apply_patch, parse_patch
+
+CODE = """from manim import *
+
+
+class Demo(Scene):
+    def construct(self):
+        title = Text("One")
+        self.play(Write(title))
+        self.wait(1)
+        self.play(FadeOut(title))
+        self.wait(1)
+"""
+
+
+def block(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n"
+
+
+def test_blocks_are_parsed_in_order():
+    answer = (
+        "Fix:\n```\n"
+        + block('        title = Text("One")\n', '        title = Tex("One")\n')
+        + block("        self.wait(1)\n        self.play(FadeOut(title))\n", "        self.wait(2)\n")
+        + "```\n"
+    )
+    assert parse_patch(answer.replace("\n", "\r\n")) == [
+        ('        title = Text("One")\n', '        title = Tex("One")\n'),
+        ("        self.wait(1)\n        self.play(FadeOut(title))\n", "        self.wait(2)\n"),
+    ]
+
+
+@pytest.mark.parametrize("answer", [
+    "",
+    None,
+    "Here is the fixed code:\n```python\nprint(1)\n```",
+    "<<<<<<< SEARCH\nold\n>>>>>>> REPLACE\n",          # no separator
+    "<<<<<<< SEARCH\nold\n=======\nnew\n",              # no closing marker
+])
+def test_malformed_answers_are_rejected(answer):
+    with pytest.raises(PatchError):
+        parse_patch(answer)
+
+
+def test_unique_match_is_replaced():
+    patched = apply_patch(CODE, [('Text("One")', 'Tex("One")')])
+    assert 'Tex("One")' in patched and 'Text("One")' not in patched
+    assert patched.count("\n") == CODE.count("\n")
+
+
+def test_search_differing_in_trailing_spaces_matches_line_by_line():
+    search = '        title = Text("One")  \n        self.play(Write(title))'
+    patched = apply_patch(CODE, [(search, "        self.play(FadeIn(Text(\"One\")))")])
+    assert '    def construct(self):\n        self.play(FadeIn(Text("One")))\n        self.wait(1)\n' in patched
+
+
+def test_missing_and_ambiguous_matches_are_rejected():
+    with pytest.raises(PatchError, match="matches 0 places"):
+        apply_patch(CODE, [("self.play(Create(title))", "")])
+    with pytest.raises(PatchError, match="matches 2 places"):
+        apply_patch(CODE, [("        self.wait(1)\n", "        self.wait(2)\n")])
+    with pytest.raises(PatchError, match="Empty SEARCH"):
+        apply_patch(CODE, [("  \n", "x")])
+
+
+def test_blocks_apply_to_the_result_of_the_previous_one():
+    patched = apply_patch(CODE, [
+        ('Text("One")', 'Text("Two")'),
+        ('title = Text("Two")', 'title = Text("Three")'),
+    ])
+    assert 'Text("Three")' in patched
+    with pytest.raises(PatchError):
+        apply_patch(CODE, [('Text("One")', 'Text("Two")'), ('Text("One")', 'Text("Three")')])
+
+
+def test_message_text_joins_content_parts():
+    class Message:
+        content = ["<<<<<<< SEARCH\n", {"type": "text", "text": "x\n"}, {"type": "image"}]
+
+    assert message_text(Message()) == "<<<<<<< SEARCH\nx\n"
+    assert message_text("plain") == "plain"
+    assert message_text(None) == ""
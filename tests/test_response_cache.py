@@ -0,0 +1,59 @@
+# tests/test_response_cache.py - Topic matching and lookups of the response cache
+
+import pytest
+
+from src.response_cache import ResponseCache, normalize_topic, topic_similarity
+
+
+def similarity(a, b):
+    return topic_similarity(normalize_topic(a), normalize_topic(b))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("derivative of sin(x)", "derivative of cos(x)"),
+    ("integral of x^2", "integral of x^3"),
+    ("Định lý Pythagore", "Định lý Fermat"),
+])
+def test_different_topics_are_not_the_same(a, b):
+    assert similarity(a, b) < 1.0
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Derivative of sin(x)", "derivative  of SIN x"),
+    ("Đạo hàm của sin(x)", "dao ham sin x"),
+    ("the Pythagorean theorem", "Pythagorean Theorem!"),
+    ("sin x derivative", "derivative of sin x"),
+])
+def test_wording_changes_are_the_same_topic(a, b):
+    assert similarity(a, b) == 1.0
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "responses.db"), ttl_seconds=3600, max_entries=10)
+
+
+def test_lookup_matches_only_the_same_content_words(cache):
+    cache.store("model", "prompt", "Integral of x^2", script="script", code="code")
+    assert cache.lookup("model", "prompt", "integral of x^2")["match"] == "exact"
+    assert cache.lookup("model", "prompt", "the integral x^2")["match"] == "near"
+    assert cache.lookup("model", "prompt", "integral of x^3") is None
+    assert cache.lookup("other", "prompt", "integral of x^2") is None
+
+
+def test_lower_threshold_allows_partial_overlap(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"), similarity=0.3)
+    cache.store("model", "prompt", "integral of x^2", script="script")
+    assert cache.lookup("model", "prompt", "integral of x^3")["topic"] == "integral of x^2"
+
+
+def test_a_new_script_drops_code_written_for_the_old_one(cache):
+    cache.store("model", "prompt", "topic", script="S1")
+    cache.store("model", "prompt", "topic", code="C1")
+    assert cache.lookup("model", "prompt", "topic")["code"] == "C1"
+    cache.store("model", "prompt", "topic", script="S2")
+    entry = cache.lookup("model", "prompt", "topic")
+    assert (entry["script"], entry["code"]) == ("S2", None)
+    cache.store("model", "prompt", "topic", script="S2", code="C2")
+    entry = cache.lookup("model", "prompt", "topic")
+    assert (entry["script"], entry["code"]) == ("S2", "C2")
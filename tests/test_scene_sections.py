@@ -0,0 +1,126 @@
+# tests/test_scene_sections.py - When a scene may be rendered as independent sections
+
+import textwrap
+
+from src.tools.scene_sections import split_scene_sections
+
+
+def scene(body: str) -> str:
+    return "from manim import *\n\n\nclass Demo(Scene):\n    def construct(self):\n" + textwrap.indent(
+        textwrap.dedent(body), " " * 8
+    )
+
+
+INDEPENDENT = """
+# === SCENE 1 ===
+title = Text("One")
+axes = Axes()
+self.play(Write(title), Create(axes))
+self.play(Transform(title, Text("Uno")))
+self.wait(1)
+self.play(FadeOut(VGroup(title, axes)))
+
+# === SCENE 2 ===
+title = Text("Two")
+self.play(FadeIn(title))
+self.wait(1)
+"""
+
+
+def test_independent_sections_are_split():
+    sections = split_scene_sections(scene(INDEPENDENT), "Demo")
+    assert len(sections) == 2
+    assert 'Text("One")' in sections[0] and 'Text("Two")' not in sections[0]
+    assert 'Text("Two")' in sections[1] and 'Text("One")' not in sections[1]
+    assert all(section.startswith("from manim import *") for section in sections)
+
+
+def test_handbook_example_is_split_per_scene():
+    from src.agents import handbook_sections
+
+    example = next(body for _, body in handbook_sections() if "class DerivativeVideo" in body)
+    code = example[example.index("from manim import"):example.rindex("```")]
+    sections = split_scene_sections(code, "DerivativeVideo")
+    assert sections is not None and len(sections) == 4
+
+
+def test_fewer_than_two_markers():
+    assert split_scene_sections(scene('self.play(Write(Text("x")))\n'), "Demo") is None
+    assert split_scene_sections("not python (", "Demo") is None
+
+
+def test_animated_prelude_is_not_repeated():
+    code = scene('title = Text("Intro")\nself.play(Write(title))\n' + INDEPENDENT)
+    assert split_scene_sections(code, "Demo") is None
+
+
+def test_setup_object_shared_by_sections():
+    code = scene('shared = Circle()\n' + INDEPENDENT.replace("axes = Axes()", "axes = shared").replace(
+        'title = Text("Two")', 'title = Text("Two").next_to(shared)'))
+    assert split_scene_sections(code, "Demo") is None
+
+
+def test_setup_object_used_by_one_section():
+    code = scene('circle = Circle()\n' + INDEPENDENT.replace("axes = Axes()", "axes = circle"))
+    assert len(split_scene_sections(code, "Demo")) == 2
+
+
+def test_mobject_left_on_screen():
+    code = scene(INDEPENDENT.replace("FadeOut(VGroup(title, axes))", "FadeOut(title)"))
+    assert split_scene_sections(code, "Demo") is None
+
+
+def test_anonymous_mobject_cannot_be_tracked():
+    code = scene(INDEPENDENT.replace("self.wait(1)\nself.play(FadeOut", 'self.add(Dot())\nself.play(FadeOut', 1))
+    assert split_scene_sections(code, "Demo") is None
+
+
+def test_clear_all_forms_end_a_section():
+    for cleanup in ("self.clear()", "self.play(FadeOut(*self.mobjects))",
+                    "self.play(*[FadeOut(m) for m in self.mobjects])", "self.remove(*self.mobjects)"):
+        code = scene(INDEPENDENT.replace("self.play(FadeOut(VGroup(title, axes)))", cleanup).replace(
+            'self.play(Write(title), Create(axes))', 'self.play(LaggedStart(*[Create(m) for m in (title, axes)]))'))
+        assert split_scene_sections(code, "Demo") is not None, cleanup
+
+
+def test_replacement_transform_tracks_the_new_mobject():
+    code = scene(INDEPENDENT.replace(
+        'self.play(Transform(title, Text("Uno")))',
+        'uno = Text("Uno")\nself.play(ReplacementTransform(title, uno))',
+    ))
+    assert split_scene_sections(code, "Demo") is None
+    assert split_scene_sections(code.replace("VGroup(title, axes)", "VGroup(uno, axes)"), "Demo") is not None
+
+
+def test_camera_changes_carry_over():
+    code = scene(INDEPENDENT.replace("self.wait(1)\n", "self.camera.frame.scale(0.5)\n", 1))
+    assert split_scene_sections(code, "Demo") is None
+    code = scene(INDEPENDENT.replace("self.wait(1)\n", "self.camera.background_color = BLUE\n", 1))
+    assert split_scene_sections(code, "Demo") is None
+
+
+def test_helper_methods_and_loops_are_not_followed():
+    code = scene(INDEPENDENT.replace("self.wait(1)\n", "self.show_formula()\n", 1))
+    assert split_scene_sections(code, "Demo") is None
+    code = scene(INDEPENDENT.replace("self.wait(1)\n", "for _ in range(2):\n    self.play(Indicate(title))\n", 1))
+    assert split_scene_sections(code, "Demo") is None
+
+
+def test_section_reading_another_sections_variable():
+    code = scene(INDEPENDENT.replace('title = Text("Two")', 'title = Text("Two").next_to(axes)'))
+    assert split_scene_sections(code, "Demo") is None
+    # Read before its own assignment: still the first section's object
+    code = scene(INDEPENDENT.replace('title = Text("Two")', 'title.set_color(RED)\ntitle = Text("Two")'))
+    assert split_scene_sections(code, "Demo") is None
+
+
+def test_lambda_and_comprehension_variables_are_local():
+    code = scene(INDEPENDENT.replace(
+        "axes = Axes()", "axes = Axes()\ngraph = axes.plot(lambda title: title ** 2)\ndots = [Dot() for title in range(3)]"
+    ).replace("VGroup(title, axes)", "VGroup(title, axes)"))
+    assert split_scene_sections(code, "Demo") is not None
+
+
+def test_module_state_changed_by_a_section():
+    code = scene(INDEPENDENT.replace("self.wait(1)\n", "config.frame_rate = 15\n", 1))
+    assert split_scene_sections(code, "Demo") is None
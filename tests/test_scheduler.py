@@ -0,0 +1,81 @@
+# tests/test_scheduler.py - Job queue ordering and resource pool limits
+
+import threading
+import time
+
+import pytest
+
+from api.scheduler import JobScheduler, QueueFullError, wait_seconds
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+def blocked_scheduler(**kwargs):
+    """A one-worker scheduler whose worker is busy until the returned event is set."""
+    scheduler = JobScheduler(workers=1, **kwargs)
+    release, started = threading.Event(), threading.Event()
+    scheduler.submit("blocker", lambda: (started.set(), release.wait()))
+    started.wait(5)
+    return scheduler, release
+
+
+def test_lower_priority_number_runs_first_then_submission_order():
+    scheduler, release = blocked_scheduler()
+    order = []
+    scheduler.submit("late", order.append, "late", priority=5)
+    scheduler.submit("urgent", order.append, "urgent", priority=1)
+    scheduler.submit("later", order.append, "later", priority=5)
+    assert scheduler.queue_position("urgent") == 1
+    assert scheduler.queue_position("later") == 3
+    assert scheduler.queue_position("blocker") is None
+    release.set()
+    wait_until(lambda: len(order) == 3)
+    assert order == ["urgent", "late", "later"]
+
+
+def test_full_queue_rejects_new_jobs():
+    scheduler, release = blocked_scheduler(max_queue=1)
+    scheduler.submit("queued", lambda: None)
+    with pytest.raises(QueueFullError):
+        scheduler.submit("rejected", lambda: None)
+    release.set()
+
+
+def test_resource_pool_bounds_concurrency():
+    scheduler = JobScheduler(workers=4, resource_limits={"cpu": 2})
+    lock = threading.Lock()
+    active, peak, done = [0], [0], []
+
+    def job(name):
+        with scheduler.resource("cpu"):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+        done.append(name)
+
+    for i in range(6):
+        scheduler.submit(f"job{i}", job, f"job{i}")
+    wait_until(lambda: len(done) == 6)
+    assert peak[0] == 2
+    assert scheduler.stats()["resources"]["cpu"] == {"limit": 2, "in_use": 0, "waiting": 0}
+
+
+def test_unknown_resource_is_not_limited():
+    scheduler = JobScheduler(workers=1)
+    with scheduler.resource("gpu"):
+        pass
+
+
+def test_wait_seconds():
+    assert wait_seconds({"created_ts": 100.0, "started_ts": 103.5}) == 3.5
+    assert wait_seconds({"created_ts": 100.0}, now=101.0) == 1.0
+    assert wait_seconds({}) == 0.0
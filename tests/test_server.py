@@ -0,0 +1,60 @@
+# tests/test_server.py - API housekeeping (needs flask)
+
+import os
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+os.environ.setdefault("JOB_STORE", "memory")
+
+from api import server
+from api.job_store import MemoryJobStore
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    store = MemoryJobStore(ttl_seconds=60)
+    monkeypatch.setattr(server, "job_store", store)
+    monkeypatch.setattr(server, "JOBS_DIR", str(tmp_path / "jobs"))
+    (tmp_path / "jobs").mkdir()
+    return store
+
+
+def test_evicted_and_orphaned_job_dirs_are_removed(jobs, tmp_path):
+    jobs_dir = tmp_path / "jobs"
+    for job_id in ("evicted", "live", "orphan_old", "orphan_new"):
+        (jobs_dir / job_id / "sections").mkdir(parents=True)
+    jobs.create({"id": "live", "status": "running"})
+    old = time.time() - 120
+    os.utime(jobs_dir / "orphan_old", (old, old))
+
+    assert server.remove_job_dirs(["evicted"]) == 2
+    assert sorted(os.listdir(jobs_dir)) == ["live", "orphan_new"]
+
+
+def test_eviction_returns_the_removed_ids(jobs):
+    jobs.create({"id": "done", "status": "completed"})
+    jobs.create({"id": "busy", "status": "running"})
+    assert jobs.evict_expired(now=time.time() + 120) == ["done"]
+
+
+def test_databases_are_outside_the_served_workspace():
+    workspace = os.path.join(os.path.abspath(server.WORKSPACE_DIR), "")
+    for path in (server.response_cache.path, server.scene_index.path):
+        assert not os.path.abspath(path).startswith(workspace)
+
+
+def test_only_final_videos_are_served(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "WORKSPACE_DIR", str(tmp_path))
+    (tmp_path / "jobs" / "ab12cd34" / "sections").mkdir(parents=True)
+    for name in ("cli.mp4", "jobs.db", "jobs/ab12cd34/final_video.mp4",
+                 "jobs/ab12cd34/sections/section_1.mp4", ".render_cache.mp4"):
+        (tmp_path / name).write_bytes(b"data")
+    client = server.app.test_client()
+
+    assert client.get("/api/videos/cli.mp4").status_code == 200
+    assert client.get("/api/videos/jobs/ab12cd34/final_video.mp4").status_code == 200
+    for name in ("jobs.db", "jobs/ab12cd34/sections/section_1.mp4", ".render_cache.mp4",
+                 "jobs/../cli.mp4", "missing.mp4"):
+        assert client.get(f"/api/videos/{name}").status_code == 404, name
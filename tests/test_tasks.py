@@ -0,0 +1,45 @@
+# tests/test_tasks.py - Task descriptions built from the job's workspace files
+
+import json
+import os
+
+from src.tasks import VideoTasks
+
+MANIFEST = {
+    "version": 1,
+    "language": "vi",
+    "backend": "gtts",
+    "voiceover_file": "voiceover.mp3",
+    "total_duration": 12.5,
+    "cached_sentences": 0,
+    "scenes": [
+        {"scene": 1, "start": 0.0, "duration": 4.25, "sentences": 1, "text": "Mo dau."},
+        {"scene": 2, "start": 4.25, "duration": 8.25, "sentences": 2, "text": "Dao ham. Vi du."},
+    ],
+}
+
+
+def make_tasks(tmp_path, monkeypatch):
+    # Relative job directory, as the server uses, so a doubled join would miss the file
+    monkeypatch.chdir(tmp_path)
+    tasks = VideoTasks(os.path.join("workspace", "jobs", "ab12cd34"))
+    os.makedirs(tasks.workspace_dir)
+    with open(tasks.path(tasks.script_file), "w", encoding="utf-8") as f:
+        f.write("[VISUAL SCRIPT]\nSCENE 1 (5s): Tieu de\n\n[VOICEOVER SCRIPT]\nSCENE 1: Mo dau.\n")
+    return tasks
+
+
+def test_manifest_durations_reach_the_code_prompts(tmp_path, monkeypatch):
+    tasks = make_tasks(tmp_path, monkeypatch)
+    with open(tasks.path(tasks.timing_file), "w", encoding="utf-8") as f:
+        json.dump(MANIFEST, f)
+
+    for description in (tasks.manim_candidate_prompt(), tasks.manim_fix_description("boom")):
+        assert "SCENE 1: 4.25s" in description
+        assert "SCENE 2: 8.25s (bat dau / starts at 4.25s)" in description
+        assert "TONG / TOTAL: 12.50s" in description
+
+
+def test_prompts_fall_back_to_script_timing_without_a_manifest(tmp_path, monkeypatch):
+    tasks = make_tasks(tmp_path, monkeypatch)
+    assert "Sử dụng timing từ script" in tasks.timing_instructions()
@@ -0,0 +1,25 @@
+# tests/test_timing.py - Voiceover loudness measurement node
+
+import json
+
+from src import timing
+from src.tools.workspace import use_workspace
+
+
+def test_loudness_measurements_are_written_for_the_merge(tmp_path, monkeypatch):
+    measured = []
+    values = {"input_i": -20.0, "input_tp": -3.0, "input_lra": 5.0, "input_thresh": -30.0, "target_offset": 0.1}
+    monkeypatch.setattr(timing.loudness_cache, "measure", lambda path: measured.append(path) or values)
+    (tmp_path / "voiceover.mp3").write_bytes(b"mp3")
+
+    with use_workspace(str(tmp_path)):
+        assert timing.measure_voiceover_loudness("voiceover.mp3", "loudness.json") == values
+    assert measured == [str(tmp_path / "voiceover.mp3")]
+    assert json.loads((tmp_path / "loudness.json").read_text()) == values
+
+
+def test_unmeasurable_audio_still_completes_the_node(tmp_path, monkeypatch):
+    monkeypatch.setattr(timing.loudness_cache, "measure", lambda path: None)
+    with use_workspace(str(tmp_path)):
+        assert timing.measure_voiceover_loudness("voiceover.mp3", "loudness.json") is None
+    assert json.loads((tmp_path / "loudness.json").read_text()) is None
@@ -0,0 +1,20 @@
+# tests/test_tts_backends.py - Speech engine registry and interface
+
+import pytest
+
+from src.tools.tts_backends import BACKENDS, TTSBackend, get_backend
+
+
+def test_backends_are_looked_up_by_name():
+    assert get_backend("SILENT") is get_backend("silent")
+    assert set(BACKENDS) == {"gtts", "espeak", "silent"}
+    with pytest.raises(ValueError):
+        get_backend("missing")
+
+
+def test_backend_without_synthesize_cannot_be_built():
+    class Partial(TTSBackend):
+        name = "partial"
+
+    with pytest.raises(TypeError):
+        Partial()
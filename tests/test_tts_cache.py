@@ -0,0 +1,53 @@
+# tests/test_tts_cache.py - TTS segment keys, reuse and pruning
+
+import os
+import time
+
+from src.tools.tts_cache import TTSSegmentCache, split_sentences
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self, size=100):
+        self.size = size
+        self.calls = []
+
+    def synthesize(self, sentence, language, slow, path):
+        self.calls.append(sentence)
+        with open(path, "wb") as f:
+            f.write(b"\0" * self.size)
+
+
+def test_equal_sentences_share_one_segment(tmp_path):
+    cache = TTSSegmentCache(str(tmp_path))
+    backend = FakeBackend()
+    first, cached = cache.synthesize("Xin  chao.", "vi", False, backend)
+    assert not cached
+    assert cache.synthesize("Xin chao.", "vi", False, backend) == (first, True)
+    assert cache.synthesize("Xin chao.", "en", False, backend)[1] is False
+    assert backend.calls == ["Xin  chao.", "Xin chao."]
+    assert split_sentences("One. Two!\nThree") == ["One.", "Two!", "Three"]
+
+
+def test_oldest_segments_are_pruned_past_the_size_cap(tmp_path):
+    cache = TTSSegmentCache(str(tmp_path), max_bytes=250, max_age=3600)
+    backend = FakeBackend(size=100)
+    paths = [cache.synthesize(text, "en", False, backend)[0] for text in ("a", "b")]
+    old = time.time() - 60
+    os.utime(paths[0], (old, old))
+    os.utime(paths[1], (old - 10, old - 10))
+    # A hit refreshes the segment, so the other one is evicted first
+    assert cache.get(cache.make_key("b", "en", False, "fake")) == paths[1]
+    cache.synthesize("c", "en", False, backend)
+    assert cache.prune(force=True) == 1
+    assert not os.path.exists(paths[0]) and os.path.exists(paths[1])
+
+
+def test_expired_segments_are_pruned(tmp_path):
+    cache = TTSSegmentCache(str(tmp_path), max_bytes=10 ** 6, max_age=60)
+    path, _ = cache.synthesize("a", "en", False, FakeBackend())
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert cache.prune(force=True) == 1
+    assert cache.get(cache.make_key("a", "en", False, "fake")) is None
@@ -18,27 +18,57 @@ function App() {
     fetchVideos()
   }, [])
 
-  // Poll status when generating
+  // Follow status when generating: Server-Sent Events, long-poll as fallback
   useEffect(() => {
     if (!jobId) return
 
-    const interval = setInterval(async () => {
-      try {
-        const res = await fetch(`${API_URL}/status/${jobId}`)
-        const data = await res.json()
-        setStatus(data)
+    let cancelled = false
+    let source = null
 
-        if (data.status === 'completed' || data.status === 'error') {
-          setIsGenerating(false)
-          clearInterval(interval)
-          fetchVideos()
+    const handleUpdate = (data) => {
+      setStatus(data)
+      if (data.status === 'completed' || data.status === 'error') {
+        setIsGenerating(false)
+        fetchVideos()
+        return true
+      }
+      return false
+    }
+
+    const longPoll = async () => {
+      let version = null
+      while (!cancelled) {
+        try {
+          const query = version === null ? '' : `?since=${version}`
+          const res = await fetch(`${API_URL}/status/${jobId}${query}`)
+          const data = await res.json()
+          if (!res.ok || handleUpdate(data)) return
+          version = data.version
+        } catch (err) {
+          console.error(err)
+          await new Promise((resolve) => setTimeout(resolve, 2000))
         }
-      } catch (err) {
-        console.error(err)
       }
-    }, 2000)
+    }
+
+    if (window.EventSource) {
+      source = new EventSource(`${API_URL}/status/${jobId}/stream`)
+      source.onmessage = (event) => {
+        if (handleUpdate(JSON.parse(event.data))) source.close()
+      }
+      source.onerror = () => {
+        // Stream unavailable (proxy, old server): switch to long-polling
+        source.close()
+        if (!cancelled) longPoll()
+      }
+    } else {
+      longPoll()
+    }
 
-    return () => clearInterval(interval)
+    return () => {
+      cancelled = true
+      if (source) source.close()
+    }
   }, [jobId])
 
   const fetchVideos = async () => {
@@ -141,6 +171,11 @@ function App() {
               />
             </div>
             <p className="phase">{status.phase}</p>
+            {status.queue_position && (
+              <p className="phase">
+                Queue position / Vi tri hang doi: {status.queue_position} ({Math.round(status.wait_seconds)}s)
+              </p>
+            )}
             {status.status === 'error' && (
               <p className="error">Error: {status.error}</p>
             )}